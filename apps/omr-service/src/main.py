@@ -1,30 +1,133 @@
 from __future__ import annotations
 
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime
+import importlib
+import json
+import os
 from pathlib import Path
+import threading
+import time
 from tempfile import NamedTemporaryFile
-from typing import Any
+from typing import Any, AsyncIterator, Callable, NamedTuple
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import Depends, FastAPI, File, HTTPException, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 
 from src.models import (
+    BatchStatus,
     CatalogEntryDetail,
     CatalogEntrySummary,
+    QueueStats,
+    RecognitionPriority,
     RecognizeApiResponse,
+    StageTiming,
     UpdateCatalogEntryRequest,
 )
+from src.services.batch_service import BatchNotFoundError, BatchStore, BatchValidationError
 from src.services.catalog_service import (
     CatalogNotFoundError,
     CatalogService,
     CatalogStorageError,
     CatalogValidationError,
 )
-from src.services.errors import OMRPipelineError
-from src.services.pipeline import recognize_file
+from src.services.errors import OMRCancelledError, OMRPipelineError
+from src.services.metrics import HTTP_REQUEST_SECONDS, QUEUE_RUNNING, QUEUE_WAITING, REGISTRY
+from src.services.profiler import (
+    PROFILE_HEADER,
+    ProfileBudget,
+    SamplingProfiler,
+    profiling_requested,
+    write_profile,
+)
+from src.services.recognition_queue import QueueFullError, RecognitionQueue
+from src.services.run_log import capture_run_dirs, run_log_level
+from src.services.single_flight import SingleFlight
+from src.services.timing import StageTimer, debug_timings_enabled
+
+ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "pdf", "tif", "tiff", "webp"}
+DISCONNECT_POLL_SECONDS = 0.5
+PROFILED_PATH_PREFIXES = ("/api/v1/recognize", "/api/v1/catalog")
+# Batch progress is written to disk at most this often (always when a batch ends).
+BATCH_SAVE_SECONDS = 1.0
+# "catalog" workers serve catalog reads and edits only and never load the imaging stack.
+WORKER_ROLES = ("all", "catalog")
+
+
+def worker_role() -> str:
+    role = os.getenv("OMR_WORKER_ROLE", "").strip().lower()
+    return role if role in WORKER_ROLES else "all"
+
+
+def _lazy(module: str, name: str) -> Callable[..., Any]:
+    """Resolve ``module.name`` on first call instead of at import time."""
+
+    def call(*args: Any, **kwargs: Any) -> Any:
+        return getattr(importlib.import_module(module), name)(*args, **kwargs)
+
+    call.__name__ = name
+    return call
+
+
+# The pipeline pulls in OpenCV, NumPy and pdfium; importing it on the first
+# recognition keeps worker start-up (and every catalog-only worker) free of them.
+recognize_file = _lazy("src.services.pipeline", "recognize_file")
+reexport_book = _lazy("src.services.pipeline", "reexport_book")
+estimate_recognition_cost = _lazy("src.services.pipeline", "estimate_recognition_cost")
+fingerprint_file = _lazy("src.services.fingerprint", "fingerprint_file")
+near_duplicate_thresholds = _lazy("src.services.fingerprint", "near_duplicate_thresholds")
+pages_match = _lazy("src.services.fingerprint", "pages_match")
+
+
+def _recognition_worker() -> None:
+    """Route dependency: refuse recognition work on catalog-only workers."""
+    if worker_role() == "catalog":
+        raise HTTPException(
+            status_code=503,
+            detail="This worker only serves the catalog (OMR_WORKER_ROLE=catalog)",
+        )
+
+
+class _StoreOutcome(NamedTuple):
+    entry: CatalogEntryDetail
+    reused: bool
+    near_duplicate: tuple[str, float] | None = None
+    timer: StageTimer | None = None
 
-ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "pdf"}
 
-app = FastAPI(title="music-it-omr-service", version="0.1.0")
+# Concurrent uploads of the same bytes share one recognition job.
+_inflight: SingleFlight[_StoreOutcome] = SingleFlight()
+# Bounds how many Audiveris jobs this worker runs and queues at once.
+_recognition_queue = RecognitionQueue()
+QUEUE_RUNNING.set_function(lambda: _recognition_queue.stats()["running"])
+QUEUE_WAITING.set_function(lambda: _recognition_queue.stats()["queued"])
+REGISTRY.start_background_dump()
+# Batches this worker is running, so status reads see progress between saves.
+_running_batches: dict[str, dict[str, Any]] = {}
+# Strong references to the batch tasks; shutdown cancels whatever is left.
+_batch_tasks: set[asyncio.Task[None]] = set()
+# Caps opt-in profiling so a flood of profiled requests cannot slow the worker down.
+_profile_budget = ProfileBudget()
+
+
+@asynccontextmanager
+async def _lifespan(_: FastAPI) -> AsyncIterator[None]:
+    if worker_role() != "catalog":
+        # Batches whose worker died cannot finish; say so instead of "running" forever.
+        store = BatchStore(CatalogService())
+        await asyncio.to_thread(store.recover_interrupted)
+        await asyncio.to_thread(store.prune_uploads)
+    try:
+        yield
+    finally:
+        for task in list(_batch_tasks):
+            task.cancel()
+        await asyncio.gather(*_batch_tasks, return_exceptions=True)
+
+
+app = FastAPI(title="music-it-omr-service", version="0.1.0", lifespan=_lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,11 +138,71 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template, not raw path, to keep series bounded.
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            route=getattr(route, "path", "unmatched"),
+            method=request.method,
+            status=status,
+        )
+
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    if not (
+        request.url.path.startswith(PROFILED_PATH_PREFIXES)
+        and profiling_requested(request.headers.get(PROFILE_HEADER))
+        # Profiles are kept in run logs; with those off there is nowhere to put one.
+        and run_log_level() != "off"
+        and _profile_budget.try_acquire()
+    ):
+        return await call_next(request)
+
+    profiler = SamplingProfiler()
+    profiler.start()
+    status = 500
+    try:
+        with capture_run_dirs() as run_dirs:
+            response = await call_next(request)
+        status = response.status_code
+    finally:
+        profiler.stop()
+        run_dir = await asyncio.to_thread(
+            write_profile,
+            profiler,
+            {"method": request.method, "path": request.url.path, "status": status},
+            run_dirs[0] if run_dirs else None,
+        )
+    if run_dir is not None:
+        response.headers[PROFILE_HEADER] = run_dir.name
+    return response
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/api/v1/health")
 def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/api/v1/queue", response_model=QueueStats)
+def queue_stats() -> QueueStats:
+    return QueueStats(**_recognition_queue.stats())
+
+
 @app.get("/api/v1/catalog", response_model=list[CatalogEntrySummary])
 def list_catalog() -> list[CatalogEntrySummary]:
     service = CatalogService()
@@ -90,6 +253,44 @@ def delete_catalog_entry(entry_id: str) -> dict[str, Any]:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
+@app.post(
+    "/api/v1/catalog/{entry_id}/reexport",
+    response_model=CatalogEntryDetail,
+    dependencies=[Depends(_recognition_worker)],
+)
+async def reexport_catalog_entry(
+    entry_id: str,
+    priority: RecognitionPriority = Query("background"),
+) -> CatalogEntryDetail:
+    service = CatalogService()
+    try:
+        entry = service.get_entry(entry_id)
+        book_path = service.book_path(entry.id)
+        if not book_path.exists():
+            # Pages transcribed per staff system keep one book per system.
+            book_path = service.system_books_path(entry.id)
+        if not book_path.exists():
+            raise HTTPException(
+                status_code=409,
+                detail="No Audiveris book stored for this entry; upload it again to recognize",
+            )
+        async with _recognition_queue.slot(priority=priority):
+            result = await _run_cancellable(reexport_book, book_path, entry.inputType)
+        return service.replace_result(entry.id, result)
+    except QueueFullError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
+    except CatalogNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
+    except CatalogStorageError as exc:
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+    except OMRPipelineError as exc:
+        raise HTTPException(status_code=422, detail=str(exc)) from exc
+
+
 @app.post("/api/v1/catalog/reset")
 def reset_catalog(confirm: str) -> dict[str, Any]:
     service = CatalogService()
@@ -102,60 +303,434 @@ def reset_catalog(confirm: str) -> dict[str, Any]:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
-@app.post("/api/v1/recognize", response_model=RecognizeApiResponse)
-async def recognize(file: UploadFile = File(...)):
+def _stage_timings(spans: list[dict[str, Any]]) -> list[StageTiming]:
+    return [
+        StageTiming(
+            stage=span["stage"],
+            ms=span["ms"],
+            attempt=span.get("attempt"),
+            cpuMs=span.get("cpu_ms"),
+            maxRssMb=span.get("max_rss_mb"),
+            cacheHit=span.get("cache_hit"),
+            binarizer=span.get("binarizer"),
+        )
+        for span in spans
+    ]
+
+
+def _api_response(
+    detail: CatalogEntryDetail,
+    *,
+    is_reused: bool,
+    near_duplicate: tuple[str, float] | None = None,
+    timings: list[dict[str, Any]] | None = None,
+) -> RecognizeApiResponse:
+    response = RecognizeApiResponse(
+        **detail.result.model_dump(),
+        catalogEntryId=detail.id,
+        catalogTitle=detail.title,
+        melodyInstrument=detail.melodyInstrument,
+        leftHandInstrument=detail.leftHandInstrument,
+        isReused=is_reused,
+        nearDuplicateEntryId=near_duplicate[0] if near_duplicate else None,
+        nearDuplicateSimilarity=near_duplicate[1] if near_duplicate else None,
+    )
+    if timings is not None:
+        response.meta.timings = _stage_timings(timings)
+    return response
+
+
+def _reuse_entry(service: CatalogService, entry_id: str) -> CatalogEntryDetail:
+    touched = service.touch_entry(entry_id)
+    return service.get_entry(touched.id)
+
+
+async def _run_cancellable(func, *args, **kwargs):
+    """Run a blocking pipeline call in a thread, signalling it if the task is cancelled."""
+    cancel_event = threading.Event()
+    try:
+        return await asyncio.to_thread(func, *args, cancel_event=cancel_event, **kwargs)
+    except asyncio.CancelledError:
+        cancel_event.set()
+        raise
+
+
+async def _cancel_on_disconnect(request: Request, awaitable):
+    """Await ``awaitable``, cancelling it if the client goes away first."""
+    task = asyncio.ensure_future(awaitable)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            raise OMRCancelledError("Client disconnected before recognition finished")
+
+
+async def _recognize_and_store(
+    service: CatalogService,
+    *,
+    content: bytes,
+    filename: str,
+    suffix: str,
+    image_hash: str,
+    priority: RecognitionPriority,
+    timer: StageTimer,
+    on_progress: Callable[[str, str], None] | None = None,
+) -> _StoreOutcome:
+    # Another worker may have stored this upload while we waited for the lock.
+    with timer.span("catalog-lookup"):
+        existing_entry = service.find_by_hash(image_hash)
+    if existing_entry is not None:
+        return _StoreOutcome(_reuse_entry(service, existing_entry.id), True, timer=timer)
+
+    near_duplicate: tuple[str, float] | None = None
+    with NamedTemporaryFile(suffix=f".{suffix}", delete=True) as temp:
+        temp.write(content)
+        temp.flush()
+        source = Path(temp.name)
+
+        with timer.span("fingerprint"):
+            perceptual_hash = await asyncio.to_thread(fingerprint_file, source, suffix)
+        if perceptual_hash is not None:
+            offer_threshold, auto_reuse_threshold = near_duplicate_thresholds()
+            match = service.find_similar(perceptual_hash, min_similarity=offer_threshold)
+            if match is not None:
+                similar, score = match
+                near_duplicate = (similar.id, round(score, 4))
+                # Same-layout pages hash alike; reuse only when the symbols match too.
+                if (
+                    auto_reuse_threshold is not None
+                    and score >= auto_reuse_threshold
+                    and await asyncio.to_thread(
+                        pages_match,
+                        source,
+                        suffix,
+                        service.root_dir / similar.imagePath,
+                        similar.inputType,
+                    )
+                ):
+                    return _StoreOutcome(
+                        _reuse_entry(service, similar.id), True, near_duplicate, timer
+                    )
+
+        cost = await asyncio.to_thread(estimate_recognition_cost, source, suffix)
+        async with _recognition_queue.slot(priority=priority, cost=cost) as waited:
+            timer.add("queue-wait", waited * 1000)
+            result = await _run_cancellable(
+                recognize_file,
+                source,
+                suffix,
+                # Catalog entry ids are the upload hash.
+                book_dst=service.book_path(image_hash),
+                system_books_dst=service.system_books_path(image_hash),
+                timer=timer,
+                on_progress=on_progress,
+            )
+
+    with timer.span("catalog-write"):
+        entry = service.create_entry(
+            content=content,
+            original_filename=filename,
+            input_type=suffix,
+            result=result,
+            image_hash=image_hash,
+            perceptual_hash=perceptual_hash,
+        )
+    timer.publish()
+    return _StoreOutcome(entry, False, near_duplicate, timer)
+
+
+def _recognition_http_error(exc: Exception) -> HTTPException:
+    """Map a failure of the recognize flow to the response the client gets."""
+    if isinstance(exc, HTTPException):
+        return exc
+    if isinstance(exc, QueueFullError):
+        return HTTPException(
+            status_code=503,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    if isinstance(exc, CatalogNotFoundError):
+        return HTTPException(status_code=404, detail=str(exc))
+    if isinstance(exc, CatalogStorageError):
+        return HTTPException(status_code=500, detail=str(exc))
+    if isinstance(exc, OMRCancelledError):
+        # Client Closed Request: nobody is left to read this response.
+        return HTTPException(status_code=499, detail=str(exc))
+    if isinstance(exc, OMRPipelineError):
+        return HTTPException(status_code=422, detail=str(exc))
+    if isinstance(exc, ValueError):
+        return HTTPException(status_code=400, detail=str(exc))
+    return HTTPException(status_code=500, detail=f"Unexpected error: {exc}")  # pragma: no cover
+
+
+def _upload_suffix(file: UploadFile) -> str:
     suffix = Path(file.filename or "").suffix.lower().lstrip(".")
     if suffix not in ALLOWED_EXTENSIONS:
-        raise HTTPException(status_code=400, detail="Only PNG/JPG/JPEG/PDF are supported")
+        raise HTTPException(status_code=400, detail="Only PNG/JPG/JPEG/PDF/TIFF/WebP are supported")
+    return suffix
+
+
+async def _recognize_upload(
+    service: CatalogService,
+    *,
+    content: bytes,
+    filename: str,
+    suffix: str,
+    priority: RecognitionPriority,
+    timer: StageTimer,
+    on_progress: Callable[[str, str], None] | None = None,
+) -> _StoreOutcome:
+    """Return the catalog entry for an upload, recognizing it unless already stored."""
+    with timer.span("upload-hash"):
+        image_hash = service.compute_hash(content)
+    with timer.span("catalog-lookup"):
+        existing_entry = service.find_by_hash(image_hash)
+    if existing_entry is not None:
+        return _StoreOutcome(_reuse_entry(service, existing_entry.id), True)
 
+    outcome, shared = await _inflight.run(
+        image_hash,
+        lambda: _recognize_and_store(
+            service,
+            content=content,
+            filename=filename,
+            suffix=suffix,
+            image_hash=image_hash,
+            priority=priority,
+            timer=timer,
+            on_progress=on_progress,
+        ),
+        lock_path=service.locks_dir / f"{image_hash}.lock",
+    )
+    return outcome._replace(reused=outcome.reused or shared)
+
+
+@app.post(
+    "/api/v1/recognize",
+    response_model=RecognizeApiResponse,
+    dependencies=[Depends(_recognition_worker)],
+)
+async def recognize(
+    request: Request,
+    file: UploadFile = File(...),
+    priority: RecognitionPriority = Query("interactive"),
+    debug: bool = Query(False),
+):
+    suffix = _upload_suffix(file)
     service = CatalogService()
+    timer = StageTimer()
+    want_timings = debug or debug_timings_enabled()
 
     content = await file.read()
-    image_hash = service.compute_hash(content)
-    existing_entry = service.find_by_hash(image_hash)
-    if existing_entry is not None:
+    try:
+        outcome = await _cancel_on_disconnect(
+            request,
+            _recognize_upload(
+                service,
+                content=content,
+                filename=file.filename or f"score.{suffix}",
+                suffix=suffix,
+                priority=priority,
+                timer=timer,
+            ),
+        )
+    except Exception as exc:
+        raise _recognition_http_error(exc) from exc
+    timings = None
+    if want_timings:
+        # A caller that joined another request's job also reports that job's spans.
+        timings = list(timer.spans)
+        if outcome.timer is not None and outcome.timer is not timer:
+            timings.extend(outcome.timer.spans)
+    return _api_response(
+        outcome.entry,
+        is_reused=outcome.reused,
+        near_duplicate=outcome.near_duplicate,
+        timings=timings,
+    )
+
+
+def _stream_event(event: str, started: float, **fields: Any) -> bytes:
+    payload = {"event": event, "elapsedMs": round((time.perf_counter() - started) * 1000, 1), **fields}
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+@app.post("/api/v1/recognize/stream", dependencies=[Depends(_recognition_worker)])
+async def recognize_stream(
+    file: UploadFile = File(...),
+    priority: RecognitionPriority = Query("interactive"),
+) -> StreamingResponse:
+    """Recognize an upload, streaming NDJSON progress events as the pipeline runs.
+
+    Events are ``received``, then ``stage-start``/``stage`` for each timed
+    stage (hashing, PDF rendering, preprocessing, every Audiveris attempt,
+    parsing, the catalog write) and ``audiveris-step`` lines, and finally
+    either ``result`` (the full recognize response) or ``error``. Closing the
+    connection cancels the recognition. A request that joins an identical
+    upload already in flight only sees that job's result, not its stages.
+    """
+    suffix = _upload_suffix(file)
+    service = CatalogService()
+    started = time.perf_counter()
+    content = await file.read()
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue[bytes] = asyncio.Queue()
+
+    def emit(event: str, **fields: Any) -> None:
+        # Stages run on pipeline threads; hand events to the loop that streams them.
+        loop.call_soon_threadsafe(events.put_nowait, _stream_event(event, started, **fields))
+
+    def on_stage(phase: str, span: dict[str, Any]) -> None:
+        if phase == "start":
+            emit("stage-start", stage=span["stage"], attempt=span.get("attempt"))
+        else:
+            emit("stage", **_stage_timings([span])[0].model_dump())
+
+    timer = StageTimer()
+    timer.listen(on_stage)
+
+    async def body() -> AsyncIterator[bytes]:
+        yield _stream_event("received", started, filename=file.filename, bytes=len(content))
+        job = asyncio.ensure_future(
+            _recognize_upload(
+                service,
+                content=content,
+                filename=file.filename or f"score.{suffix}",
+                suffix=suffix,
+                priority=priority,
+                timer=timer,
+                on_progress=lambda attempt, step: emit("audiveris-step", attempt=attempt, step=step),
+            )
+        )
         try:
-            touched = service.touch_entry(existing_entry.id)
-            detail = service.get_entry(touched.id)
-            return RecognizeApiResponse(
-                **detail.result.model_dump(),
-                catalogEntryId=detail.id,
-                catalogTitle=detail.title,
-                melodyInstrument=detail.melodyInstrument,
-                leftHandInstrument=detail.leftHandInstrument,
-                isReused=True,
+            while not job.done() or not events.empty():
+                waiter = asyncio.ensure_future(events.get())
+                await asyncio.wait({waiter, job}, return_when=asyncio.FIRST_COMPLETED)
+                if waiter.done():
+                    yield waiter.result()
+                else:
+                    waiter.cancel()
+            try:
+                outcome = job.result()
+            except Exception as exc:
+                error = _recognition_http_error(exc)
+                yield _stream_event("error", started, status=error.status_code, detail=error.detail)
+                return
+            response = _api_response(
+                outcome.entry, is_reused=outcome.reused, near_duplicate=outcome.near_duplicate
             )
-        except CatalogNotFoundError as exc:
-            raise HTTPException(status_code=404, detail=str(exc)) from exc
-        except CatalogStorageError as exc:
-            raise HTTPException(status_code=500, detail=str(exc)) from exc
+            yield _stream_event("result", started, result=response.model_dump())
+        finally:
+            if not job.done():
+                # The client went away: stop the pipeline instead of finishing unread work.
+                job.cancel()
+                await asyncio.gather(job, return_exceptions=True)
 
-    with NamedTemporaryFile(suffix=f".{suffix}", delete=True) as temp:
-        temp.write(content)
-        temp.flush()
+    return StreamingResponse(body(), media_type="application/x-ndjson")
 
+
+async def _recognize_batch_item(store: BatchStore, batch: dict[str, Any], item: dict[str, Any]) -> tuple[str, bool]:
+    """Recognize one batch file, returning ``(catalog entry id, reused)``."""
+    content = await asyncio.to_thread(store.read_item, batch["id"], item)
+    while True:
         try:
-            result = recognize_file(Path(temp.name), suffix)
-            entry = service.create_entry(
+            # Files already in the catalog are reused before they reach the queue.
+            outcome = await _recognize_upload(
+                store.service,
                 content=content,
-                original_filename=file.filename or f"score.{suffix}",
-                input_type=suffix,
-                result=result,
-                image_hash=image_hash,
-            )
-            return RecognizeApiResponse(
-                **result.model_dump(),
-                catalogEntryId=entry.id,
-                catalogTitle=entry.title,
-                melodyInstrument=entry.melodyInstrument,
-                leftHandInstrument=entry.leftHandInstrument,
-                isReused=False,
+                filename=Path(item["name"]).name,
+                suffix=item["suffix"],
+                priority=batch["priority"],
+                timer=StageTimer(),
             )
-        except CatalogStorageError as exc:
-            raise HTTPException(status_code=500, detail=str(exc)) from exc
-        except OMRPipelineError as exc:
-            raise HTTPException(status_code=422, detail=str(exc)) from exc
-        except ValueError as exc:
-            raise HTTPException(status_code=400, detail=str(exc)) from exc
-        except Exception as exc:  # pragma: no cover
-            raise HTTPException(status_code=500, detail=f"Unexpected error: {exc}") from exc
+            return outcome.entry.id, outcome.reused
+        except QueueFullError as exc:
+            # Interactive uploads filled the queue; wait our turn instead of failing the file.
+            await asyncio.sleep(exc.retry_after)
+
+
+async def _run_batch(store: BatchStore, batch: dict[str, Any]) -> None:
+    """Work through a batch with as many files in flight as the queue runs at once."""
+    # One iterator shared by every worker hands each file out once.
+    pending = iter([item for item in batch["items"] if item["status"] == "pending"])
+    last_save = 0.0
+
+    def save(force: bool = False) -> None:
+        nonlocal last_save
+        if force or time.monotonic() - last_save >= BATCH_SAVE_SECONDS:
+            store.save(batch)
+            last_save = time.monotonic()
+
+    async def worker() -> None:
+        for item in pending:
+            item["status"] = "running"
+            try:
+                entry_id, reused = await _recognize_batch_item(store, batch, item)
+                item.update(status="reused" if reused else "done", catalogEntryId=entry_id)
+            except Exception as exc:
+                item.update(status="failed", error=str(exc) or type(exc).__name__)
+            save()
+
+    _running_batches[batch["id"]] = batch
+    try:
+        batch["status"] = "running"
+        save(force=True)
+        await asyncio.gather(*(worker() for _ in range(_recognition_queue.max_concurrency)))
+        batch["status"] = "done"
+        batch["finishedAt"] = datetime.now().isoformat(timespec="seconds")
+        save(force=True)
+        store.discard_uploads(batch["id"])
+    except BaseException:
+        # Shutdown cancelled it, or its status cannot be written; either way it stops here.
+        # The uploads stay until OMR_BATCH_RETENTION_HOURS has passed.
+        store.mark_interrupted(batch)
+        try:
+            save(force=True)
+        except OSError:
+            pass
+        raise
+    finally:
+        _running_batches.pop(batch["id"], None)
+        store.release(batch["id"])
+
+
+@app.post(
+    "/api/v1/batches",
+    response_model=BatchStatus,
+    status_code=202,
+    dependencies=[Depends(_recognition_worker)],
+)
+async def create_batch(
+    files: list[UploadFile] = File(...),
+    priority: RecognitionPriority = Query("bulk"),
+) -> BatchStatus:
+    store = BatchStore(CatalogService())
+    try:
+        batch = await asyncio.to_thread(
+            store.create,
+            [(upload.filename or "upload", upload.file) for upload in files],
+            priority=priority,
+            allowed_suffixes=ALLOWED_EXTENSIONS,
+        )
+    except BatchValidationError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    # Runs on the worker's loop, not as a response background task, so it
+    # outlives the request and shutdown can stop it cleanly.
+    task = asyncio.create_task(_run_batch(store, batch))
+    _batch_tasks.add(task)
+    task.add_done_callback(_batch_tasks.discard)
+    await asyncio.to_thread(store.prune_uploads)
+    return store.status(batch)
+
+
+@app.get("/api/v1/batches/{batch_id}", response_model=BatchStatus)
+def get_batch(batch_id: str) -> BatchStatus:
+    store = BatchStore(CatalogService())
+    batch = _running_batches.get(batch_id)
+    try:
+        return store.status(batch if batch is not None else store.load(batch_id))
+    except BatchNotFoundError as exc:
+        raise HTTPException(status_code=404, detail=str(exc)) from exc
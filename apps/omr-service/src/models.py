@@ -1,6 +1,7 @@
 from pydantic import BaseModel, Field
 from typing import Literal
 
+RecognitionPriority = Literal["interactive", "bulk", "background"]
 InstrumentId = Literal["piano", "guitar", "musicBox", "violin", "trumpet", "saxophone", "flute"]
 SUPPORTED_INSTRUMENTS = ("piano", "guitar", "musicBox", "violin", "trumpet", "saxophone", "flute")
 
@@ -28,10 +29,23 @@ class PlaybackEvent(BaseModel):
     sourceMeasure: int
 
 
+class StageTiming(BaseModel):
+    stage: str
+    ms: float
+    attempt: str | None = None
+    cpuMs: float | None = None
+    maxRssMb: float | None = None
+    cacheHit: bool | None = None
+    # Preprocess spans only: the binarizer the adaptive choice picked.
+    binarizer: str | None = None
+
+
 class ResponseMeta(BaseModel):
     engine: str = "audiveris"
     inputType: str
     warnings: list[str] = Field(default_factory=list)
+    # Only filled in when the caller asks for debug timings.
+    timings: list[StageTiming] | None = None
 
 
 class RecognizeResponse(BaseModel):
@@ -55,6 +69,7 @@ class CatalogEntrySummary(BaseModel):
     imageHash: str
     melodyInstrument: InstrumentId
     leftHandInstrument: InstrumentId
+    perceptualHash: str | None = None
 
 
 class CatalogEntryDetail(CatalogEntrySummary):
@@ -67,9 +82,51 @@ class RecognizeApiResponse(RecognizeResponse):
     melodyInstrument: InstrumentId
     leftHandInstrument: InstrumentId
     isReused: bool
+    nearDuplicateEntryId: str | None = None
+    nearDuplicateSimilarity: float | None = None
 
 
 class UpdateCatalogEntryRequest(BaseModel):
     title: str | None = None
     melodyInstrument: str | None = None
     leftHandInstrument: str | None = None
+
+
+class QueueClassStats(BaseModel):
+    completed: int
+    avgWaitMs: float
+    maxWaitMs: float
+    avgLatencyMs: float
+
+
+class QueueStats(BaseModel):
+    running: int
+    queued: int
+    maxConcurrency: int
+    maxQueue: int
+    completed: int
+    rejected: int
+    avgWaitMs: float
+    maxWaitMs: float
+    avgJobMs: float
+    queuedByClass: dict[str, int] = Field(default_factory=dict)
+    classes: dict[str, QueueClassStats] = Field(default_factory=dict)
+
+
+class BatchItem(BaseModel):
+    name: str
+    status: Literal["pending", "running", "reused", "done", "failed", "skipped"]
+    catalogEntryId: str | None = None
+    error: str | None = None
+
+
+class BatchStatus(BaseModel):
+    id: str
+    status: Literal["queued", "running", "done", "interrupted"]
+    priority: RecognitionPriority
+    createdAt: str
+    finishedAt: str | None = None
+    total: int
+    completed: int
+    counts: dict[str, int] = Field(default_factory=dict)
+    items: list[BatchItem] = Field(default_factory=list)
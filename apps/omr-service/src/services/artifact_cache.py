@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import tempfile
+import threading
+import time
+from typing import Iterable
+from uuid import uuid4
+
+DEFAULT_CACHE_MAX_MB = 2048
+# Other workers write to the same cache; re-measure it at least this often.
+USAGE_RESCAN_SECONDS = 300.0
+
+# Bytes this process believes each cache root holds, and when it last measured:
+# put() adds to the total and only walks the cache once it crosses the budget.
+_usage: dict[Path, tuple[int, float]] = {}
+_usage_lock = threading.Lock()
+
+
+def hash_bytes(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def hash_file(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ArtifactCache:
+    """Content-addressed store for derived pipeline artifacts.
+
+    Entries live under ``<root>/<layer>/<key[:2]>/<key>/`` and are keyed by the
+    hash of the stage inputs plus the stage version, so a stage is recomputed
+    only when either changes. The whole cache is bounded by ``max_bytes`` and
+    evicts least-recently-used entries (directory mtime is bumped on every hit).
+    Cache usage is tracked as a running total per process, so stores only walk
+    the cache when the budget is crossed or the total is older than
+    ``USAGE_RESCAN_SECONDS``.
+    """
+
+    def __init__(self, root_dir: Path | None = None, *, max_bytes: int | None = None):
+        self.root_dir = root_dir or self._default_root()
+        self.max_bytes = self._default_max_bytes() if max_bytes is None else max_bytes
+
+    @staticmethod
+    def _default_root() -> Path:
+        configured = os.getenv("OMR_CACHE_DIR")
+        if configured:
+            return Path(configured).expanduser()
+        return Path(__file__).resolve().parents[2] / "cache"
+
+    @staticmethod
+    def _default_max_bytes() -> int:
+        raw = os.getenv("OMR_CACHE_MAX_MB", "")
+        try:
+            megabytes = int(raw) if raw else DEFAULT_CACHE_MAX_MB
+        except ValueError:
+            megabytes = DEFAULT_CACHE_MAX_MB
+        return max(0, megabytes) * 1024 * 1024
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def make_key(*parts: object) -> str:
+        return hash_bytes("\x1f".join(str(part) for part in parts).encode("utf-8"))
+
+    def _entry_dir(self, layer: str, key: str) -> Path:
+        return self.root_dir / layer / key[:2] / key
+
+    def get(self, layer: str, key: str) -> Path | None:
+        if not self.enabled:
+            return None
+        entry_dir = self._entry_dir(layer, key)
+        if not entry_dir.is_dir():
+            return None
+        try:
+            os.utime(entry_dir)
+        except OSError:
+            return None
+        return entry_dir
+
+    def get_file(self, layer: str, key: str, name: str) -> Path | None:
+        entry_dir = self.get(layer, key)
+        if entry_dir is None:
+            return None
+        path = entry_dir / name
+        return path if path.is_file() else None
+
+    def put(self, layer: str, key: str, files: Iterable[Path]) -> Path | None:
+        if not self.enabled:
+            return None
+        entry_dir = self._entry_dir(layer, key)
+        entry_dir.parent.mkdir(parents=True, exist_ok=True)
+
+        staging = entry_dir.parent / f".{key}.{uuid4().hex[:8]}.tmp"
+        staging.mkdir()
+        added = 0
+        try:
+            for path in files:
+                shutil.copy2(path, staging / path.name)
+                added += (staging / path.name).stat().st_size
+            try:
+                os.replace(staging, entry_dir)
+            except OSError:
+                # Another request stored the same key first; its content is identical.
+                shutil.rmtree(staging, ignore_errors=True)
+                added = 0
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        self._account(added)
+        return entry_dir
+
+    def get_json(self, layer: str, key: str) -> dict | None:
+        path = self.get_file(layer, key, "payload.json")
+        if path is None:
+            return None
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def put_json(self, layer: str, key: str, payload: dict) -> Path | None:
+        if not self.enabled:
+            return None
+        with tempfile.TemporaryDirectory(prefix="omr-cache-") as temp_dir:
+            path = Path(temp_dir) / "payload.json"
+            path.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+            return self.put(layer, key, [path])
+
+    def _account(self, added: int) -> None:
+        with _usage_lock:
+            known = _usage.get(self.root_dir)
+            if known is not None and time.monotonic() - known[1] < USAGE_RESCAN_SECONDS:
+                total = known[0] + added
+                _usage[self.root_dir] = (total, known[1])
+                if total <= self.max_bytes:
+                    return
+        self._evict()
+
+    def _evict(self) -> None:
+        """Measure the cache and drop least-recently-used entries until it fits."""
+        entries: list[tuple[float, int, Path]] = []
+        total = 0
+        for entry_dir in self.root_dir.glob("*/*/*"):
+            if not entry_dir.is_dir() or entry_dir.name.startswith("."):
+                continue
+            try:
+                size = sum(item.stat().st_size for item in entry_dir.iterdir() if item.is_file())
+                mtime = entry_dir.stat().st_mtime
+            except OSError:
+                continue
+            entries.append((mtime, size, entry_dir))
+            total += size
+
+        if total > self.max_bytes:
+            entries.sort(key=lambda item: item[0])
+            for _, size, entry_dir in entries:
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+        with _usage_lock:
+            _usage[self.root_dir] = (total, time.monotonic())
@@ -1,17 +1,97 @@
 from __future__ import annotations
 
+from collections import deque
+from dataclasses import dataclass
+import json
 import os
+import re
 import shutil
+import signal
 import subprocess
+import threading
+import time
 from pathlib import Path
-from typing import Iterable
+from typing import TYPE_CHECKING, Callable, Iterable
 
-from .errors import OMRPipelineError
+from .errors import OMRCancelledError, OMRPipelineError
+
+if TYPE_CHECKING:
+    from .timing import StageTimer
+
+# Bump whenever the way Audiveris is invoked or its output is selected changes.
+AUDIVERIS_STAGE_VERSION = "1"
+DEFAULT_TIMEOUT_SECONDS = 600.0
+# Time between SIGTERM and SIGKILL when tearing down the process group.
+KILL_GRACE_SECONDS = 5.0
+_POLL_SECONDS = 0.2
+_REAP_INTERVAL_SECONDS = 0.05
+MUSICXML_SUFFIXES = (".musicxml", ".xml", ".mxl")
+# Lines of stdout/stderr kept in memory for error messages; the rest is only on disk.
+OUTPUT_TAIL_LINES = 200
+
+# Output that means this attempt cannot succeed; the child is killed right away.
+FATAL_OUTPUT_PATTERNS = tuple(
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"\bno staves\b",
+        r"\bno staff (?:line|found|detected)",
+        r"sheet .*\binvalid\b|\binvalid sheet\b",
+        r"too low interline value",
+        r"OutOfMemoryError",
+        r"Could not (?:load|open) (?:image|input)",
+    )
+)
+# Audiveris transcription steps, reported to callers as progress.
+TRANSCRIPTION_STEPS = (
+    "LOAD", "BINARY", "SCALE", "GRID", "HEADERS", "STEM_SEEDS", "BEAMS", "LEDGERS",
+    "HEADS", "STEMS", "REDUCTION", "CUE_BEAMS", "TEXTS", "MEASURES", "CHORDS",
+    "CURVES", "SYMBOLS", "LINKS", "RHYTHMS", "PAGE", "EXPORT",
+)
+_STEP_PATTERN = re.compile(r"\b(" + "|".join(TRANSCRIPTION_STEPS) + r")\b")
+
+
+def _env_number(name: str) -> float | None:
+    raw = os.getenv(name, "")
+    try:
+        return float(raw) if raw else None
+    except ValueError:
+        return None
+
+
+@dataclass(slots=True)
+class ProcessOutcome:
+    returncode: int | None
+    stdout: str
+    stderr: str
+    elapsed_seconds: float
+    kill_reason: str | None = None
+    # From wait4(): covers the child and every descendant it reaped (the JVM).
+    cpu_seconds: float | None = None
+    max_rss_mb: float | None = None
 
 
 class AudiverisRunner:
-    def __init__(self, command: str | None = None):
+    def __init__(
+        self,
+        command: str | None = None,
+        *,
+        timeout_seconds: float | None = None,
+        memory_limit_mb: int | None = None,
+        cpu_limit_seconds: int | None = None,
+        nice: int | None = None,
+    ):
         self.command = command or os.getenv("AUDIVERIS_CMD", "audiveris")
+        self.timeout_seconds = (
+            timeout_seconds or _env_number("AUDIVERIS_TIMEOUT_SECONDS") or DEFAULT_TIMEOUT_SECONDS
+        )
+        memory_limit = memory_limit_mb or _env_number("AUDIVERIS_MEMORY_LIMIT_MB")
+        cpu_limit = cpu_limit_seconds or _env_number("AUDIVERIS_CPU_LIMIT_SECONDS")
+        nice_value = nice if nice is not None else _env_number("AUDIVERIS_NICE")
+        self.memory_limit_mb = int(memory_limit) if memory_limit else None
+        self.cpu_limit_seconds = int(cpu_limit) if cpu_limit else None
+        self.nice = int(nice_value) if nice_value else None
+        # Full file listings of the workspace are debug-only: they walk every file per run.
+        self.dump_file_lists = os.getenv("AUDIVERIS_DEBUG_FILE_LISTS", "") == "1"
 
     def ensure_available(self) -> None:
         if shutil.which(self.command):
@@ -20,12 +100,294 @@ class AudiverisRunner:
             "Audiveris command not found. Install Audiveris or set AUDIVERIS_CMD."
         )
 
+    def version_stamp(self) -> str:
+        """Identify the engine build so cached outputs are dropped after an upgrade."""
+        pinned = os.getenv("AUDIVERIS_VERSION")
+        if pinned:
+            return f"{AUDIVERIS_STAGE_VERSION}:{pinned}"
+        resolved = shutil.which(self.command)
+        if resolved is None:
+            return f"{AUDIVERIS_STAGE_VERSION}:{self.command}"
+        try:
+            stat = os.stat(resolved)
+        except OSError:
+            return f"{AUDIVERIS_STAGE_VERSION}:{resolved}"
+        return f"{AUDIVERIS_STAGE_VERSION}:{resolved}:{stat.st_size}:{int(stat.st_mtime)}"
+
     def _write_debug_file(self, debug_dir: Path | None, name: str, content: str) -> None:
         if debug_dir is None:
             return
         debug_dir.mkdir(parents=True, exist_ok=True)
         (debug_dir / name).write_text(content, encoding="utf-8")
 
+    def _limit_prefix(self) -> list[str] | None:
+        """``prlimit``/``nice`` wrapper that applies the limits before Audiveris starts.
+
+        Both tools exec the command, so the child keeps its pid and process
+        group. Returns None when a limit is set but a tool is missing; the
+        limits are then applied right after spawning (see ``_apply_limits``).
+        """
+        prefix: list[str] = []
+        if self.memory_limit_mb or self.cpu_limit_seconds:
+            prlimit = shutil.which("prlimit")
+            if prlimit is None:
+                return None
+            prefix.append(prlimit)
+            if self.memory_limit_mb:
+                prefix.append(f"--as={self.memory_limit_mb * 1024 * 1024}")
+            if self.cpu_limit_seconds:
+                prefix.append(f"--cpu={self.cpu_limit_seconds}:{self.cpu_limit_seconds + 5}")
+            prefix.append("--")
+        if self.nice:
+            nice = shutil.which("nice")
+            if nice is None:
+                return None
+            prefix.extend([nice, "-n", str(self.nice)])
+        return prefix
+
+    def _apply_limits(self, pid: int) -> None:
+        """Fallback for hosts without ``prlimit``/``nice``: limit the running child.
+
+        The child may already have started when this runs; unlike a
+        ``preexec_fn`` it is safe in a threaded server.
+        """
+        import resource
+
+        if self.memory_limit_mb and hasattr(resource, "prlimit"):
+            limit = self.memory_limit_mb * 1024 * 1024
+            resource.prlimit(pid, resource.RLIMIT_AS, (limit, limit))
+        if self.cpu_limit_seconds and hasattr(resource, "prlimit"):
+            resource.prlimit(
+                pid, resource.RLIMIT_CPU, (self.cpu_limit_seconds, self.cpu_limit_seconds + 5)
+            )
+        if self.nice:
+            os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, pid) + self.nice)
+
+    @staticmethod
+    def _reap(proc: subprocess.Popen, timeout: float | None):
+        """Wait for ``proc`` like ``Popen.wait`` but via ``wait4`` to keep its rusage.
+
+        Raises ``subprocess.TimeoutExpired`` if it is still running after ``timeout``.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            try:
+                pid, status, usage = os.wait4(proc.pid, os.WNOHANG)
+            except ChildProcessError:
+                # Already reaped (e.g. by Popen internals); no usage to report.
+                proc.wait()
+                return None
+            if pid:
+                proc.returncode = os.waitstatus_to_exitcode(status)
+                return usage
+            if deadline is not None and time.monotonic() >= deadline:
+                raise subprocess.TimeoutExpired(proc.args, timeout)
+            time.sleep(_REAP_INTERVAL_SECONDS)
+
+    @classmethod
+    def _kill_group(cls, proc: subprocess.Popen):
+        usage = None
+        for sig, grace in ((signal.SIGTERM, KILL_GRACE_SECONDS), (signal.SIGKILL, None)):
+            try:
+                os.killpg(proc.pid, sig)
+            except ProcessLookupError:
+                break
+            try:
+                usage = cls._reap(proc, grace)
+                break
+            except subprocess.TimeoutExpired:
+                continue
+        if proc.returncode is None:
+            usage = cls._reap(proc, KILL_GRACE_SECONDS)
+        return usage
+
+    def _pump(
+        self,
+        stream,
+        log_path: Path | None,
+        tail: deque[str],
+        on_line: Callable[[str], None],
+    ) -> None:
+        handle = log_path.open("w", encoding="utf-8", buffering=1) if log_path else None
+        try:
+            for line in stream:
+                tail.append(line)
+                if handle is not None:
+                    handle.write(line)
+                on_line(line.rstrip("\n"))
+        finally:
+            stream.close()
+            if handle is not None:
+                handle.close()
+
+    def _execute(
+        self,
+        cmd: list[str],
+        *,
+        debug_dir: Path | None,
+        log_prefix: str,
+        cancel_event: threading.Event | None,
+        on_progress: Callable[[str], None] | None = None,
+    ) -> ProcessOutcome:
+        """Run one Audiveris invocation in its own process group with a hard deadline.
+
+        stdout/stderr are streamed line by line into the debug logs, keeping
+        only a short tail in memory. The child (whole group, so the JVM goes
+        too) is killed when the deadline passes, ``cancel_event`` is set, or
+        a line matches one of ``FATAL_OUTPUT_PATTERNS``.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout_seconds
+        kill_reason: str | None = None
+        fatal_line: list[str] = []
+        fatal_seen = threading.Event()
+        seen_steps: set[str] = set()
+        progress_lock = threading.Lock()
+
+        def on_line(line: str) -> None:
+            if not fatal_seen.is_set() and any(
+                pattern.search(line) for pattern in FATAL_OUTPUT_PATTERNS
+            ):
+                fatal_line.append(line.strip())
+                fatal_seen.set()
+            if on_progress is None:
+                return
+            match = _STEP_PATTERN.search(line)
+            if match is None:
+                return
+            with progress_lock:
+                step = match.group(1)
+                if step in seen_steps:
+                    return
+                seen_steps.add(step)
+            on_progress(step)
+
+        if debug_dir is not None:
+            debug_dir.mkdir(parents=True, exist_ok=True)
+        stdout_tail: deque[str] = deque(maxlen=OUTPUT_TAIL_LINES)
+        stderr_tail: deque[str] = deque(maxlen=OUTPUT_TAIL_LINES)
+
+        limit_prefix = self._limit_prefix()
+        proc = subprocess.Popen(
+            (limit_prefix or []) + cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+            bufsize=1,
+            start_new_session=True,
+        )
+        if limit_prefix is None:
+            try:
+                self._apply_limits(proc.pid)
+            except (OSError, ValueError):
+                # The child may have exited already; its outcome is reported as usual.
+                pass
+        readers = [
+            threading.Thread(
+                target=self._pump,
+                args=(
+                    stream,
+                    debug_dir / f"{log_prefix}-{name}.log" if debug_dir is not None else None,
+                    tail,
+                    on_line,
+                ),
+                daemon=True,
+            )
+            for stream, name, tail in (
+                (proc.stdout, "stdout", stdout_tail),
+                (proc.stderr, "stderr", stderr_tail),
+            )
+        ]
+        for reader in readers:
+            reader.start()
+
+        usage = None
+        try:
+            while True:
+                try:
+                    usage = self._reap(proc, _POLL_SECONDS)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+                if fatal_seen.is_set():
+                    kill_reason = "fatal-output"
+                elif cancel_event is not None and cancel_event.is_set():
+                    kill_reason = "cancelled"
+                elif time.monotonic() >= deadline:
+                    kill_reason = "timeout"
+                if kill_reason is not None:
+                    usage = self._kill_group(proc)
+                    break
+        except BaseException:
+            kill_reason = kill_reason or "interrupted"
+            usage = self._kill_group(proc)
+            raise
+        finally:
+            for reader in readers:
+                reader.join(timeout=KILL_GRACE_SECONDS)
+            outcome = ProcessOutcome(
+                returncode=proc.returncode,
+                stdout="".join(stdout_tail),
+                stderr="".join(stderr_tail),
+                elapsed_seconds=round(time.monotonic() - started, 3),
+                kill_reason=kill_reason,
+                cpu_seconds=round(usage.ru_utime + usage.ru_stime, 3) if usage else None,
+                # ru_maxrss is in KiB on Linux.
+                max_rss_mb=round(usage.ru_maxrss / 1024, 1) if usage else None,
+            )
+            self._write_debug_file(
+                debug_dir,
+                f"{log_prefix}-process.json",
+                json.dumps(
+                    {
+                        "command": cmd,
+                        "returncode": outcome.returncode,
+                        "elapsed_seconds": outcome.elapsed_seconds,
+                        "kill_reason": kill_reason,
+                        "cpu_seconds": outcome.cpu_seconds,
+                        "max_rss_mb": outcome.max_rss_mb,
+                        "fatal_line": fatal_line[0] if fatal_line else None,
+                        "steps": sorted(seen_steps),
+                        "timeout_seconds": self.timeout_seconds,
+                        "memory_limit_mb": self.memory_limit_mb,
+                        "cpu_limit_seconds": self.cpu_limit_seconds,
+                        "nice": self.nice,
+                    },
+                    indent=2,
+                ),
+            )
+
+        if kill_reason is None and fatal_line:
+            # The process exited on its own right after printing a fatal line.
+            kill_reason = "fatal-output"
+        if kill_reason == "fatal-output":
+            raise OMRPipelineError(
+                f"Audiveris aborted after {outcome.elapsed_seconds:.1f}s: {fatal_line[0]}"
+            )
+        if kill_reason == "cancelled":
+            raise OMRCancelledError(f"Audiveris was cancelled after {outcome.elapsed_seconds:.1f}s")
+        if kill_reason == "timeout":
+            raise OMRPipelineError(
+                f"Audiveris timed out after {outcome.elapsed_seconds:.1f}s "
+                f"(limit {self.timeout_seconds:.0f}s)"
+            )
+        return outcome
+
+    def _timed_execute(
+        self, cmd: list[str], *, timer: StageTimer | None, stage: str, **kwargs
+    ) -> ProcessOutcome:
+        if timer is None:
+            return self._execute(cmd, **kwargs)
+        with timer.span(stage) as extra:
+            outcome = self._execute(cmd, **kwargs)
+            if outcome.cpu_seconds is not None:
+                extra["cpu_ms"] = round(outcome.cpu_seconds * 1000, 1)
+            extra["max_rss_mb"] = outcome.max_rss_mb
+        return outcome
+
     def _dump_file_list(self, roots: Iterable[Path]) -> str:
         lines: list[str] = []
         for root in roots:
@@ -36,15 +398,45 @@ class AudiverisRunner:
                     lines.append(str(path))
         return "\n".join(lines) if lines else "(no files)"
 
-    def _find_musicxml_candidates(self, output_dir: Path, image_path: Path) -> list[Path]:
-        candidates: list[Path] = []
-        for root in (output_dir, image_path.parent):
-            candidates.extend(sorted(root.rglob("*.musicxml")))
-            candidates.extend(sorted(root.rglob("*.xml")))
-            candidates.extend(sorted(root.rglob("*.mxl")))
+    @staticmethod
+    def _predicted_outputs(output_dir: Path, stem: str) -> list[Path]:
+        # Audiveris names exports after the input stem, either flat or in a <stem>/ folder.
+        names = [f"{stem}{suffix}" for suffix in MUSICXML_SUFFIXES]
+        return [output_dir / name for name in names] + [output_dir / stem / name for name in names]
+
+    def _find_musicxml_candidates(self, output_dir: Path, input_path: Path) -> list[Path]:
+        """Locate exported MusicXML, checking the predicted names before any scan.
+
+        Falls back to one walk over ``output_dir`` (e.g. for multi-movement
+        ``<stem>.mvt1.mxl`` exports), plus a flat listing of the input's own
+        directory for Audiveris builds that ignore ``-output``.
+        """
+        predicted = [path for path in self._predicted_outputs(output_dir, input_path.stem) if path.is_file()]
+        if predicted:
+            return predicted
+
+        candidates = [
+            path
+            for path in sorted(output_dir.rglob("*"))
+            if path.suffix.lower() in MUSICXML_SUFFIXES and path.is_file()
+        ]
+        if input_path.parent != output_dir:
+            candidates.extend(
+                path
+                for path in sorted(input_path.parent.iterdir())
+                if path.suffix.lower() in MUSICXML_SUFFIXES and path.is_file()
+            )
         return candidates
 
-    def run(self, image_path: Path, output_dir: Path, debug_dir: Path | None = None) -> Path:
+    def run(
+        self,
+        image_path: Path,
+        output_dir: Path,
+        debug_dir: Path | None = None,
+        cancel_event: threading.Event | None = None,
+        on_progress: Callable[[str], None] | None = None,
+        timer: StageTimer | None = None,
+    ) -> Path:
         self.ensure_available()
         output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -64,15 +456,17 @@ class AudiverisRunner:
             " ".join(cmd),
         )
 
-        proc = subprocess.run(cmd, capture_output=True, text=True)
-        self._write_debug_file(debug_dir, "audiveris-stdout.log", proc.stdout)
-        self._write_debug_file(debug_dir, "audiveris-stderr.log", proc.stderr)
+        proc = self._timed_execute(
+            cmd,
+            timer=timer,
+            stage="audiveris",
+            debug_dir=debug_dir,
+            log_prefix="audiveris",
+            cancel_event=cancel_event,
+            on_progress=on_progress,
+        )
 
-        if debug_dir is not None and output_dir.exists():
-            archived_out = debug_dir / "audiveris-out"
-            if archived_out.exists():
-                shutil.rmtree(archived_out)
-            shutil.copytree(output_dir, archived_out, dirs_exist_ok=True)
+        if self.dump_file_lists and output_dir.exists():
             self._write_debug_file(
                 debug_dir,
                 "audiveris-files.txt",
@@ -84,7 +478,7 @@ class AudiverisRunner:
                 f"Audiveris failed: {proc.stderr.strip() or proc.stdout.strip()}"
             )
 
-        candidates = self._find_musicxml_candidates(output_dir, image_path)
+        candidates = self._discover(output_dir, image_path, timer)
         if not candidates:
             omr_candidates = sorted(output_dir.rglob("*.omr"))
             if omr_candidates:
@@ -103,28 +497,45 @@ class AudiverisRunner:
                     "audiveris-retry-command.txt",
                     " ".join(retry_cmd),
                 )
-                retry = subprocess.run(retry_cmd, capture_output=True, text=True)
-                self._write_debug_file(debug_dir, "audiveris-retry-stdout.log", retry.stdout)
-                self._write_debug_file(debug_dir, "audiveris-retry-stderr.log", retry.stderr)
+                retry = self._timed_execute(
+                    retry_cmd,
+                    timer=timer,
+                    stage="audiveris-retry",
+                    debug_dir=debug_dir,
+                    log_prefix="audiveris-retry",
+                    cancel_event=cancel_event,
+                    on_progress=on_progress,
+                )
                 if retry.returncode != 0:
                     raise OMRPipelineError(
                         f"Audiveris retry failed: {retry.stderr.strip() or retry.stdout.strip()}"
                     )
-                candidates = self._find_musicxml_candidates(output_dir, image_path)
-                self._write_debug_file(
-                    debug_dir,
-                    "audiveris-files-after-retry.txt",
-                    self._dump_file_list((output_dir, image_path.parent)),
-                )
+                candidates = self._discover(output_dir, omr_candidates[0], timer)
+                if self.dump_file_lists:
+                    self._write_debug_file(
+                        debug_dir,
+                        "audiveris-files-after-retry.txt",
+                        self._dump_file_list((output_dir, image_path.parent)),
+                    )
 
         if not candidates:
-            all_files = [str(path.relative_to(image_path.parent)) for path in image_path.parent.rglob("*") if path.is_file()]
+            all_files = [str(path.relative_to(output_dir)) for path in output_dir.rglob("*") if path.is_file()]
             files_hint = ", ".join(all_files[:10]) if all_files else "none"
             raise OMRPipelineError(
                 "Audiveris finished but no MusicXML was generated. "
                 f"Generated files: {files_hint}"
             )
 
+        return self._preferred_musicxml(candidates)
+
+    def _discover(self, output_dir: Path, input_path: Path, timer: StageTimer | None) -> list[Path]:
+        if timer is None:
+            return self._find_musicxml_candidates(output_dir, input_path)
+        with timer.span("output-discovery"):
+            return self._find_musicxml_candidates(output_dir, input_path)
+
+    @staticmethod
+    def _preferred_musicxml(candidates: list[Path]) -> Path:
         # Prefer plain MusicXML when both compressed and plain outputs exist.
         candidates.sort(
             key=lambda p: (
@@ -133,3 +544,53 @@ class AudiverisRunner:
             )
         )
         return candidates[0]
+
+    @staticmethod
+    def find_book(output_dir: Path) -> Path | None:
+        """Return the ``.omr`` project Audiveris left in ``output_dir``, if any."""
+        books = sorted(output_dir.rglob("*.omr"))
+        return books[0] if books else None
+
+    def export_book(
+        self,
+        book_path: Path,
+        output_dir: Path,
+        debug_dir: Path | None = None,
+        cancel_event: threading.Event | None = None,
+        timer: StageTimer | None = None,
+    ) -> Path:
+        """Export MusicXML from an existing ``.omr`` book without transcribing again.
+
+        Audiveris may rewrite the book while exporting, so callers should pass
+        a working copy rather than the stored original.
+        """
+        self.ensure_available()
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        cmd = [
+            self.command,
+            "-batch",
+            "-export",
+            "-output",
+            str(output_dir),
+            str(book_path),
+        ]
+        self._write_debug_file(debug_dir, "audiveris-export-command.txt", " ".join(cmd))
+
+        proc = self._timed_execute(
+            cmd,
+            timer=timer,
+            stage="audiveris-export",
+            debug_dir=debug_dir,
+            log_prefix="audiveris-export",
+            cancel_event=cancel_event,
+        )
+        if proc.returncode != 0:
+            raise OMRPipelineError(
+                f"Audiveris export failed: {proc.stderr.strip() or proc.stdout.strip()}"
+            )
+
+        candidates = self._discover(output_dir, book_path, timer)
+        if not candidates:
+            raise OMRPipelineError("Audiveris export finished but no MusicXML was generated.")
+        return self._preferred_musicxml(candidates)
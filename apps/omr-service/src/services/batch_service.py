@@ -0,0 +1,315 @@
+from __future__ import annotations
+
+from datetime import datetime
+import fcntl
+import json
+import os
+from pathlib import Path
+import re
+import shutil
+import tempfile
+import time
+from typing import BinaryIO
+from uuid import uuid4
+import zipfile
+
+from src.models import BatchItem, BatchStatus, RecognitionPriority
+from src.services.catalog_service import CatalogNotFoundError, CatalogService
+
+DEFAULT_MAX_FILES = 5000
+DEFAULT_MAX_FILE_MB = 64
+DEFAULT_RETENTION_HOURS = 24
+ARCHIVE_SUFFIXES = {"zip"}
+_COPY_CHUNK_BYTES = 1 << 20
+_BATCH_ID_PATTERN = re.compile(r"^[0-9a-f]{16}$")
+# A batch is assembled under this name and renamed into place once claimed and complete.
+_STAGING_PATTERN = re.compile(r"^\.[0-9a-f]{16}\.creating$")
+# Items in these states are finished; the rest still count as pending work.
+FINISHED_STATES = ("reused", "done", "failed", "skipped")
+# Batches in these states are not being worked on and never will be again.
+TERMINAL_BATCH_STATES = ("done", "interrupted")
+
+
+class BatchValidationError(ValueError):
+    pass
+
+
+class BatchNotFoundError(CatalogNotFoundError):
+    pass
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name, "")
+    try:
+        value = int(raw) if raw else default
+    except ValueError:
+        return default
+    return value if value > 0 else default
+
+
+def max_batch_files() -> int:
+    return _env_int("OMR_BATCH_MAX_FILES", DEFAULT_MAX_FILES)
+
+
+def max_batch_file_bytes() -> int:
+    return _env_int("OMR_BATCH_MAX_FILE_MB", DEFAULT_MAX_FILE_MB) * 1024 * 1024
+
+
+def batch_retention_seconds() -> int:
+    return _env_int("OMR_BATCH_RETENTION_HOURS", DEFAULT_RETENTION_HOURS) * 3600
+
+
+def _now_iso() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class BatchStore:
+    """Batch status and the uploads a batch reads from, under ``catalog/batches/<id>/``.
+
+    Uploads are spooled to disk once; ZIP archives stay compressed and each
+    member is read only when its turn comes, so memory holds one file at a time.
+
+    The process running a batch holds an ``flock`` on its ``.lock`` file from
+    ``create`` until ``release``; the lock dies with the process, which is how
+    ``recover_interrupted`` tells abandoned batches from ones another worker runs.
+    """
+
+    def __init__(self, service: CatalogService):
+        self.service = service
+        self.batches_dir = service.catalog_dir / "batches"
+        self._claims: dict[str, int] = {}
+
+    def _batch_dir(self, batch_id: str) -> Path:
+        if not _BATCH_ID_PATTERN.match(batch_id):
+            raise BatchNotFoundError(f"Batch not found: {batch_id}")
+        return self.batches_dir / batch_id
+
+    def _uploads_dir(self, batch_id: str) -> Path:
+        return self._batch_dir(batch_id) / "uploads"
+
+    @staticmethod
+    def _try_lock(directory: Path) -> int | None:
+        """Open and lock the ``.lock`` file in ``directory``, or None while another holder has it."""
+        try:
+            fd = os.open(directory / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        except FileNotFoundError:
+            # Renamed or removed meanwhile (a staging directory going live).
+            return None
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    @staticmethod
+    def _unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+    def release(self, batch_id: str) -> None:
+        """Give up the claim ``create`` took once the batch has stopped running."""
+        fd = self._claims.pop(batch_id, None)
+        if fd is not None:
+            self._unlock(fd)
+
+    @staticmethod
+    def _item(name: str, source: str, member: str | None, allowed: set[str], size: int) -> dict:
+        suffix = Path(name).suffix.lower().lstrip(".")
+        item = {
+            "name": name,
+            "status": "pending",
+            "catalogEntryId": None,
+            "error": None,
+            "source": source,
+            "member": member,
+            "suffix": suffix,
+        }
+        if suffix not in allowed:
+            item.update(status="skipped", error=f"Unsupported file type: .{suffix or '?'}")
+        elif size > max_batch_file_bytes():
+            item.update(status="failed", error="File exceeds OMR_BATCH_MAX_FILE_MB")
+        return item
+
+    def create(
+        self,
+        uploads: list[tuple[str, BinaryIO]],
+        *,
+        priority: RecognitionPriority,
+        allowed_suffixes: set[str],
+    ) -> dict:
+        """Spool ``(filename, stream)`` uploads to disk and list the files they hold."""
+        batch_id = uuid4().hex[:16]
+        # Built under a staging name and claimed there; recovery ignores staging
+        # names, and the lock travels with the directory when it is renamed.
+        staging = self.batches_dir / f".{batch_id}.creating"
+        uploads_dir = staging / "uploads"
+        uploads_dir.mkdir(parents=True)
+        self._claims[batch_id] = self._try_lock(staging)
+        items: list[dict] = []
+        try:
+            for index, (filename, stream) in enumerate(uploads):
+                suffix = Path(filename).suffix.lower().lstrip(".")
+                stored = uploads_dir / f"{index}.{suffix or 'bin'}"
+                with stored.open("wb") as handle:
+                    shutil.copyfileobj(stream, handle, _COPY_CHUNK_BYTES)
+                if suffix not in ARCHIVE_SUFFIXES:
+                    items.append(
+                        self._item(filename, stored.name, None, allowed_suffixes, stored.stat().st_size)
+                    )
+                    continue
+                try:
+                    with zipfile.ZipFile(stored) as archive:
+                        # Only the central directory is read here.
+                        for info in archive.infolist():
+                            if info.is_dir() or info.filename.startswith("__MACOSX/"):
+                                continue
+                            items.append(
+                                self._item(
+                                    info.filename, stored.name, info.filename, allowed_suffixes, info.file_size
+                                )
+                            )
+                except zipfile.BadZipFile:
+                    raise BatchValidationError(f"Not a valid ZIP archive: {filename}") from None
+            if not items:
+                raise BatchValidationError("The batch contains no files")
+            if len(items) > max_batch_files():
+                raise BatchValidationError(
+                    f"The batch holds {len(items)} files; the limit is {max_batch_files()}"
+                )
+            data = {
+                "id": batch_id,
+                "status": "queued",
+                "priority": priority,
+                "createdAt": _now_iso(),
+                "finishedAt": None,
+                "items": items,
+            }
+            self._write_status(staging, data)
+            os.rename(staging, self._batch_dir(batch_id))
+        except BaseException:
+            self.release(batch_id)
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return data
+
+    def read_item(self, batch_id: str, item: dict) -> bytes:
+        """Load one item's bytes, refusing anything over the per-file limit."""
+        limit = max_batch_file_bytes()
+        source = self._uploads_dir(batch_id) / item["source"]
+        if item["member"] is None:
+            with source.open("rb") as handle:
+                content = handle.read(limit + 1)
+        else:
+            with zipfile.ZipFile(source) as archive, archive.open(item["member"]) as member:
+                # Sizes in ZIP headers can lie; stop inflating at the limit.
+                content = member.read(limit + 1)
+        if len(content) > limit:
+            raise BatchValidationError("File exceeds OMR_BATCH_MAX_FILE_MB")
+        return content
+
+    def save(self, data: dict) -> None:
+        self._write_status(self._batch_dir(data["id"]), data)
+
+    @staticmethod
+    def _write_status(directory: Path, data: dict) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            mode="w", encoding="utf-8", dir=directory, delete=False
+        ) as handle:
+            json.dump(data, handle, ensure_ascii=False)
+            staging = handle.name
+        os.replace(staging, directory / "status.json")
+
+    def load(self, batch_id: str) -> dict:
+        path = self._batch_dir(batch_id) / "status.json"
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            raise BatchNotFoundError(f"Batch not found: {batch_id}") from None
+
+    def discard_uploads(self, batch_id: str) -> None:
+        shutil.rmtree(self._uploads_dir(batch_id), ignore_errors=True)
+
+    @staticmethod
+    def mark_interrupted(data: dict) -> None:
+        """End ``data`` as interrupted; files that were mid-recognition go back to pending."""
+        data["status"] = "interrupted"
+        data["finishedAt"] = _now_iso()
+        for item in data["items"]:
+            if item["status"] == "running":
+                item["status"] = "pending"
+
+    def _batch_ids(self) -> list[str]:
+        if not self.batches_dir.exists():
+            return []
+        return [path.name for path in self.batches_dir.iterdir() if _BATCH_ID_PATTERN.match(path.name)]
+
+    def recover_interrupted(self) -> list[str]:
+        """Mark batches whose worker is gone as interrupted; returns their ids.
+
+        A batch still claimed by a live process (another worker) is left alone.
+        """
+        if self.batches_dir.exists():
+            for path in self.batches_dir.iterdir():
+                # A staging directory nobody holds was left by a worker that died mid-upload.
+                if _STAGING_PATTERN.match(path.name):
+                    fd = self._try_lock(path)
+                    if fd is not None:
+                        shutil.rmtree(path, ignore_errors=True)
+                        self._unlock(fd)
+        recovered: list[str] = []
+        for batch_id in self._batch_ids():
+            fd = self._try_lock(self._batch_dir(batch_id))
+            if fd is None:
+                continue
+            try:
+                data = self.load(batch_id)
+                if data["status"] not in TERMINAL_BATCH_STATES:
+                    self.mark_interrupted(data)
+                    self.save(data)
+                    recovered.append(batch_id)
+            except (BatchNotFoundError, ValueError, KeyError):
+                # Without a readable status.json nothing can ever run it.
+                shutil.rmtree(self._batch_dir(batch_id), ignore_errors=True)
+            finally:
+                self._unlock(fd)
+        return recovered
+
+    def prune_uploads(self, retention_seconds: float | None = None) -> int:
+        """Delete uploads of finished or interrupted batches older than the retention period."""
+        retention = retention_seconds if retention_seconds is not None else batch_retention_seconds()
+        cutoff = time.time() - retention
+        pruned = 0
+        for batch_id in self._batch_ids():
+            if not self._uploads_dir(batch_id).exists():
+                continue
+            status_path = self._batch_dir(batch_id) / "status.json"
+            try:
+                # status.json is last written when the batch ended.
+                if status_path.stat().st_mtime > cutoff:
+                    continue
+                if self.load(batch_id)["status"] not in TERMINAL_BATCH_STATES:
+                    continue
+            except (OSError, BatchNotFoundError, ValueError, KeyError):
+                continue
+            self.discard_uploads(batch_id)
+            pruned += 1
+        return pruned
+
+    @staticmethod
+    def status(data: dict) -> BatchStatus:
+        counts: dict[str, int] = {}
+        for item in data["items"]:
+            counts[item["status"]] = counts.get(item["status"], 0) + 1
+        return BatchStatus(
+            id=data["id"],
+            status=data["status"],
+            priority=data["priority"],
+            createdAt=data["createdAt"],
+            finishedAt=data["finishedAt"],
+            total=len(data["items"]),
+            completed=sum(counts.get(state, 0) for state in FINISHED_STATES),
+            counts=counts,
+            items=[BatchItem(**item) for item in data["items"]],
+        )
@@ -17,6 +17,7 @@ from src.models import (
     RecognizeResponse,
     SUPPORTED_INSTRUMENTS,
 )
+from src.services.metrics import CATALOG_BYTES, CATALOG_OPERATIONS, DEDUP_LOOKUPS
 
 
 class CatalogError(RuntimeError):
@@ -41,6 +42,8 @@ class CatalogService:
         self.catalog_dir = self.root_dir / "storage" / "catalog"
         self.images_dir = self.catalog_dir / "images"
         self.records_dir = self.catalog_dir / "records"
+        self.books_dir = self.catalog_dir / "books"
+        self.locks_dir = self.catalog_dir / "locks"
         self.index_path = self.catalog_dir / "index.json"
         self._ensure_layout()
 
@@ -69,15 +72,9 @@ class CatalogService:
         if not self.index_path.exists():
             self._write_index({"version": 1, "entries": []})
 
-    @staticmethod
-    def _atomic_write_text(path: Path, content: str) -> None:
-        path.parent.mkdir(parents=True, exist_ok=True)
-        with tempfile.NamedTemporaryFile(
-            mode="w", encoding="utf-8", dir=path.parent, delete=False
-        ) as handle:
-            handle.write(content)
-            temp_name = handle.name
-        os.replace(temp_name, path)
+    @classmethod
+    def _atomic_write_text(cls, path: Path, content: str) -> None:
+        cls._atomic_write_bytes(path, content.encode("utf-8"))
 
     @staticmethod
     def _atomic_write_bytes(path: Path, content: bytes) -> None:
@@ -86,10 +83,19 @@ class CatalogService:
             handle.write(content)
             temp_name = handle.name
         os.replace(temp_name, path)
+        CATALOG_OPERATIONS.inc(op="write")
+        CATALOG_BYTES.inc(len(content), op="write")
+
+    @staticmethod
+    def _read_text(path: Path) -> str:
+        content = path.read_bytes()
+        CATALOG_OPERATIONS.inc(op="read")
+        CATALOG_BYTES.inc(len(content), op="read")
+        return content.decode("utf-8")
 
     def _read_index(self) -> dict:
         try:
-            data = json.loads(self.index_path.read_text(encoding="utf-8"))
+            data = json.loads(self._read_text(self.index_path))
         except Exception as exc:  # pragma: no cover
             raise CatalogStorageError(f"Failed to read catalog index: {exc}") from exc
 
@@ -107,6 +113,14 @@ class CatalogService:
     def _record_path(self, entry_id: str) -> Path:
         return self.records_dir / f"{entry_id}.json"
 
+    def book_path(self, entry_id: str) -> Path:
+        """Location of the Audiveris ``.omr`` book kept for an entry (may not exist)."""
+        return self.books_dir / f"{entry_id}.omr"
+
+    def system_books_path(self, entry_id: str) -> Path:
+        """Directory of per-system books for a page transcribed by staff system (may not exist)."""
+        return self.books_dir / f"{entry_id}.systems"
+
     def _entry_by_id(self, entries: list[dict], entry_id: str) -> tuple[int, dict]:
         for index, item in enumerate(entries):
             if item.get("id") == entry_id:
@@ -149,9 +163,34 @@ class CatalogService:
         index = self._read_index()
         for entry in index["entries"]:
             if entry.get("imageHash") == image_hash:
+                DEDUP_LOOKUPS.inc(result="hit")
                 return self._summary_from_raw(entry)
+        DEDUP_LOOKUPS.inc(result="miss")
         return None
 
+    def find_similar(
+        self, perceptual_hash: str, *, min_similarity: float
+    ) -> tuple[CatalogEntrySummary, float] | None:
+        """Return the most similar entry by perceptual hash at or above ``min_similarity``."""
+        # Imported here: fingerprint loads OpenCV, which catalog-only workers never need.
+        from src.services.fingerprint import similarity
+
+        index = self._read_index()
+        best: tuple[dict, float] | None = None
+        for entry in index["entries"]:
+            candidate = entry.get("perceptualHash")
+            if not candidate:
+                continue
+            try:
+                score = similarity(perceptual_hash, candidate)
+            except ValueError:
+                continue
+            if score >= min_similarity and (best is None or score > best[1]):
+                best = (entry, score)
+        if best is None:
+            return None
+        return self._summary_from_raw(best[0]), best[1]
+
     @staticmethod
     def _fallback_playback_events(notes: list[RecognizedNote]) -> list[PlaybackEvent]:
         grouped: dict[tuple[float, int], list[RecognizedNote]] = {}
@@ -187,7 +226,7 @@ class CatalogService:
             raise CatalogStorageError(f"Catalog record is missing: {record_path}")
 
         try:
-            record = json.loads(record_path.read_text(encoding="utf-8"))
+            record = json.loads(self._read_text(record_path))
             result = RecognizeResponse(**record["result"])
             if not result.playbackEvents:
                 result.playbackEvents = self._fallback_playback_events(result.notes)
@@ -202,7 +241,7 @@ class CatalogService:
             return
 
         try:
-            record = json.loads(record_path.read_text(encoding="utf-8"))
+            record = json.loads(self._read_text(record_path))
         except Exception as exc:  # pragma: no cover
             raise CatalogStorageError(f"Failed to update catalog record: {exc}") from exc
 
@@ -230,6 +269,7 @@ class CatalogService:
         input_type: str,
         result: RecognizeResponse,
         image_hash: str,
+        perceptual_hash: str | None = None,
     ) -> CatalogEntryDetail:
         existing = self.find_by_hash(image_hash)
         if existing:
@@ -261,6 +301,7 @@ class CatalogService:
             imageHash=image_hash,
             melodyInstrument=melody_default,
             leftHandInstrument=left_default,
+            perceptualHash=perceptual_hash,
         )
 
         index = self._read_index()
@@ -278,6 +319,28 @@ class CatalogService:
 
         return CatalogEntryDetail(**summary.model_dump(), result=result)
 
+    def replace_result(self, entry_id: str, result: RecognizeResponse) -> CatalogEntryDetail:
+        """Store a re-derived result for an existing entry, keeping its user settings."""
+        index = self._read_index()
+        entry_index, raw_summary = self._entry_by_id(index["entries"], entry_id)
+        summary = self._summary_from_raw(raw_summary)
+        summary.tempo = result.tempo
+        summary.timeSignature = result.timeSignature
+        summary.noteCount = len(result.notes)
+        summary.updatedAt = self._now_iso()
+
+        index["entries"][entry_index] = summary.model_dump()
+        self._write_index(index)
+        self._atomic_write_text(
+            self._record_path(summary.id),
+            json.dumps(
+                {"summary": summary.model_dump(), "result": result.model_dump()},
+                ensure_ascii=False,
+                indent=2,
+            ),
+        )
+        return CatalogEntryDetail(**summary.model_dump(), result=result)
+
     def update_entry(
         self,
         entry_id: str,
@@ -335,6 +398,11 @@ class CatalogService:
         if record_path.exists():
             record_path.unlink()
 
+        book_path = self.book_path(summary.id)
+        if book_path.exists():
+            book_path.unlink()
+        shutil.rmtree(self.system_books_path(summary.id), ignore_errors=True)
+
         return summary
 
     def reset_catalog(self, confirm: str) -> int:
@@ -344,7 +412,8 @@ class CatalogService:
         index = self._read_index()
         removed_entries = len(index["entries"])
 
-        for directory in (self.images_dir, self.records_dir):
+        # Lock files are normally removed on release; a crashed worker can leave some behind.
+        for directory in (self.images_dir, self.records_dir, self.books_dir, self.locks_dir):
             if not directory.exists():
                 continue
             for item in directory.iterdir():
@@ -1,2 +1,6 @@
 class OMRPipelineError(RuntimeError):
     """Raised when the score recognition pipeline fails."""
+
+
+class OMRCancelledError(OMRPipelineError):
+    """Raised when a recognition is cancelled before it finishes."""
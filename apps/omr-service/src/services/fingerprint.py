@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from src.services.pdf_utils import pdf_first_page_to_gray
+
+FINGERPRINT_BITS = 64
+_HASH_SIZE = 8
+_DCT_SIZE = 32
+# Padding (relative to the ink bounding box) kept around the page content.
+_CONTENT_MARGIN = 0.02
+# Pages are compared symbol by symbol on a square of this side before auto-reuse.
+_MATCH_SIDE = 512
+# How far (in pixels of that square) a symbol may move between two scans of one page.
+_MATCH_TOLERANCE_PX = 2
+# Share of each page's symbol ink the other page must cover for the two to match.
+DEFAULT_MIN_SYMBOL_AGREEMENT = 0.9
+
+
+def _content_region(binary_ink: np.ndarray) -> np.ndarray:
+    points = cv2.findNonZero(binary_ink)
+    if points is None:
+        return binary_ink
+    x, y, width, height = cv2.boundingRect(points)
+    pad_x = int(width * _CONTENT_MARGIN)
+    pad_y = int(height * _CONTENT_MARGIN)
+    top, left = max(0, y - pad_y), max(0, x - pad_x)
+    return binary_ink[top : y + height + pad_y, left : x + width + pad_x]
+
+
+def compute_fingerprint(image: np.ndarray) -> str:
+    """Return a 64-bit DCT perceptual hash of a grayscale page as 16 hex chars.
+
+    The page is binarized with Otsu and cropped to its ink bounding box before
+    hashing, so rescans, re-encodes and re-renders at another scale or margin
+    land within a few bits of each other.
+    """
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    _, ink = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    content = _content_region(ink)
+
+    small = cv2.resize(content, (_DCT_SIZE, _DCT_SIZE), interpolation=cv2.INTER_AREA)
+    coefficients = cv2.dct(small.astype(np.float32))[:_HASH_SIZE, :_HASH_SIZE].flatten()
+    median = np.median(coefficients[1:])
+    bits = coefficients > median
+
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return f"{value:0{FINGERPRINT_BITS // 4}x}"
+
+
+def _load_page(path: Path, input_type: str) -> np.ndarray | None:
+    try:
+        if input_type == "pdf":
+            image = pdf_first_page_to_gray(path, scale=1.0)
+        else:
+            # Fingerprints only need coarse structure; a reduced decode is much cheaper.
+            image = cv2.imread(str(path), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    except Exception:
+        return None
+    if image is None or image.size == 0:
+        return None
+    return image
+
+
+def fingerprint_file(path: Path, input_type: str) -> str | None:
+    """Fingerprint an upload, or return None when it cannot be decoded."""
+    image = _load_page(path, input_type)
+    return compute_fingerprint(image) if image is not None else None
+
+
+def _symbol_mask(image: np.ndarray) -> np.ndarray:
+    """Ink of the page content with staff lines removed, on a fixed-size square."""
+    _, ink = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    content = cv2.resize(
+        _content_region(ink), (_MATCH_SIDE, _MATCH_SIDE), interpolation=cv2.INTER_AREA
+    )
+    _, content = cv2.threshold(content, 127, 255, cv2.THRESH_BINARY)
+    lines = cv2.morphologyEx(
+        content, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (_MATCH_SIDE // 16, 1))
+    )
+    return cv2.subtract(content, lines)
+
+
+def symbol_agreement(first: np.ndarray, second: np.ndarray) -> float:
+    """How well two pages' symbols line up, from 0 to 1.
+
+    Staff lines are removed first: pages engraved on the same layout share
+    them (and therefore most of their perceptual hash) even when the notes
+    differ. The score is the smaller of the two shares of symbol ink that
+    fall within ``_MATCH_TOLERANCE_PX`` of the other page's symbols.
+    """
+    masks = [_symbol_mask(first) > 0, _symbol_mask(second) > 0]
+    kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (2 * _MATCH_TOLERANCE_PX + 1,) * 2)
+    grown = [cv2.dilate(mask.astype(np.uint8), kernel) > 0 for mask in masks]
+    shares = [
+        np.count_nonzero(masks[0] & grown[1]) / max(1, np.count_nonzero(masks[0])),
+        np.count_nonzero(masks[1] & grown[0]) / max(1, np.count_nonzero(masks[1])),
+    ]
+    return float(min(shares))
+
+
+def pages_match(
+    first: Path,
+    first_type: str,
+    second: Path,
+    second_type: str,
+    *,
+    min_agreement: float = DEFAULT_MIN_SYMBOL_AGREEMENT,
+) -> bool:
+    """Whether two uploads show the same page, checked symbol by symbol."""
+    first_page = _load_page(first, first_type)
+    second_page = _load_page(second, second_type)
+    if first_page is None or second_page is None:
+        return False
+    return symbol_agreement(first_page, second_page) >= min_agreement
+
+
+def hamming_distance(first: str, second: str) -> int:
+    return (int(first, 16) ^ int(second, 16)).bit_count()
+
+
+def similarity(first: str, second: str) -> float:
+    return 1.0 - hamming_distance(first, second) / FINGERPRINT_BITS
+
+
+def near_duplicate_thresholds() -> tuple[float, float | None]:
+    """Return ``(offer, auto_reuse)`` similarity thresholds from the environment.
+
+    Auto-reuse is off (None) unless ``OMR_NEAR_DUPLICATE_AUTO_REUSE`` is set:
+    a 64-bit hash cannot tell apart pages that share an engraving layout.
+    """
+
+    def _read(name: str, default: float | None) -> float | None:
+        raw = os.getenv(name, "")
+        try:
+            return float(raw) if raw else default
+        except ValueError:
+            return default
+
+    return (
+        _read("OMR_NEAR_DUPLICATE_OFFER", 0.9),
+        _read("OMR_NEAR_DUPLICATE_AUTO_REUSE", None),
+    )
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# Uploads that may hold several frames; they go through the pipeline like PDF pages.
+FRAME_INPUT_TYPES = {"tif", "tiff", "webp"}
+
+
+def frame_count(path: Path) -> int:
+    """Number of frames OpenCV can read from ``path`` (0 when unreadable)."""
+    try:
+        return int(cv2.imcount(str(path)))
+    except cv2.error:
+        return 0
+
+
+def read_frame(path: Path, index: int, *, flags: int = cv2.IMREAD_GRAYSCALE) -> np.ndarray:
+    """Decode only frame ``index``; earlier and later frames are skipped, not decoded."""
+    try:
+        ok, frames = cv2.imreadmulti(str(path), start=index, count=1, flags=flags)
+    except cv2.error as exc:
+        raise ValueError(f"Cannot read frame {index + 1} of {path.name}: {exc}") from exc
+    if not ok or not frames:
+        raise ValueError(f"Cannot read frame {index + 1} of {path.name}")
+    return frames[0]
+
+
+def write_frame_png(path: Path, index: int, output_png: Path) -> Path:
+    if not cv2.imwrite(str(output_png), read_frame(path, index)):
+        raise ValueError(f"Cannot write frame: {output_png.name}")
+    return output_png
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import math
+from pathlib import Path
+import struct
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# JPEG start-of-frame markers carrying the image size (excludes DHT/JPG/DAC).
+_JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def _png_size(handle) -> tuple[int, int] | None:
+    header = handle.read(24)
+    if len(header) < 24 or header[:8] != _PNG_SIGNATURE or header[12:16] != b"IHDR":
+        return None
+    width, height = struct.unpack(">II", header[16:24])
+    return width, height
+
+
+def _jpeg_size(handle) -> tuple[int, int] | None:
+    if handle.read(2) != b"\xff\xd8":
+        return None
+    while True:
+        byte = handle.read(1)
+        while byte and byte != b"\xff":
+            byte = handle.read(1)
+        while byte == b"\xff":
+            byte = handle.read(1)
+        if not byte:
+            return None
+        marker = byte[0]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            continue
+        length_raw = handle.read(2)
+        if len(length_raw) < 2:
+            return None
+        (length,) = struct.unpack(">H", length_raw)
+        if marker in _JPEG_SOF_MARKERS:
+            segment = handle.read(5)
+            if len(segment) < 5:
+                return None
+            height, width = struct.unpack(">HH", segment[1:5])
+            return width, height
+        handle.seek(length - 2, 1)
+
+
+def _webp_size(handle) -> tuple[int, int] | None:
+    header = handle.read(30)
+    if len(header) < 30 or header[:4] != b"RIFF" or header[8:12] != b"WEBP":
+        return None
+    chunk = header[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", header[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        (bits,) = struct.unpack("<I", header[21:25])
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        width = int.from_bytes(header[24:27], "little") + 1
+        height = int.from_bytes(header[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _tiff_size(handle) -> tuple[int, int] | None:
+    """Size of the first frame, from the width/length tags of the first IFD."""
+    header = handle.read(8)
+    if header[:4] == b"II*\x00":
+        order = "<"
+    elif header[:4] == b"MM\x00*":
+        order = ">"
+    else:
+        return None
+    (offset,) = struct.unpack(f"{order}I", header[4:8])
+    handle.seek(offset)
+    count_raw = handle.read(2)
+    if len(count_raw) < 2:
+        return None
+    (count,) = struct.unpack(f"{order}H", count_raw)
+    size: dict[int, int] = {}
+    for _ in range(count):
+        entry = handle.read(12)
+        if len(entry) < 12:
+            return None
+        tag, field_type = struct.unpack(f"{order}HH", entry[:4])
+        if tag in (256, 257):
+            # SHORT values sit in the first two bytes of the value field.
+            value_format = f"{order}H" if field_type == 3 else f"{order}I"
+            (size[tag],) = struct.unpack_from(value_format, entry, 8)
+    if 256 in size and 257 in size:
+        return size[256], size[257]
+    return None
+
+
+def read_image_size(path: Path) -> tuple[int, int] | None:
+    """Return ``(width, height)`` from the file header without decoding pixels.
+
+    For multi-frame TIFF this is the size of the first frame.
+    """
+    try:
+        with path.open("rb") as handle:
+            for reader in (_png_size, _jpeg_size, _webp_size, _tiff_size):
+                handle.seek(0)
+                size = reader(handle)
+                if size is not None:
+                    return size
+    except OSError:
+        return None
+    return None
+
+
+def decoded_reduction(size: tuple[int, int], shape: tuple[int, ...]) -> float:
+    """Linear factor by which a decoded array of ``shape`` is smaller than ``size``.
+
+    Compares areas rather than widths: decoders apply EXIF orientation, so a
+    rotated JPEG comes back with width and height swapped against its header.
+    """
+    return math.sqrt(size[0] * size[1] / (shape[0] * shape[1]))
@@ -0,0 +1,401 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+import fcntl
+import json
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Callable, Literal
+
+# Seconds; spans HTTP handlers (ms) up to full Audiveris runs (minutes).
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0,
+)
+DUMP_INTERVAL_SECONDS = 5.0
+# Counters of exited workers, folded together so their dump files can be deleted.
+RETIRED_DUMP = "retired.json"
+
+LabelKey = tuple[str, ...]
+
+
+def metrics_dir() -> Path | None:
+    """Shared directory where each worker process dumps its metrics, if configured."""
+    configured = os.getenv("OMR_METRICS_DIR", "")
+    return Path(configured).expanduser() if configured else None
+
+
+class _Metric:
+    """Per-thread shards keep updates lock-free; the lock is only taken once per thread.
+
+    Shards of threads that have exited are folded into one retired dict, so
+    short-lived pool threads do not pile up shards for the life of the process.
+    """
+
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        *,
+        registry: MetricsRegistry | None = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._local = threading.local()
+        self._shards: list[tuple[threading.Thread, dict]] = []
+        self._retired: dict = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "values", None)
+        if shard is None:
+            shard = {}
+            self._local.values = shard
+            with self._lock:
+                self._retire_dead_shards()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire_dead_shards(self) -> None:
+        # Caller holds the lock. A dead thread's shard can no longer change.
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+
+    @staticmethod
+    def _merge(target: dict, shard: dict) -> None:
+        raise NotImplementedError
+
+    def _key(self, labels: dict[str, object]) -> LabelKey:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _merged(self) -> dict:
+        with self._lock:
+            self._retire_dead_shards()
+            merged: dict = {}
+            self._merge(merged, self._retired)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            # dict.copy() runs under the GIL, so a shard is never read mid-update.
+            self._merge(merged, shard.copy())
+        return merged
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0.0) + amount
+
+    @staticmethod
+    def _merge(target: dict, shard: dict) -> None:
+        for key, value in shard.items():
+            target[key] = target.get(key, 0.0) + value
+
+    def snapshot(self) -> dict[LabelKey, float]:
+        return self._merged()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+        *,
+        registry: MetricsRegistry | None = None,
+    ):
+        self.buckets = buckets
+        super().__init__(name, documentation, labelnames, registry=registry)
+
+    def observe(self, value: float, **labels: object) -> None:
+        shard = self._shard()
+        key = self._key(labels)
+        # Per-bucket (non-cumulative) counts, then +Inf, sum and count.
+        state = shard.get(key)
+        if state is None:
+            state = shard[key] = [0.0] * (len(self.buckets) + 3)
+        state[bisect_left(self.buckets, value)] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    @staticmethod
+    def _merge(target: dict, shard: dict) -> None:
+        for key, state in shard.items():
+            total = target.setdefault(key, [0.0] * len(state))
+            for index, value in enumerate(list(state)):
+                total[index] += value
+
+    def snapshot(self) -> dict[LabelKey, list[float]]:
+        return self._merged()
+
+
+class Gauge:
+    """Value read from a callback at scrape time.
+
+    ``aggregate`` says how values from several workers combine: ``sum`` for
+    per-worker quantities, ``max`` for shared ones every worker reports.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        *,
+        aggregate: Literal["sum", "max"] = "sum",
+        registry: MetricsRegistry | None = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames: tuple[str, ...] = ()
+        self.aggregate = aggregate
+        self._function: Callable[[], float | None] | None = None
+        (registry or REGISTRY).register(self)
+
+    def set_function(self, function: Callable[[], float | None]) -> None:
+        self._function = function
+
+    def snapshot(self) -> dict[LabelKey, float]:
+        if self._function is None:
+            return {}
+        try:
+            value = self._function()
+        except Exception:
+            return {}
+        return {} if value is None else {(): float(value)}
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, _Metric | Gauge] = {}
+        self._dump_thread: threading.Thread | None = None
+
+    def register(self, metric: _Metric | Gauge) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def local_state(self) -> dict[str, dict]:
+        return {
+            name: {
+                "values": [[list(key), value] for key, value in metric.snapshot().items()],
+            }
+            for name, metric in self._metrics.items()
+        }
+
+    def dump(self, directory: Path) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+        payload = {"pid": os.getpid(), "written_at": time.time(), "metrics": self.local_state()}
+        staging = directory / f".{os.getpid()}.json.tmp"
+        staging.write_text(json.dumps(payload), encoding="utf-8")
+        os.replace(staging, directory / f"{os.getpid()}.json")
+
+    def start_background_dump(self) -> None:
+        """Periodically dump this worker's metrics so any worker can serve ``/metrics``."""
+        directory = metrics_dir()
+        if directory is None or self._dump_thread is not None:
+            return
+
+        def _loop() -> None:
+            while True:
+                time.sleep(DUMP_INTERVAL_SECONDS)
+                try:
+                    self.dump(directory)
+                except OSError:
+                    pass
+
+        self._dump_thread = threading.Thread(target=_loop, name="metrics-dump", daemon=True)
+        self._dump_thread.start()
+
+    @staticmethod
+    def _pid_alive(pid: int) -> bool:
+        if pid <= 0:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _merge_state(
+        self,
+        merged: dict[str, dict[LabelKey, object]],
+        state: dict[str, dict],
+        *,
+        alive: bool,
+    ) -> None:
+        for name, data in state.items():
+            metric = self._metrics.get(name)
+            if metric is None:
+                continue
+            # Counters from exited workers still count; their gauges no longer apply.
+            if metric.kind == "gauge" and not alive:
+                continue
+            target = merged.setdefault(name, {})
+            for key_list, value in data["values"]:
+                key = tuple(key_list)
+                if metric.kind == "histogram":
+                    total = target.setdefault(key, [0.0] * len(value))
+                    for index, item in enumerate(value):
+                        total[index] += item
+                elif metric.kind == "gauge" and metric.aggregate == "max":
+                    target[key] = max(target.get(key, value), value)
+                else:
+                    target[key] = target.get(key, 0.0) + value
+
+    @staticmethod
+    def _as_state(merged: dict[str, dict[LabelKey, object]]) -> dict[str, dict]:
+        return {
+            name: {"values": [[list(key), value] for key, value in values.items()]}
+            for name, values in merged.items()
+        }
+
+    def _gather(self) -> list[tuple[dict[str, dict], bool]]:
+        """Return ``(state, alive)`` for this process and, if configured, every dumped worker.
+
+        Dumps of exited workers are folded into ``RETIRED_DUMP`` and deleted,
+        so the directory does not grow with every worker restart.
+        """
+        directory = metrics_dir()
+        if directory is None:
+            return [(self.local_state(), True)]
+        self.dump(directory)
+        with (directory / ".retire.lock").open("a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            retired_path = directory / RETIRED_DUMP
+            try:
+                retired_state = json.loads(retired_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                retired_state = {}
+            retired: dict[str, dict[LabelKey, object]] = {}
+            self._merge_state(retired, retired_state, alive=False)
+
+            states: list[tuple[dict[str, dict], bool]] = []
+            exited: list[Path] = []
+            for path in directory.glob("*.json"):
+                if path.name == RETIRED_DUMP:
+                    continue
+                try:
+                    payload = json.loads(path.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    continue
+                if self._pid_alive(int(payload.get("pid", 0))):
+                    states.append((payload.get("metrics", {}), True))
+                else:
+                    self._merge_state(retired, payload.get("metrics", {}), alive=False)
+                    exited.append(path)
+
+            if exited:
+                staging = directory / f".{RETIRED_DUMP}.{os.getpid()}.tmp"
+                staging.write_text(json.dumps(self._as_state(retired)), encoding="utf-8")
+                os.replace(staging, retired_path)
+                for path in exited:
+                    path.unlink(missing_ok=True)
+        states.append((self._as_state(retired), False))
+        return states
+
+    def render(self) -> str:
+        """Prometheus text exposition of all workers' metrics."""
+        merged: dict[str, dict[LabelKey, object]] = {name: {} for name in self._metrics}
+        for state, alive in self._gather():
+            self._merge_state(merged, state, alive=alive)
+
+        lines: list[str] = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(merged[name].items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.kind == "histogram":
+                    lines.extend(_histogram_lines(name, labels, metric.buckets, value))
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: list[tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _histogram_lines(
+    name: str, labels: list[tuple[str, str]], buckets: tuple[float, ...], state: list[float]
+) -> list[str]:
+    lines: list[str] = []
+    cumulative = 0.0
+    for bound, count in zip((*buckets, float("inf")), state[:-2]):
+        cumulative += count
+        le = "+Inf" if bound == float("inf") else repr(bound)
+        lines.append(f"{name}_bucket{_format_labels([*labels, ('le', le)])} {_format_value(cumulative)}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(state[-2])}")
+    lines.append(f"{name}_count{_format_labels(labels)} {_format_value(state[-1])}")
+    return lines
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "omr_http_request_duration_seconds",
+    "API request latency by route template.",
+    ("route", "method", "status"),
+)
+STAGE_SECONDS = Histogram(
+    "omr_stage_duration_seconds",
+    "Recognition pipeline stage durations.",
+    ("stage",),
+)
+AUDIVERIS_ATTEMPTS = Counter(
+    "omr_audiveris_attempts_total",
+    "Audiveris attempts by preprocessing scale factor and outcome.",
+    ("scale", "outcome"),
+)
+DEDUP_LOOKUPS = Counter(
+    "omr_dedup_lookups_total",
+    "Catalog lookups by upload hash, by result (hit/miss).",
+    ("result",),
+)
+CATALOG_OPERATIONS = Counter(
+    "omr_catalog_operations_total",
+    "Catalog file reads and writes.",
+    ("op",),
+)
+CATALOG_BYTES = Counter(
+    "omr_catalog_bytes_total",
+    "Bytes read from and written to catalog storage.",
+    ("op",),
+)
+RUN_LOG_DISK_BYTES = Gauge(
+    "omr_run_log_disk_bytes",
+    "Disk used by run logs as of the last retention pass.",
+    aggregate="max",
+)
+QUEUE_RUNNING = Gauge("omr_queue_running", "Recognitions currently running.")
+QUEUE_WAITING = Gauge("omr_queue_waiting", "Recognitions waiting for a slot.")
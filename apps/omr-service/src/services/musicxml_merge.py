@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import copy
+from pathlib import Path
+import xml.etree.ElementTree as ET
+import zipfile
+
+from src.services.musicxml_parser import _find_children, _read_mxl_root, _strip_ns
+
+# Children of <attributes> that MusicXML requires before <time>.
+_BEFORE_TIME = {"footnote", "level", "divisions", "key"}
+
+
+def _load_score(path: Path) -> ET.Element:
+    try:
+        return _read_mxl_root(path) if path.suffix.lower() == ".mxl" else ET.parse(path).getroot()
+    except (ET.ParseError, KeyError, zipfile.BadZipFile) as exc:
+        raise ValueError(f"Unreadable MusicXML {path.name}: {exc}") from exc
+
+
+def _child(node: ET.Element, name: str) -> ET.Element | None:
+    return next((child for child in node if _strip_ns(child.tag) == name), None)
+
+
+def _leading_attributes(measure: ET.Element) -> ET.Element:
+    """Return the measure's first <attributes>, inserting one before any notes if missing."""
+    index = 0
+    for index, child in enumerate(measure):
+        tag = _strip_ns(child.tag)
+        if tag == "attributes":
+            return child
+        if tag != "print":
+            break
+    else:
+        index = len(measure)
+    attributes = ET.Element("attributes")
+    measure.insert(index, attributes)
+    return attributes
+
+
+class _PartState:
+    """Attributes in effect at the end of the systems merged so far, for one part."""
+
+    def __init__(self) -> None:
+        self.divisions: ET.Element | None = None
+        self.time: ET.Element | None = None
+
+    def observe(self, measure: ET.Element) -> None:
+        for attributes in _find_children(measure, "attributes"):
+            divisions = _child(attributes, "divisions")
+            if divisions is not None:
+                self.divisions = copy.deepcopy(divisions)
+            time = _child(attributes, "time")
+            if time is not None:
+                self.time = copy.deepcopy(time)
+
+    def carry_into(self, measure: ET.Element) -> None:
+        """Restate divisions and time signature a system did not print itself."""
+        declared = {
+            _strip_ns(child.tag)
+            for attributes in _find_children(measure, "attributes")
+            for child in attributes
+        }
+        if self.divisions is not None and "divisions" not in declared:
+            _leading_attributes(measure).insert(0, copy.deepcopy(self.divisions))
+        if self.time is not None and "time" not in declared:
+            attributes = _leading_attributes(measure)
+            position = sum(1 for child in attributes if _strip_ns(child.tag) in _BEFORE_TIME)
+            attributes.insert(position, copy.deepcopy(self.time))
+
+
+def merge_system_scores(paths: list[Path], dst: Path) -> Path:
+    """Concatenate per-system MusicXML scores, in page order, into one partwise score.
+
+    Measures are renumbered continuously. Audiveris only writes a time
+    signature (and sometimes divisions) where it sees one, which usually means
+    the first system; later systems get them restated so every system reads
+    the same when parsed on its own. Tempo directions stay where they were:
+    a tempo holds until the next one, so later systems inherit it as is.
+    Every system must have the same number of parts.
+    """
+    if not paths:
+        raise ValueError("No system scores to merge")
+
+    merged = _load_score(paths[0])
+    if _strip_ns(merged.tag) != "score-partwise":
+        raise ValueError(f"Unsupported MusicXML root: {_strip_ns(merged.tag)}")
+    merged_parts = _find_children(merged, "part")
+    states = [_PartState() for _ in merged_parts]
+    numbers = [0] * len(merged_parts)
+
+    for index, path in enumerate(paths):
+        score = merged if index == 0 else _load_score(path)
+        parts = _find_children(score, "part")
+        if len(parts) != len(merged_parts):
+            raise ValueError(
+                f"System {index + 1} has {len(parts)} parts; expected {len(merged_parts)}"
+            )
+        for part_index, (target, part) in enumerate(zip(merged_parts, parts)):
+            state = states[part_index]
+            for position, measure in enumerate(_find_children(part, "measure")):
+                if index > 0:
+                    if position == 0:
+                        state.carry_into(measure)
+                        if _child(measure, "print") is None:
+                            measure.insert(0, ET.Element("print", {"new-system": "yes"}))
+                    target.append(measure)
+                state.observe(measure)
+                numbers[part_index] += 1
+                measure.set("number", str(numbers[part_index]))
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    ET.ElementTree(merged).write(dst, encoding="UTF-8", xml_declaration=True)
+    return dst
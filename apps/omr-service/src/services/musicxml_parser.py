@@ -8,6 +8,9 @@ import zipfile
 
 from src.models import PlaybackEvent, RecognizeResponse, RecognizedNote, ResponseMeta
 
+# Bump whenever parse_musicxml output for a given MusicXML changes.
+PARSER_VERSION = "1"
+
 SEMITONES = {
     "C": 0,
     "D": 2,
@@ -1,18 +1,185 @@
+from __future__ import annotations
+
+import math
+import os
 from pathlib import Path
 
 import cv2
 import numpy as np
 import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+
+from src.services.image_info import read_image_size
+from src.services.preprocess import max_megapixels
+
+# Audiveris is tuned for 300 DPI scans (an interline of roughly 20 pixels).
+DEFAULT_PDF_DPI = 300.0
+POINTS_PER_INCH = 72.0
+# A scanned page's image must cover this share of the page to be used as-is.
+MIN_SCAN_COVERAGE = 0.9
+# Vector artwork (staff lines, engraved notes) rules out treating a page as a scan.
+_VECTOR_OBJECT_TYPES = {pdfium_c.FPDF_PAGEOBJ_PATH, pdfium_c.FPDF_PAGEOBJ_SHADING}
+
+
+def pdf_dpi() -> float:
+    raw = os.getenv("OMR_PDF_DPI", "")
+    try:
+        value = float(raw) if raw else DEFAULT_PDF_DPI
+    except ValueError:
+        return DEFAULT_PDF_DPI
+    return value if value > 0 else DEFAULT_PDF_DPI
+
+
+def pdf_render_scale(width_pt: float, height_pt: float, *, max_pixels: float | None = None) -> float:
+    """Pixels per PDF point for a page: ``OMR_PDF_DPI``, capped by the pixel budget."""
+    max_pixels = max_pixels if max_pixels is not None else max_megapixels() * 1e6
+    scale = pdf_dpi() / POINTS_PER_INCH
+    if width_pt > 0 and height_pt > 0:
+        fit = math.sqrt(max_pixels / (width_pt * height_pt))
+        # pdfium rounds each side up; give up a pixel per side to stay inside the budget.
+        fit *= 1 - 1 / max(2.0, min(width_pt, height_pt) * fit)
+        scale = min(scale, fit)
+    return scale
+
+
+class PdfPages:
+    """An open PDF whose pages are rasterized on demand, straight to grayscale.
+
+    Keeps one ``PdfDocument`` open for every page read through it; use it as
+    a context manager so the document is closed afterwards.
+    """
+
+    def __init__(self, pdf_path: Path):
+        self._pdf = pdfium.PdfDocument(str(pdf_path))
+
+    def __enter__(self) -> PdfPages:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pdf.close()
+
+    def __len__(self) -> int:
+        return len(self._pdf)
+
+    def page_size(self, index: int) -> tuple[float, float]:
+        """``(width, height)`` in PDF points, without rendering."""
+        width, height = self._pdf.get_page_size(index)
+        return width, height
+
+    def _page(self, index: int) -> pdfium.PdfPage:
+        if len(self._pdf) == 0:
+            raise ValueError("PDF has no pages")
+        if not 0 <= index < len(self._pdf):
+            raise ValueError(f"PDF has no page {index + 1}")
+        return self._pdf[index]
+
+    def _render(self, index: int, scale: float | None) -> pdfium.PdfBitmap:
+        page = self._page(index)
+        try:
+            if scale is None:
+                scale = pdf_render_scale(*page.get_size())
+            return page.render(scale=scale, grayscale=True)
+        finally:
+            page.close()
+
+    def render_gray(self, index: int, *, scale: float | None = None) -> np.ndarray:
+        """Render one page as an 8-bit grayscale array (at the budgeted DPI by default)."""
+        bitmap = self._render(index, scale)
+        try:
+            # pdfium owns the buffer; one copy, already single-channel.
+            return np.array(bitmap.to_numpy()[:, :, 0])
+        finally:
+            bitmap.close()
+
+    @staticmethod
+    def _scan_image(page: pdfium.PdfPage) -> pdfium.PdfImage | None:
+        """The page's only image when the page is an upright scan of it, else None.
+
+        Text objects are allowed (scanners add invisible OCR text); vector
+        paths, a second image, page rotation or a rotated/flipped image are not.
+        """
+        if page.get_rotation() != 0:
+            return None
+        images = []
+        for obj in page.get_objects():
+            if obj.type in _VECTOR_OBJECT_TYPES:
+                return None
+            if obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE:
+                images.append(obj)
+        if len(images) != 1:
+            return None
+        image = images[0]
+        a, b, c, d, _, _ = image.get_matrix().get()
+        if b != 0 or c != 0 or a <= 0 or d <= 0:
+            return None
+        left, bottom, right, top = image.get_pos()
+        width, height = page.get_size()
+        if (right - left) * (top - bottom) < MIN_SCAN_COVERAGE * width * height:
+            return None
+        return image
+
+    def extract_page_image(self, index: int, output_stem: Path) -> Path | None:
+        """Write a scanned page's embedded image at its native resolution.
+
+        JPEG streams are copied byte for byte (``<stem>.jpg``); other images
+        are decoded by pdfium and saved as grayscale PNG (``<stem>.png``).
+        Returns None for pages that are not a single upright image, which
+        should be rendered instead.
+        """
+        page = self._page(index)
+        try:
+            image = self._scan_image(page)
+            if image is None:
+                return None
+            if image.get_filters() == ["DCTDecode"]:
+                output = output_stem.with_suffix(".jpg")
+                output.write_bytes(bytes(image.get_data(decode_simple=False)))
+                if read_image_size(output) is not None:
+                    return output
+
+            bitmap = image.get_bitmap(render=False)
+            try:
+                pixels = bitmap.to_numpy()
+                if bitmap.n_channels == 1:
+                    gray = pixels[:, :, 0]
+                elif bitmap.n_channels == 3:
+                    gray = cv2.cvtColor(pixels, cv2.COLOR_BGR2GRAY)
+                else:
+                    gray = cv2.cvtColor(pixels, cv2.COLOR_BGRA2GRAY)
+                output = output_stem.with_suffix(".png")
+                if not cv2.imwrite(str(output), gray):
+                    return None
+            finally:
+                bitmap.close()
+            return output
+        finally:
+            page.close()
+
+    def write_page_png(self, index: int, output_png: Path, *, scale: float | None = None) -> Path:
+        """Render one page and encode it as a grayscale PNG directly from pdfium's buffer."""
+        bitmap = self._render(index, scale)
+        try:
+            if not cv2.imwrite(str(output_png), bitmap.to_numpy()[:, :, 0]):
+                raise ValueError(f"Cannot write rendered page: {output_png.name}")
+        finally:
+            bitmap.close()
+        return output_png
+
+
+def pdf_first_page_to_gray(pdf_path: Path, *, scale: float = 1.0) -> np.ndarray:
+    with PdfPages(pdf_path) as pdf:
+        return pdf.render_gray(0, scale=scale)
 
 
-def pdf_first_page_to_png(pdf_path: Path, output_png: Path) -> Path:
-    pdf = pdfium.PdfDocument(str(pdf_path))
-    if len(pdf) == 0:
-        raise ValueError("PDF has no pages")
+def pdf_page_size(pdf_path: Path, index: int = 0) -> tuple[float, float] | None:
+    """Return ``(width, height)`` in PDF points of one page, or None if there is no such page.
 
-    page = pdf[0]
-    bitmap = page.render(scale=2.0)
-    pil_image = bitmap.to_pil()
-    image = cv2.cvtColor(np.array(pil_image), cv2.COLOR_RGB2BGR)
-    cv2.imwrite(str(output_png), image)
-    return output_png
+    Only that page's box is read; nothing is rendered.
+    """
+    with PdfPages(pdf_path) as pdf:
+        if not 0 <= index < len(pdf):
+            return None
+        return pdf.page_size(index)
@@ -1,127 +1,687 @@
 from __future__ import annotations
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import datetime
 import json
 import os
 from pathlib import Path
 import shutil
-from tempfile import TemporaryDirectory
+from tempfile import mkdtemp
+import threading
 import traceback
+from typing import Callable
 from uuid import uuid4
 
 from src.models import RecognizeResponse
-from src.services.audiveris import AudiverisRunner
-from src.services.errors import OMRPipelineError
-from src.services.musicxml_parser import parse_musicxml
-from src.services.pdf_utils import pdf_first_page_to_png
-from src.services.preprocess import preprocess_image
+from src.services.artifact_cache import ArtifactCache, hash_file
+from src.services.audiveris import MUSICXML_SUFFIXES, AudiverisRunner
+from src.services.errors import OMRCancelledError, OMRPipelineError
+from src.services.frames import FRAME_INPUT_TYPES, frame_count, write_frame_png
+from src.services.image_info import read_image_size
+from src.services.metrics import AUDIVERIS_ATTEMPTS
+from src.services.musicxml_merge import merge_system_scores
+from src.services.musicxml_parser import PARSER_VERSION, parse_musicxml
+from src.services.pdf_utils import PdfPages, pdf_page_size, pdf_render_scale
+from src.services.preprocess import PREPROCESS_VERSION, max_megapixels, preprocess_image
+from src.services.recognition_queue import jobs_per_slot
+from src.services.run_log import RunLog, new_run_dir, run_log_level
+from src.services.staff_detect import (
+    StaffCrop,
+    crop_to_staff_systems,
+    estimate_interline,
+    staff_crop_enabled,
+    write_system_images,
+)
+from src.services.timing import StageTimer
 
+# Sits next to a preprocessed image (and in its cache entry): binarizer choice and scores.
+PREPROCESS_REPORT_NAME = "binarization.json"
+# Cost assumed for uploads whose size cannot be read cheaply (megapixels).
+DEFAULT_COST_MEGAPIXELS = 8.0
+# How often the per-system wait loop checks the caller's cancel event.
+SYSTEM_POLL_SECONDS = 0.2
+# Staff-line spacing (pixels) Audiveris reads most reliably.
+TARGET_INTERLINE_PX = 20.0
+# Wider spacing only costs Audiveris time; the base attempt shrinks pages down to it.
+MAX_INTERLINE_PX = 40.0
+MIN_UPSCALE = 1.5
+MAX_UPSCALE = 3.0
 
-def _log_base_dir() -> Path:
-    configured_raw = os.getenv("OMR_RUN_LOG_DIR")
-    if configured_raw:
-        return Path(configured_raw).expanduser()
-    return Path(__file__).resolve().parents[2] / "run-logs"
 
+def split_systems_workers() -> int:
+    """Parallel Audiveris jobs per page when splitting into staff systems (0 = off).
 
-def _new_run_dir() -> Path:
-    run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:8]}"
-    run_dir = _log_base_dir() / run_id
-    run_dir.mkdir(parents=True, exist_ok=True)
-    return run_dir
+    The jobs run inside the page's single queue slot, so the count is capped
+    to that slot's share of the CPU and per-job memory budget. ``auto`` asks
+    for one per CPU but stays off when the share allows no parallelism: N
+    systems one after another take longer than one whole-page run. An
+    explicit count always splits.
+    """
+    raw = os.getenv("OMR_SPLIT_SYSTEMS", "0").strip().lower()
+    if raw == "auto":
+        workers = jobs_per_slot(os.cpu_count() or 1)
+        return workers if workers >= 2 else 0
+    try:
+        requested = max(0, int(raw))
+    except ValueError:
+        return 0
+    return jobs_per_slot(requested) if requested > 0 else 0
 
 
-def _write_json(path: Path, payload: dict) -> None:
-    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+def estimate_recognition_cost(file_path: Path, input_type: str) -> float:
+    """Estimate the megapixels the base attempt will feed to Audiveris.
+
+    Used for shortest-job-first ordering, so it only reads headers and page
+    boxes; nothing is decoded or rendered.
+    """
+    if input_type == "pdf":
+        try:
+            # Only the first page is transcribed, so only its box is read.
+            page = pdf_page_size(file_path, 0)
+        except Exception:
+            return DEFAULT_COST_MEGAPIXELS
+        if page is None:
+            return DEFAULT_COST_MEGAPIXELS
+        width, height = page
+        return width * height * pdf_render_scale(width, height) ** 2 / 1e6
+
+    size = read_image_size(file_path)
+    if size is None:
+        return DEFAULT_COST_MEGAPIXELS
+    return min(size[0] * size[1] / 1e6, max_megapixels())
+
+
+def attempt_scales(interline: float | None) -> tuple[float, float]:
+    """Scale factors for the base and the upscaled retry, from the staff interline.
+
+    The base attempt keeps native resolution unless staff lines are spaced
+    wider than ``MAX_INTERLINE_PX`` (large photos). The retry brings the
+    interline up to ``TARGET_INTERLINE_PX``, and at least ``MIN_UPSCALE``
+    beyond the base. Without an estimate the retry doubles the image as before.
+    """
+    if interline is None or interline <= 0:
+        return 1.0, 2.0
+    base = min(1.0, MAX_INTERLINE_PX / interline)
+    retry = base * max(MIN_UPSCALE, TARGET_INTERLINE_PX / (interline * base))
+    return round(base, 3), round(min(MAX_UPSCALE, retry), 3)
+
+
+def _cached_preprocess(
+    cache: ArtifactCache,
+    source_image: Path,
+    source_hash: str,
+    dst: Path,
+    *,
+    scale_factor: float,
+) -> tuple[Path, bool, dict]:
+    """Return ``(image, cache hit, report)``; the report names the binarizer used."""
+    key = cache.make_key(
+        "preprocessed", PREPROCESS_VERSION, source_hash, scale_factor, max_megapixels()
+    )
+    cached = cache.get_file("preprocessed", key, dst.name)
+    if cached is not None:
+        shutil.copy2(cached, dst)
+        try:
+            report = json.loads(cached.with_name(PREPROCESS_REPORT_NAME).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            report = {}
+        return dst, True, report
+
+    report: dict = {}
+    preprocessed = preprocess_image(source_image, dst, scale_factor=scale_factor, report=report)
+    report_path = dst.with_name(PREPROCESS_REPORT_NAME)
+    report_path.write_text(json.dumps(report), encoding="utf-8")
+    cache.put("preprocessed", key, [preprocessed, report_path])
+    return preprocessed, False, report
+
+
+def _cached_audiveris(cache: ArtifactCache, key: str) -> tuple[Path, Path | None] | None:
+    """Return ``(musicxml, omr_book)`` from a cached Audiveris run."""
+    entry_dir = cache.get("audiveris", key)
+    if entry_dir is None:
+        return None
+    files = sorted(entry_dir.iterdir())
+    musicxml = next((path for path in files if path.suffix.lower() in MUSICXML_SUFFIXES), None)
+    if musicxml is None:
+        return None
+    book = next((path for path in files if path.suffix.lower() == ".omr"), None)
+    return musicxml, book
+
+
+def _store_book(book: Path, book_dst: Path) -> None:
+    book_dst.parent.mkdir(parents=True, exist_ok=True)
+    staging = book_dst.with_name(f".{book_dst.name}.{uuid4().hex[:8]}.tmp")
+    shutil.copy2(book, staging)
+    os.replace(staging, book_dst)
+
+
+def _store_system_books(books: list[Path], books_dst: Path) -> None:
+    """Keep the per-system books as ``system-<n>.omr`` in the directory ``books_dst``."""
+    books_dst.parent.mkdir(parents=True, exist_ok=True)
+    staging = books_dst.with_name(f".{books_dst.name}.{uuid4().hex[:8]}.tmp")
+    staging.mkdir()
+    for index, book in enumerate(books, start=1):
+        shutil.copy2(book, staging / f"system-{index}.omr")
+    shutil.rmtree(books_dst, ignore_errors=True)
+    os.replace(staging, books_dst)
+
+
+def _system_books(books_dir: Path) -> list[Path]:
+    books = list(books_dir.glob("system-*.omr"))
+    return sorted(books, key=lambda book: int(book.stem.removeprefix("system-")))
+
+
+def _cached_parse(cache: ArtifactCache, musicxml: Path, input_type: str) -> tuple[RecognizeResponse, bool]:
+    key = cache.make_key("parsed", PARSER_VERSION, hash_file(musicxml), input_type)
+    payload = cache.get_json("parsed", key)
+    if payload is not None:
+        try:
+            return RecognizeResponse(**payload), True
+        except Exception:
+            pass
+
+    result = parse_musicxml(musicxml, input_type=input_type)
+    cache.put_json("parsed", key, result.model_dump())
+    return result, False
 
 
-def recognize_file(file_path: Path, input_type: str) -> RecognizeResponse:
-    run_dir = _new_run_dir()
-    _write_json(
-        run_dir / "run-meta.json",
+def _open_run_log() -> RunLog:
+    level = run_log_level()
+    return RunLog(new_run_dir() if level != "off" else None, level)
+
+
+def _record_failure(run_log: RunLog, exc: Exception, timer: StageTimer) -> None:
+    run_log.write_json(
+        "result-summary.json",
         {
-            "input_type": input_type,
-            "source_file": str(file_path),
-            "started_at": datetime.now().isoformat(),
+            "status": "error",
+            "error": str(exc),
+            "traceback": traceback.format_exc(),
+            "timings": timer.spans,
         },
     )
 
-    with TemporaryDirectory(prefix="omr-work-") as temp_dir:
-        temp = Path(temp_dir)
-        source_image = file_path
 
-        if input_type == "pdf":
-            source_image = pdf_first_page_to_png(file_path, temp / "page-1.png")
-            shutil.copy2(source_image, run_dir / "pdf-first-page.png")
-        else:
-            shutil.copy2(file_path, run_dir / f"input.{input_type}")
+def _link_or_copy(src: Path, dst: Path) -> Path:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+    return dst
+
+
+class _Transcriber:
+    """Cached preprocessing and Audiveris runs shared by the attempts of one recognition.
+
+    Safe to use from several threads: per-system attempts call it concurrently.
+    """
+
+    def __init__(
+        self,
+        run_log: RunLog,
+        cancel_event: threading.Event | None,
+        on_progress: Callable[[str, str], None] | None,
+    ):
+        self.runner = AudiverisRunner()
+        self.cache = ArtifactCache()
+        self.engine_version = self.runner.version_stamp()
+        self.run_log = run_log
+        self.cancel_event = cancel_event
+        self.on_progress = on_progress
+        self.cache_hits: list[str] = []
+        self._source_hashes: dict[Path, str] = {}
+
+    def preprocess(
+        self, name: str, image: Path, sandbox: Path, *, scale_factor: float, timer: StageTimer
+    ) -> Path:
+        if image not in self._source_hashes:
+            with timer.span("source-hash"):
+                self._source_hashes[image] = hash_file(image)
+        (sandbox / "input").mkdir(parents=True)
+        with timer.span("preprocess") as span:
+            preprocessed, hit, report = _cached_preprocess(
+                self.cache,
+                image,
+                self._source_hashes[image],
+                sandbox / "input" / f"preprocessed-{name}.png",
+                scale_factor=scale_factor,
+            )
+            span["cache_hit"] = hit
+            span.update(report)
+        if hit:
+            self.cache_hits.append(f"preprocessed-{name}")
+        self.run_log.copy_artifact(preprocessed, preprocessed.name)
+        return preprocessed
+
+    def audiveris(
+        self,
+        name: str,
+        preprocessed: Path,
+        sandbox: Path,
+        *,
+        timer: StageTimer,
+        cancel_event: threading.Event | None = None,
+    ) -> tuple[Path, Path | None, str]:
+        """Return ``(musicxml, omr_book, outcome)``; outcome is ``ok`` or ``cached``."""
+        key = self.cache.make_key("audiveris", self.engine_version, hash_file(preprocessed))
+        cached = _cached_audiveris(self.cache, key)
+        if cached is not None:
+            self.cache_hits.append(f"audiveris-{name}")
+            return cached[0], cached[1], "cached"
 
+        output_dir = sandbox / "output"
+        on_progress = self.on_progress
         try:
-            runner = AudiverisRunner()
-            attempts = [("base", 1.0), ("up2", 2.0)]
-            attempt_errors: list[dict[str, str | float]] = []
+            musicxml = self.runner.run(
+                preprocessed,
+                output_dir,
+                debug_dir=self.run_log.subdir(f"attempt-{name}"),
+                cancel_event=cancel_event if cancel_event is not None else self.cancel_event,
+                on_progress=(
+                    (lambda step: on_progress(name, step)) if on_progress is not None else None
+                ),
+                timer=timer,
+            )
+        finally:
+            self.run_log.copy_tree(output_dir, f"attempt-{name}/audiveris-out")
+        book = self.runner.find_book(output_dir)
+        self.cache.put("audiveris", key, [musicxml, book] if book is not None else [musicxml])
+        return musicxml, book, "ok"
+
+
+def _transcribe_systems(
+    transcriber: _Transcriber,
+    cropped_image: Path,
+    staff_crop: StaffCrop,
+    sandbox: Path,
+    *,
+    scale_factor: float,
+    workers: int,
+    timer: StageTimer,
+) -> tuple[Path, list[Path] | None, str]:
+    """Transcribe each staff system of the cropped page as its own Audiveris job
+    and merge the scores.
+
+    Up to ``workers`` jobs run at once. The first failure (or the caller's
+    cancel event) stops the remaining jobs. Returns the merged MusicXML, the
+    per-system books in page order (None unless every system has one), and
+    ``cached`` when every system came from the cache, ``ok`` otherwise.
+    """
+    with timer.span("system-split"):
+        images = write_system_images(cropped_image, staff_crop, sandbox / "systems")
+    stop = threading.Event()
+
+    def transcribe(index: int, image: Path) -> tuple[Path, Path | None, str]:
+        name = f"system-{index}"
+        system_timer = timer.scoped(system=index)
+        system_sandbox = sandbox / name
+        preprocessed = transcriber.preprocess(
+            name, image, system_sandbox, scale_factor=scale_factor, timer=system_timer
+        )
+        musicxml, book, outcome = transcriber.audiveris(
+            name, preprocessed, system_sandbox, timer=system_timer, cancel_event=stop
+        )
+        transcriber.run_log.copy_artifact(musicxml, f"{name}-{musicxml.name}")
+        return musicxml, book, outcome
+
+    with ThreadPoolExecutor(
+        max_workers=min(workers, len(images)), thread_name_prefix="omr-system"
+    ) as pool:
+        futures = [pool.submit(transcribe, index, image) for index, image in enumerate(images, 1)]
+        pending = set(futures)
+        failure: BaseException | None = None
+        while pending:
+            done, pending = wait(pending, timeout=SYSTEM_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            if failure is None:
+                failure = next(
+                    (
+                        future.exception()
+                        for future in done
+                        if not future.cancelled() and future.exception() is not None
+                    ),
+                    None,
+                )
+            if failure is None:
+                try:
+                    _check_cancelled(transcriber.cancel_event)
+                except OMRCancelledError as exc:
+                    failure = exc
+            if failure is not None and not stop.is_set():
+                stop.set()
+                for future in pending:
+                    future.cancel()
+        if failure is not None:
+            raise failure
+
+    results = [future.result() for future in futures]
+    with timer.span("system-merge"):
+        try:
+            merged = merge_system_scores(
+                [musicxml for musicxml, _, _ in results], sandbox / "merged.musicxml"
+            )
+        except ValueError as exc:
+            raise OMRPipelineError(f"Cannot merge per-system scores: {exc}") from exc
+    outcome = "cached" if all(outcome == "cached" for _, _, outcome in results) else "ok"
+    books = [book for _, book, _ in results]
+    return merged, (books if all(book is not None for book in books) else None), outcome
+
+
+def _check_cancelled(cancel_event: threading.Event | None) -> None:
+    if cancel_event is not None and cancel_event.is_set():
+        raise OMRCancelledError("Recognition was cancelled")
+
+
+def recognize_file(
+    file_path: Path,
+    input_type: str,
+    *,
+    cancel_event: threading.Event | None = None,
+    on_progress: Callable[[str, str], None] | None = None,
+    book_dst: Path | None = None,
+    system_books_dst: Path | None = None,
+    timer: StageTimer | None = None,
+) -> RecognizeResponse:
+    """Recognize one upload.
 
-            for attempt_name, scale_factor in attempts:
-                preprocessed = preprocess_image(
-                    source_image,
-                    temp / f"preprocessed-{attempt_name}.png",
-                    scale_factor=scale_factor,
+    ``on_progress(attempt, step)`` reports Audiveris steps. When ``book_dst``
+    is given, the Audiveris ``.omr`` book of the successful attempt is kept
+    there so the score can later be re-exported without transcribing again;
+    a page transcribed per staff system keeps its books in the directory
+    ``system_books_dst`` instead, and whichever kind is stored replaces the other.
+    Stage spans go to ``timer`` (and the run log); spans the caller adds
+    afterwards reach the run log through ``timer.publish()``.
+    """
+    timer = timer if timer is not None else StageTimer()
+    run_log = _open_run_log()
+    with timer.span("run-log-write"):
+        run_log.write_json(
+            "run-meta.json",
+            {
+                "input_type": input_type,
+                "source_file": str(file_path),
+                "started_at": datetime.now().isoformat(),
+                "run_log_level": run_log.level,
+            },
+        )
+    timer.bind(lambda spans: run_log.update_json("result-summary.json", {"timings": spans}))
+
+    # The workspace outlives this call until the run-log writer has copied
+    # what it needs from it; release_workspace() deletes it afterwards.
+    temp = Path(mkdtemp(prefix="omr-work-"))
+    try:
+        source_image = file_path
+        frames = 1
+
+        try:
+            if input_type == "pdf":
+                with timer.span("pdf-render") as span, PdfPages(file_path) as pdf:
+                    # Scanned pages keep their embedded image; vector pages are rasterized.
+                    source_image = pdf.extract_page_image(0, temp / "page-1")
+                    span["extracted"] = source_image is not None
+                    if source_image is None:
+                        source_image = pdf.write_page_png(0, temp / "page-1.png")
+                run_log.copy_artifact(source_image, f"pdf-first-page{source_image.suffix}")
+            elif input_type in FRAME_INPUT_TYPES:
+                with timer.span("frame-decode") as span:
+                    # Only the first frame is decoded; the others never leave the file.
+                    frames = frame_count(file_path)
+                    span["frames"] = frames
+                    source_image = write_frame_png(file_path, 0, temp / "page-1.png")
+                run_log.copy_artifact(source_image, "first-frame.png")
+            elif run_log.keeps_artifacts:
+                # The caller may delete the upload as soon as we return.
+                run_log.copy_artifact(
+                    _link_or_copy(file_path, temp / f"input.{input_type}"), f"input.{input_type}"
                 )
-                shutil.copy2(preprocessed, run_dir / preprocessed.name)
 
+            staff_crop = None
+            if staff_crop_enabled():
+                with timer.span("staff-crop"):
+                    staff_crop = crop_to_staff_systems(source_image, temp / "staff-crop.png")
+            if staff_crop is not None:
+                interline = staff_crop.interline
+            else:
+                with timer.span("interline-estimate"):
+                    interline = estimate_interline(source_image)
+            base_scale, retry_scale = attempt_scales(interline)
+            # (name, image, scale factor for that image, scale relative to the source):
+            # cropped pages fall back to the full page last.
+            attempts = [
+                ("base", source_image, base_scale, base_scale),
+                ("up2", source_image, retry_scale, retry_scale),
+            ]
+            if staff_crop is not None:
+                cropped = temp / "staff-crop.png"
+                # The crop may already be budget-reduced. The base attempt never
+                # upscales it back: that round trip only loses detail.
+                crop_base = round(min(1.0, base_scale / staff_crop.scale), 3)
+                attempts = [
+                    ("base", cropped, crop_base, round(crop_base * staff_crop.scale, 3)),
+                    ("up2", cropped, round(retry_scale / staff_crop.scale, 3), retry_scale),
+                    ("full", source_image, base_scale, base_scale),
+                ]
+                run_log.write_json("staff-crop.json", staff_crop.as_dict())
+                run_log.copy_artifact(cropped, "staff-crop.png")
+
+            workers = split_systems_workers()
+            if staff_crop is not None and len(staff_crop.systems) > 1 and workers > 0:
+                # Per-system jobs first; the single-image attempts remain the fallback.
+                # Same image and scales as the cropped base attempt.
+                attempts.insert(0, ("systems", *attempts[0][1:]))
+
+            transcriber = _Transcriber(run_log, cancel_event, on_progress)
+            attempt_errors: list[dict[str, str | float]] = []
+
+            for attempt_name, attempt_image, scale_factor, source_scale in attempts:
+                _check_cancelled(cancel_event)
+                attempt_timer = timer.scoped(attempt=attempt_name)
+                # Each attempt gets its own input/output sandbox so Audiveris output
+                # discovery never sees other attempts' files.
+                sandbox = temp / f"attempt-{attempt_name}"
+                # Quarter steps keep the metric's label set small.
+                scale_label = f"{round(source_scale * 4) / 4:g}"
                 try:
-                    musicxml = runner.run(
-                        preprocessed,
-                        temp / f"audiveris-out-{attempt_name}",
-                        debug_dir=run_dir / f"attempt-{attempt_name}",
-                    )
-                    shutil.copy2(musicxml, run_dir / f"{attempt_name}-{musicxml.name}")
+                    if attempt_name == "systems":
+                        musicxml, system_books, outcome = _transcribe_systems(
+                            transcriber,
+                            attempt_image,
+                            staff_crop,
+                            sandbox,
+                            scale_factor=scale_factor,
+                            workers=workers,
+                            timer=attempt_timer,
+                        )
+                        book = None
+                        if system_books_dst is not None and system_books is not None:
+                            _store_system_books(system_books, system_books_dst)
+                            if book_dst is not None:
+                                book_dst.unlink(missing_ok=True)
+                    else:
+                        preprocessed = transcriber.preprocess(
+                            attempt_name,
+                            attempt_image,
+                            sandbox,
+                            scale_factor=scale_factor,
+                            timer=attempt_timer,
+                        )
+                        musicxml, book, outcome = transcriber.audiveris(
+                            attempt_name, preprocessed, sandbox, timer=attempt_timer
+                        )
+                    if book_dst is not None and book is not None:
+                        _store_book(book, book_dst)
+                        if system_books_dst is not None:
+                            shutil.rmtree(system_books_dst, ignore_errors=True)
+                    run_log.copy_artifact(musicxml, f"{attempt_name}-{musicxml.name}")
 
-                    result = parse_musicxml(musicxml, input_type=input_type)
+                    with attempt_timer.span("parse") as span:
+                        result, parse_hit = _cached_parse(
+                            transcriber.cache, musicxml, input_type
+                        )
+                        span["cache_hit"] = parse_hit
+                    if parse_hit:
+                        transcriber.cache_hits.append(f"parsed-{attempt_name}")
                     if input_type == "pdf":
                         result.meta.warnings.append("PDF only first page is processed in MVP.")
-                    if scale_factor > 1.0:
+                    elif input_type in FRAME_INPUT_TYPES and frames > 1:
+                        result.meta.warnings.append(
+                            f"Only the first of {frames} frames is processed in MVP."
+                        )
+                    if source_scale > 1.0:
                         result.meta.warnings.append(
-                            f"Input was upscaled x{scale_factor:.1f} for OMR stability."
+                            f"Input was upscaled x{source_scale:.1f} for OMR stability."
                         )
-                    # result.meta.warnings.append(f"Run log: {run_dir}")
 
-                    _write_json(
-                        run_dir / "result-summary.json",
-                        {
-                            "tempo": result.tempo,
-                            "time_signature": result.timeSignature,
-                            "note_count": len(result.notes),
-                            "status": "ok",
-                            "attempt": attempt_name,
-                            "scale_factor": scale_factor,
-                        },
-                    )
+                    with timer.span("run-log-write"):
+                        run_log.write_json(
+                            "result-summary.json",
+                            {
+                                "tempo": result.tempo,
+                                "time_signature": result.timeSignature,
+                                "note_count": len(result.notes),
+                                "status": "ok",
+                                "attempt": attempt_name,
+                                "scale_factor": source_scale,
+                                "cache_hits": transcriber.cache_hits,
+                                "staff_crop": (
+                                    staff_crop.as_dict()
+                                    if staff_crop is not None and attempt_name != "full"
+                                    else None
+                                ),
+                                "timings": timer.spans,
+                            },
+                        )
+                    AUDIVERIS_ATTEMPTS.inc(scale=scale_label, outcome=outcome)
                     return result
+                except OMRCancelledError:
+                    AUDIVERIS_ATTEMPTS.inc(scale=scale_label, outcome="cancelled")
+                    raise
                 except OMRPipelineError as exc:
+                    AUDIVERIS_ATTEMPTS.inc(scale=scale_label, outcome="failed")
                     attempt_errors.append(
                         {
                             "attempt": attempt_name,
-                            "scale_factor": scale_factor,
+                            "scale_factor": source_scale,
                             "error": str(exc),
                         }
                     )
                     continue
 
-            _write_json(run_dir / "attempt-errors.json", {"attempts": attempt_errors})
+            run_log.write_json("attempt-errors.json", {"attempts": attempt_errors})
             raise OMRPipelineError(
-                "OMR failed for all preprocessing attempts (base, upscaled x2). "
+                "OMR failed for all preprocessing attempts "
+                f"({', '.join(name for name, *_ in attempts)}). "
                 f"Last error: {attempt_errors[-1]['error'] if attempt_errors else 'unknown'}"
             )
         except Exception as exc:
-            _write_json(
-                run_dir / "result-summary.json",
+            _record_failure(run_log, exc, timer)
+            if isinstance(exc, OMRPipelineError):
+                raise type(exc)(f"{exc}{run_log.describe()}") from exc
+            raise
+    finally:
+        run_log.release_workspace(temp)
+
+
+def _export_book(
+    book: Path,
+    workdir: Path,
+    name: str,
+    run_log: RunLog,
+    *,
+    cancel_event: threading.Event | None,
+    timer: StageTimer,
+) -> Path:
+    """Export a copy of ``book`` to MusicXML; the stored book is never modified."""
+    working_book = workdir / "book" / book.name
+    working_book.parent.mkdir(parents=True)
+    shutil.copy2(book, working_book)
+    musicxml = AudiverisRunner().export_book(
+        working_book,
+        workdir / "audiveris-out",
+        debug_dir=run_log.subdir(name),
+        cancel_event=cancel_event,
+        timer=timer,
+    )
+    run_log.copy_artifact(musicxml, f"{name}-{musicxml.name}")
+    return musicxml
+
+
+def reexport_book(
+    book_path: Path,
+    input_type: str,
+    *,
+    cancel_event: threading.Event | None = None,
+    timer: StageTimer | None = None,
+) -> RecognizeResponse:
+    """Rebuild a result from a stored ``.omr`` book: Audiveris export and parse only.
+
+    ``book_path`` may also be a directory of per-system books; each is
+    exported and the scores are merged as in the original transcription.
+    """
+    timer = timer if timer is not None else StageTimer()
+    run_log = _open_run_log()
+    run_log.write_json(
+        "run-meta.json",
+        {
+            "mode": "reexport",
+            "input_type": input_type,
+            "source_book": str(book_path),
+            "started_at": datetime.now().isoformat(),
+            "run_log_level": run_log.level,
+        },
+    )
+    timer.bind(lambda spans: run_log.update_json("result-summary.json", {"timings": spans}))
+
+    temp = Path(mkdtemp(prefix="omr-export-"))
+    try:
+        try:
+            if book_path.is_dir():
+                books = _system_books(book_path)
+                if not books:
+                    raise OMRPipelineError(f"No system books stored in {book_path.name}")
+                scores = [
+                    _export_book(
+                        book,
+                        temp / f"system-{index}",
+                        f"export-system-{index}",
+                        run_log,
+                        cancel_event=cancel_event,
+                        timer=timer.scoped(system=index),
+                    )
+                    for index, book in enumerate(books, start=1)
+                ]
+                with timer.span("system-merge"):
+                    try:
+                        musicxml = merge_system_scores(scores, temp / "merged.musicxml")
+                    except ValueError as exc:
+                        raise OMRPipelineError(f"Cannot merge per-system scores: {exc}") from exc
+            else:
+                musicxml = _export_book(
+                    book_path, temp, "export", run_log, cancel_event=cancel_event, timer=timer
+                )
+
+            with timer.span("parse") as span:
+                result, parse_hit = _cached_parse(ArtifactCache(), musicxml, input_type)
+                span["cache_hit"] = parse_hit
+            if input_type == "pdf":
+                result.meta.warnings.append("PDF only first page is processed in MVP.")
+
+            run_log.write_json(
+                "result-summary.json",
                 {
-                    "status": "error",
-                    "error": str(exc),
-                    "traceback": traceback.format_exc(),
+                    "tempo": result.tempo,
+                    "time_signature": result.timeSignature,
+                    "note_count": len(result.notes),
+                    "status": "ok",
+                    "attempt": "reexport",
+                    "cache_hits": ["parsed-reexport"] if parse_hit else [],
+                    "timings": timer.spans,
                 },
             )
+            return result
+        except Exception as exc:
+            _record_failure(run_log, exc, timer)
             if isinstance(exc, OMRPipelineError):
-                raise OMRPipelineError(f"{exc} [run-log: {run_dir}]") from exc
+                raise type(exc)(f"{exc}{run_log.describe()}") from exc
             raise
+    finally:
+        run_log.release_workspace(temp)
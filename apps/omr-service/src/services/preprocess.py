@@ -1,16 +1,78 @@
+import math
+import os
 from pathlib import Path
+from typing import Callable
 
 import cv2
+import numpy as np
 
+from src.services.image_info import decoded_reduction, read_image_size
+from src.services.staff_detect import find_staves
 
-def preprocess_image(src: Path, dst: Path, *, scale_factor: float = 1.0) -> Path:
-    image = cv2.imread(str(src), cv2.IMREAD_GRAYSCALE)
-    if image is None:
-        raise ValueError(f"Cannot read image: {src}")
+# Bump whenever the preprocessing output for a given input changes.
+PREPROCESS_VERSION = "4"
+# No attempt feeds Audiveris more than this many megapixels.
+DEFAULT_MAX_MEGAPIXELS = 36.0
+# Binarizers are compared on a copy of the page no larger than this.
+SCORING_MEGAPIXELS = 2.0
+# Decoder-side downscaling OpenCV offers (JPEG decodes natively at these sizes).
+_REDUCED_GRAYSCALE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+
+
+Binarizer = Callable[..., np.ndarray]
+
+
+def max_megapixels() -> float:
+    raw = os.getenv("OMR_MAX_MEGAPIXELS", "")
+    try:
+        value = float(raw) if raw else DEFAULT_MAX_MEGAPIXELS
+    except ValueError:
+        return DEFAULT_MAX_MEGAPIXELS
+    return value if value > 0 else DEFAULT_MAX_MEGAPIXELS
+
+
+def budgeted_scale(size: tuple[int, int], scale_factor: float, max_pixels: float) -> float:
+    """Shrink ``scale_factor`` until ``size`` scaled by it fits in ``max_pixels``."""
+    width, height = size
+    ceiling = math.sqrt(max_pixels / (width * height))
+    return min(scale_factor, ceiling)
+
+
+def load_grayscale(src: Path, *, scale_factor: float = 1.0, max_pixels: float | None = None) -> np.ndarray:
+    """Decode ``src`` as grayscale, resized by ``scale_factor`` within the pixel budget.
+
+    When the header gives the size up front and the result is at most half
+    the source resolution, the decoder downscales while reading, so the full
+    image is never held in memory (for JPEG; PNG still decodes line by line).
+    """
     if scale_factor <= 0:
         raise ValueError("scale_factor must be greater than 0")
+    max_pixels = max_pixels if max_pixels is not None else max_megapixels() * 1e6
+
+    size = read_image_size(src)
+    image = None
+    if size is not None:
+        scale_factor = budgeted_scale(size, scale_factor, max_pixels)
+        for reduction, flag in _REDUCED_GRAYSCALE_FLAGS:
+            if scale_factor * reduction <= 1.0:
+                image = cv2.imread(str(src), flag)
+                if image is not None:
+                    # Reduced decodes round sizes up; rescale relative to what we got.
+                    scale_factor *= decoded_reduction(size, image.shape)
+                break
+    if image is None:
+        image = cv2.imread(str(src), cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            raise ValueError(f"Cannot read image: {src}")
+    # The decoded shape is authoritative (EXIF rotation swaps the header's axes).
+    height, width = image.shape[:2]
+    scale_factor = budgeted_scale((width, height), scale_factor, max_pixels)
 
-    if scale_factor != 1.0:
+    if abs(scale_factor - 1.0) > 1e-6:
         height, width = image.shape[:2]
         resized_width = max(1, int(width * scale_factor))
         resized_height = max(1, int(height * scale_factor))
@@ -20,16 +82,124 @@ def preprocess_image(src: Path, dst: Path, *, scale_factor: float = 1.0) -> Path
             (resized_width, resized_height),
             interpolation=interpolation,
         )
+    return image
+
+
+def _odd_window(window: int, scale: float) -> int:
+    return max(3, int(round(window * scale)) | 1)
+
+
+def _adaptive(window: int, offset: int) -> Binarizer:
+    def binarize(blurred: np.ndarray, scale: float = 1.0) -> np.ndarray:
+        return cv2.adaptiveThreshold(
+            blurred,
+            255,
+            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY,
+            _odd_window(window, scale),
+            offset,
+        )
+
+    return binarize
+
+
+def _otsu(blurred: np.ndarray, scale: float = 1.0) -> np.ndarray:
+    _, binary = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return binary
+
+
+def _sauvola(
+    blurred: np.ndarray,
+    scale: float = 1.0,
+    window: int = 31,
+    k: float = 0.2,
+    dynamic_range: float = 128.0,
+) -> np.ndarray:
+    """Sauvola thresholding from box-filtered mean and variance (no per-pixel loops)."""
+    size = (_odd_window(window, scale),) * 2
+    values = blurred.astype(np.float32)
+    mean = cv2.boxFilter(values, -1, size, borderType=cv2.BORDER_REFLECT)
+    squares = cv2.boxFilter(values * values, -1, size, borderType=cv2.BORDER_REFLECT)
+    std = np.sqrt(np.maximum(squares - mean * mean, 0.0))
+    threshold = mean * (1.0 + k * (std / dynamic_range - 1.0))
+    return np.where(values > threshold, 255, 0).astype(np.uint8)
+
+
+# Candidates in order of preference; the first wins ties, and it is also what
+# Audiveris gets when no candidate shows a staff. Window sizes are in pixels
+# of the full-resolution image; ``scale`` adapts them to a downsampled copy.
+BINARIZERS: dict[str, Binarizer] = {
+    "adaptive-41": _adaptive(41, 11),
+    "adaptive-21": _adaptive(21, 9),
+    "adaptive-81": _adaptive(81, 15),
+    "sauvola": _sauvola,
+    "otsu": _otsu,
+}
+
+
+def binarization_score(binary: np.ndarray) -> float:
+    """Rate a black-on-white binarization by how intact its staff lines are.
+
+    Continuity is the share of each found staff line's span that is ink,
+    summed over the staves found, so losing a staff costs more than a few
+    broken lines. It is discounted by speckle, the share of ink in components
+    of at most 4 pixels. Higher is better; 0 means no staff was found.
+    """
+    ink = cv2.bitwise_not(binary)
+    staves = find_staves(ink)
+    if not staves:
+        return 0.0
+    continuity = 0.0
+    for staff in staves:
+        span = ink[:, staff.left : staff.right + 1]
+        continuity += sum(np.count_nonzero(span[row]) for row in staff.lines) / (
+            len(staff.lines) * span.shape[1]
+        )
+    _, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    speckle = float(areas[areas <= 4].sum()) / max(1, int(areas.sum()))
+    return float(continuity * (1.0 - speckle))
+
+
+def choose_binarization(gray: np.ndarray) -> tuple[str, np.ndarray, dict[str, float]]:
+    """Score every binarizer on a small copy of the page and apply the best one.
+
+    Candidates are compared on a copy of at most ``SCORING_MEGAPIXELS`` so
+    that scoring stays cheap next to one full-size binarization. Returns
+    ``(name, binary, scores)``.
+    """
+    scale = min(1.0, math.sqrt(SCORING_MEGAPIXELS * 1e6 / (gray.shape[0] * gray.shape[1])))
+    sample = gray
+    if scale < 1.0:
+        sample = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    blurred_sample = cv2.GaussianBlur(sample, (3, 3), 0)
+
+    best_name, best_score = next(iter(BINARIZERS)), 0.0
+    best_binary: np.ndarray | None = None
+    scores: dict[str, float] = {}
+    for name, binarize in BINARIZERS.items():
+        binary = binarize(blurred_sample, scale)
+        scores[name] = round(binarization_score(binary), 4)
+        if scores[name] > best_score:
+            best_name, best_score = name, scores[name]
+            best_binary = binary if scale == 1.0 else None
+
+    if best_binary is None:
+        best_binary = BINARIZERS[best_name](cv2.GaussianBlur(gray, (3, 3), 0))
+    return best_name, best_binary, scores
+
 
-    blurred = cv2.GaussianBlur(image, (3, 3), 0)
-    normalized = cv2.adaptiveThreshold(
-        blurred,
-        255,
-        cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-        cv2.THRESH_BINARY,
-        41,
-        11,
-    )
+def preprocess_image(
+    src: Path, dst: Path, *, scale_factor: float = 1.0, report: dict | None = None
+) -> Path:
+    """Write the binarized page to ``dst``.
 
+    ``report``, when given, receives the chosen ``binarizer`` and every
+    candidate's score under ``binarizer_scores``.
+    """
+    image = load_grayscale(src, scale_factor=scale_factor)
+    name, normalized, scores = choose_binarization(image)
     cv2.imwrite(str(dst), normalized)
+    if report is not None:
+        report.update(binarizer=name, binarizer_scores=scores)
     return dst
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from collections import Counter
+import json
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+from types import FrameType
+
+from src.services.run_log import new_run_dir, run_log_level
+
+DEFAULT_INTERVAL_SECONDS = 0.005
+DEFAULT_MAX_PER_MINUTE = 6
+PROFILE_HEADER = "X-OMR-Profile"
+# Leaf frames of threads that are just parked (thread pools, the run-log writer, selectors).
+_IDLE_LEAVES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+}
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{Path(code.co_filename).stem}:{code.co_name}:{frame.f_lineno}"
+
+
+def _is_idle(frame: FrameType) -> bool:
+    code = frame.f_code
+    return (Path(code.co_filename).name, code.co_name) in _IDLE_LEAVES
+
+
+class SamplingProfiler:
+    """Wall-clock sampler over every thread, producing collapsed stacks.
+
+    Each sample walks ``sys._current_frames()``; stacks are keyed by thread
+    name so the event loop and pipeline worker threads stay apart. Work from
+    other requests running at the same time shows up too.
+    """
+
+    def __init__(self, interval_seconds: float = DEFAULT_INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.samples: Counter[str] = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._started_at = 0.0
+        self.elapsed_seconds = 0.0
+
+    def start(self) -> None:
+        self._started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="omr-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.elapsed_seconds = time.perf_counter() - self._started_at
+
+    def _sample_loop(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval_seconds):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or _is_idle(frame):
+                    continue
+                stack: list[str] = []
+                current: FrameType | None = frame
+                while current is not None:
+                    stack.append(_frame_label(current))
+                    current = current.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def collapsed(self) -> str:
+        """Brendan Gregg's collapsed format, ready for flamegraph.pl or speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfileBudget:
+    """Allow at most ``max_per_minute`` profiled requests per rolling minute window."""
+
+    def __init__(self, max_per_minute: int | None = None):
+        if max_per_minute is None:
+            raw = os.getenv("OMR_PROFILE_MAX_PER_MINUTE", "")
+            try:
+                max_per_minute = int(raw) if raw else DEFAULT_MAX_PER_MINUTE
+            except ValueError:
+                max_per_minute = DEFAULT_MAX_PER_MINUTE
+        self.max_per_minute = max(0, max_per_minute)
+        self._window_start = 0.0
+        self._used = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            if now - self._window_start >= 60:
+                self._window_start = now
+                self._used = 0
+            if self._used >= self.max_per_minute:
+                return False
+            self._used += 1
+            return True
+
+
+def profiling_requested(header_value: str | None) -> bool:
+    """Profile when ``OMR_PROFILE=1`` or the request carries ``X-OMR-Profile: 1``."""
+    if os.getenv("OMR_PROFILE", "") == "1":
+        return True
+    return (header_value or "").strip().lower() in {"1", "true", "yes"}
+
+
+def write_profile(profiler: SamplingProfiler, meta: dict, run_dir: Path | None = None) -> Path | None:
+    """Write ``profile.collapsed`` and ``profile-meta.json`` next to the request's run log.
+
+    ``run_dir`` is the recognition's run-log directory; requests that did not
+    create one get a fresh directory. Nothing is written when run logging is off.
+    """
+    if run_log_level() == "off":
+        return None
+    run_dir = run_dir if run_dir is not None else new_run_dir()
+    (run_dir / "profile.collapsed").write_text(profiler.collapsed(), encoding="utf-8")
+    (run_dir / "profile-meta.json").write_text(
+        json.dumps(
+            {
+                **meta,
+                "elapsed_seconds": round(profiler.elapsed_seconds, 3),
+                "samples": profiler.sample_count,
+                "interval_seconds": profiler.interval_seconds,
+            },
+            ensure_ascii=False,
+            indent=2,
+        ),
+        encoding="utf-8",
+    )
+    return run_dir
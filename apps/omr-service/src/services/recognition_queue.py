@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+import itertools
+import math
+import os
+import time
+from typing import AsyncIterator, Literal
+
+DEFAULT_JOB_MEMORY_MB = 1536
+DEFAULT_QUEUE_PER_SLOT = 4
+# Seed for the Retry-After estimate until real job durations are observed.
+DEFAULT_JOB_SECONDS = 30.0
+DEFAULT_AGING_SECONDS = 30.0
+
+Priority = Literal["interactive", "bulk", "background"]
+PRIORITY_CLASSES: tuple[Priority, ...] = ("interactive", "bulk", "background")
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the recognition queue cannot accept more work."""
+
+    def __init__(self, message: str, *, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _read_int_env(name: str) -> int | None:
+    raw = os.getenv(name, "")
+    try:
+        return int(raw) if raw else None
+    except ValueError:
+        return None
+
+
+def _available_memory_bytes() -> int | None:
+    try:
+        with open("/proc/meminfo", encoding="utf-8") as handle:
+            for line in handle:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def default_concurrency() -> int:
+    """Size OMR concurrency from CPU count and memory available for Audiveris JVMs."""
+    cpus = os.cpu_count() or 1
+    job_memory = (_read_int_env("OMR_JOB_MEMORY_MB") or DEFAULT_JOB_MEMORY_MB) * 1024 * 1024
+    available = _available_memory_bytes()
+    by_memory = available // job_memory if available else cpus
+    return max(1, min(cpus, by_memory))
+
+
+def configured_concurrency() -> int:
+    """Queue slots: ``OMR_MAX_CONCURRENCY``, else sized by ``default_concurrency``."""
+    return max(1, _read_int_env("OMR_MAX_CONCURRENCY") or default_concurrency())
+
+
+def jobs_per_slot(requested: int) -> int:
+    """Cap the Audiveris JVMs one queue slot runs at once to its share of the budget.
+
+    Every slot may be running several JVMs at the same time, so a slot gets
+    ``default_concurrency() // slots`` of them (CPU count and
+    ``OMR_JOB_MEMORY_MB`` per JVM), and always at least one.
+    """
+    return max(1, min(requested, default_concurrency() // configured_concurrency()))
+
+
+@dataclass(slots=True)
+class _Waiter:
+    future: asyncio.Future[None]
+    rank: int
+    cost: float
+    enqueued_at: float
+    sequence: int
+
+    def sort_key(self, now: float, aging_seconds: float) -> tuple[float, float, int]:
+        # Every aging period spent waiting promotes the job by one priority class.
+        promoted = (now - self.enqueued_at) / aging_seconds if aging_seconds > 0 else 0.0
+        return (self.rank - math.floor(promoted), self.cost, self.sequence)
+
+
+@dataclass(slots=True)
+class _ClassStats:
+    completed: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+    total_job_seconds: float = 0.0
+
+    def as_dict(self) -> dict[str, float | int]:
+        count = self.completed or 1
+        return {
+            "completed": self.completed,
+            "avgWaitMs": round(self.total_wait_seconds / count * 1000, 1),
+            "maxWaitMs": round(self.max_wait_seconds * 1000, 1),
+            "avgLatencyMs": round(
+                (self.total_wait_seconds + self.total_job_seconds) / count * 1000, 1
+            ),
+        }
+
+
+class RecognitionQueue:
+    """Bounded admission queue in front of the OMR pipeline.
+
+    At most ``max_concurrency`` jobs run at once and at most ``max_queue``
+    wait behind them; anything beyond that is rejected immediately with
+    ``QueueFullError`` so callers can shed load instead of piling up JVMs.
+
+    Waiting jobs are served by priority class first and shortest estimated
+    cost second. Waiting ages a job into higher classes so bulk work is never
+    starved by a steady stream of interactive uploads.
+    """
+
+    def __init__(self, max_concurrency: int | None = None, max_queue: int | None = None):
+        self.max_concurrency = max(1, max_concurrency or configured_concurrency())
+        configured_queue = max_queue if max_queue is not None else _read_int_env("OMR_MAX_QUEUE")
+        self.max_queue = max(
+            0,
+            configured_queue
+            if configured_queue is not None
+            else self.max_concurrency * DEFAULT_QUEUE_PER_SLOT,
+        )
+        aging_raw = os.getenv("OMR_PRIORITY_AGING_SECONDS", "")
+        try:
+            self.aging_seconds = float(aging_raw) if aging_raw else DEFAULT_AGING_SECONDS
+        except ValueError:
+            self.aging_seconds = DEFAULT_AGING_SECONDS
+        self._running = 0
+        self._waiters: list[_Waiter] = []
+        self._sequence = itertools.count()
+        self._class_stats = {name: _ClassStats() for name in PRIORITY_CLASSES}
+        self._avg_job_seconds = DEFAULT_JOB_SECONDS
+        self._avg_wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._completed = 0
+        self._rejected = 0
+
+    def _retry_after(self) -> int:
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._avg_job_seconds * backlog / self.max_concurrency))
+
+    def _release(self) -> None:
+        now = time.perf_counter()
+        while self._waiters:
+            waiter = min(self._waiters, key=lambda item: item.sort_key(now, self.aging_seconds))
+            self._waiters.remove(waiter)
+            if not waiter.future.done():
+                # Hand the slot straight to the next waiter; _running stays the same.
+                waiter.future.set_result(None)
+                return
+        self._running -= 1
+
+    async def _acquire(self, priority: Priority, cost: float) -> None:
+        if self._running < self.max_concurrency and not self._waiters:
+            self._running += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self._rejected += 1
+            raise QueueFullError(
+                "Recognition queue is full; retry later",
+                retry_after=self._retry_after(),
+            )
+
+        waiter = _Waiter(
+            future=asyncio.get_running_loop().create_future(),
+            rank=PRIORITY_CLASSES.index(priority),
+            cost=cost,
+            enqueued_at=time.perf_counter(),
+            sequence=next(self._sequence),
+        )
+        self._waiters.append(waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def _observe(self, priority: Priority, wait_seconds: float, job_seconds: float) -> None:
+        self._completed += 1
+        class_stats = self._class_stats[priority]
+        class_stats.completed += 1
+        class_stats.total_wait_seconds += wait_seconds
+        class_stats.max_wait_seconds = max(class_stats.max_wait_seconds, wait_seconds)
+        class_stats.total_job_seconds += job_seconds
+        weight = 0.2
+        self._avg_wait_seconds += weight * (wait_seconds - self._avg_wait_seconds)
+        self._avg_job_seconds += weight * (job_seconds - self._avg_job_seconds)
+        self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+
+    @asynccontextmanager
+    async def slot(
+        self, *, priority: Priority = "interactive", cost: float = 1.0
+    ) -> AsyncIterator[float]:
+        """Hold one OMR slot for the duration of the block; yields the queue wait in seconds.
+
+        ``cost`` is the estimated job size (megapixels) used for
+        shortest-job-first ordering within a priority class.
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        queued_at = time.perf_counter()
+        await self._acquire(priority, cost)
+        started_at = time.perf_counter()
+        try:
+            yield started_at - queued_at
+        finally:
+            self._release()
+            self._observe(priority, started_at - queued_at, time.perf_counter() - started_at)
+
+    def stats(self) -> dict[str, object]:
+        return {
+            "running": self._running,
+            "queued": len(self._waiters),
+            "maxConcurrency": self.max_concurrency,
+            "maxQueue": self.max_queue,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "avgWaitMs": round(self._avg_wait_seconds * 1000, 1),
+            "maxWaitMs": round(self._max_wait_seconds * 1000, 1),
+            "avgJobMs": round(self._avg_job_seconds * 1000, 1),
+            "queuedByClass": {
+                name: sum(1 for waiter in self._waiters if waiter.rank == rank)
+                for rank, name in enumerate(PRIORITY_CLASSES)
+            },
+            "classes": {name: stats.as_dict() for name, stats in self._class_stats.items()},
+        }
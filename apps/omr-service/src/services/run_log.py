@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import atexit
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+import queue
+import shutil
+import threading
+import time
+from typing import Any, Callable, Iterator, Literal
+from uuid import uuid4
+
+from src.services.artifact_cache import hash_file
+from src.services.metrics import RUN_LOG_DISK_BYTES
+
+RunLogLevel = Literal["off", "summary", "full"]
+RUN_LOG_LEVELS: tuple[RunLogLevel, ...] = ("off", "summary", "full")
+DEFAULT_RUN_LOG_LEVEL: RunLogLevel = "summary"
+DEFAULT_MAX_AGE_DAYS = 14.0
+DEFAULT_MAX_MB = 2048
+BLOBS_DIR_NAME = ".blobs"
+# Retention walks the whole run-log tree, so run it at most this often.
+PRUNE_INTERVAL_SECONDS = 60.0
+
+# Run directories created under ``capture_run_dirs``; contexts are copied into
+# tasks and ``asyncio.to_thread`` calls, so the pipeline's directories land here.
+_captured_run_dirs: ContextVar[list[Path] | None] = ContextVar("captured_run_dirs", default=None)
+
+
+def run_log_level() -> RunLogLevel:
+    raw = os.getenv("OMR_RUN_LOG_LEVEL", "").strip().lower()
+    return raw if raw in RUN_LOG_LEVELS else DEFAULT_RUN_LOG_LEVEL  # type: ignore[return-value]
+
+
+def log_base_dir() -> Path:
+    configured_raw = os.getenv("OMR_RUN_LOG_DIR")
+    if configured_raw:
+        return Path(configured_raw).expanduser()
+    return Path(__file__).resolve().parents[2] / "run-logs"
+
+
+def new_run_dir() -> Path:
+    run_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid4().hex[:8]}"
+    run_dir = log_base_dir() / run_id
+    run_dir.mkdir(parents=True, exist_ok=True)
+    captured = _captured_run_dirs.get()
+    if captured is not None:
+        captured.append(run_dir)
+    return run_dir
+
+
+@contextmanager
+def capture_run_dirs() -> Iterator[list[Path]]:
+    """Collect the run directories created by work started inside the block."""
+    captured: list[Path] = []
+    token = _captured_run_dirs.set(captured)
+    try:
+        yield captured
+    finally:
+        _captured_run_dirs.reset(token)
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name, "")
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        return default
+
+
+def _store_blob(base_dir: Path, src: Path, dst: Path) -> None:
+    """Store ``src`` once under ``<base>/.blobs`` by content hash and hard-link it to ``dst``."""
+    digest = hash_file(src)
+    blob = base_dir / BLOBS_DIR_NAME / digest[:2] / digest
+    if not blob.exists():
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        staging = blob.with_name(f".{digest}.{threading.get_ident()}.tmp")
+        shutil.copyfile(src, staging)
+        os.replace(staging, blob)
+
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(blob, dst)
+    except OSError:
+        shutil.copyfile(blob, dst)
+
+
+def _file_share(path: Path) -> float:
+    # Hard-linked files are shared with the blob store and possibly other runs.
+    stat = path.stat()
+    return stat.st_size if stat.st_nlink <= 1 else stat.st_size / (stat.st_nlink - 1)
+
+
+def prune_run_logs(base_dir: Path, *, max_age_days: float, max_bytes: int) -> int:
+    """Delete runs older than ``max_age_days``, then oldest runs until under ``max_bytes``.
+
+    Blobs no longer linked from any run are removed afterwards. Returns the
+    approximate bytes still in use.
+    """
+    if not base_dir.exists():
+        return 0
+
+    runs: list[tuple[float, float, Path]] = []
+    for run_dir in base_dir.iterdir():
+        if not run_dir.is_dir() or run_dir.name == BLOBS_DIR_NAME:
+            continue
+        try:
+            size = sum(_file_share(path) for path in run_dir.rglob("*") if path.is_file())
+            runs.append((run_dir.stat().st_mtime, size, run_dir))
+        except OSError:
+            continue
+    runs.sort(key=lambda item: item[0])
+
+    cutoff = time.time() - max_age_days * 86400
+    total = sum(size for _, size, _ in runs)
+    for mtime, size, run_dir in runs:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        shutil.rmtree(run_dir, ignore_errors=True)
+        total -= size
+
+    blobs_dir = base_dir / BLOBS_DIR_NAME
+    if blobs_dir.exists():
+        for blob in blobs_dir.glob("*/*"):
+            try:
+                if blob.stat().st_nlink <= 1:
+                    blob.unlink()
+            except OSError:
+                continue
+    return int(max(total, 0))
+
+
+class RunLogWriter:
+    """Single background thread that performs run-log copies off the request path.
+
+    Tasks run in submission order, so a workspace cleanup submitted after
+    its artifact copies only runs once those copies are done.
+    """
+
+    def __init__(self) -> None:
+        self._queue: queue.Queue[tuple[Callable[..., Any], tuple[Any, ...]]] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._last_prune: dict[Path, float] = {}
+        self.disk_usage_bytes: dict[Path, int] = {}
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._work, name="run-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _work(self) -> None:
+        while True:
+            func, args = self._queue.get()
+            try:
+                func(*args)
+            except Exception:
+                # Run logs are best-effort diagnostics; never let them kill the writer.
+                pass
+            finally:
+                self._queue.task_done()
+
+    def submit(self, func: Callable[..., Any], *args: Any) -> None:
+        self._ensure_thread()
+        self._queue.put((func, args))
+
+    def flush(self) -> None:
+        if self._thread is not None:
+            self._queue.join()
+
+    def maybe_prune(self, base_dir: Path) -> None:
+        now = time.monotonic()
+        last = self._last_prune.get(base_dir)
+        if last is not None and now - last < PRUNE_INTERVAL_SECONDS:
+            return
+        self._last_prune[base_dir] = now
+        self.submit(self._prune, base_dir)
+
+    def _prune(self, base_dir: Path) -> None:
+        self.disk_usage_bytes[base_dir] = prune_run_logs(
+            base_dir,
+            max_age_days=_env_float("OMR_RUN_LOG_MAX_AGE_DAYS", DEFAULT_MAX_AGE_DAYS),
+            max_bytes=int(_env_float("OMR_RUN_LOG_MAX_MB", DEFAULT_MAX_MB) * 1024 * 1024),
+        )
+
+
+_writer = RunLogWriter()
+atexit.register(_writer.flush)
+RUN_LOG_DISK_BYTES.set_function(
+    lambda: sum(_writer.disk_usage_bytes.values()) if _writer.disk_usage_bytes else None
+)
+
+
+def get_writer() -> RunLogWriter:
+    return _writer
+
+
+def flush_run_logs() -> None:
+    """Block until every queued run-log write has finished."""
+    _writer.flush()
+
+
+class RunLog:
+    """Run-log directory of one recognition, honouring the configured level.
+
+    ``summary`` keeps JSON summaries and Audiveris logs; ``full`` also keeps
+    input, intermediate images and Audiveris output (deduplicated, written
+    in the background); ``off`` writes nothing.
+    """
+
+    def __init__(self, run_dir: Path | None, level: RunLogLevel, writer: RunLogWriter | None = None):
+        self.run_dir = run_dir if level != "off" else None
+        self.level = level
+        self.writer = writer or get_writer()
+
+    @property
+    def enabled(self) -> bool:
+        return self.run_dir is not None
+
+    @property
+    def keeps_artifacts(self) -> bool:
+        return self.run_dir is not None and self.level == "full"
+
+    def describe(self) -> str:
+        return f" [run-log: {self.run_dir}]" if self.run_dir is not None else ""
+
+    def write_json(self, name: str, payload: dict) -> None:
+        if self.run_dir is None:
+            return
+        (self.run_dir / name).write_text(
+            json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+    def update_json(self, name: str, fields: dict) -> None:
+        """Merge ``fields`` into an existing JSON file written by ``write_json``."""
+        if self.run_dir is None:
+            return
+        path = self.run_dir / name
+        try:
+            payload = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            payload = {}
+        payload.update(fields)
+        self.write_json(name, payload)
+
+    def subdir(self, name: str) -> Path | None:
+        return self.run_dir / name if self.run_dir is not None else None
+
+    def copy_artifact(self, src: Path, name: str) -> None:
+        if not self.keeps_artifacts:
+            return
+        assert self.run_dir is not None
+        self.writer.submit(_store_blob, self.run_dir.parent, src, self.run_dir / name)
+
+    def copy_tree(self, src_dir: Path, name: str) -> None:
+        if not self.keeps_artifacts:
+            return
+        assert self.run_dir is not None
+        self.writer.submit(self._copy_tree, src_dir, self.run_dir / name)
+
+    def _copy_tree(self, src_dir: Path, dst_dir: Path) -> None:
+        if not src_dir.exists():
+            return
+        for path in src_dir.rglob("*"):
+            if path.is_file():
+                _store_blob(self.run_dir.parent, path, dst_dir / path.relative_to(src_dir))
+
+    def release_workspace(self, workspace: Path) -> None:
+        """Delete ``workspace`` once the artifacts queued from it have been written."""
+        self.writer.submit(shutil.rmtree, workspace, True)
+        if self.run_dir is not None:
+            self.writer.maybe_prune(self.run_dir.parent)
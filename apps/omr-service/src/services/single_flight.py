@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager, suppress
+import fcntl
+import os
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+@asynccontextmanager
+async def _file_lock(lock_path: Path) -> AsyncIterator[None]:
+    """Hold an exclusive ``flock`` on ``lock_path``, deleting the file on release.
+
+    The holder unlinks the file before unlocking, so a waiter can end up
+    holding a lock on a file that is no longer at ``lock_path``; it then
+    retries on the current file.
+    """
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    while True:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            try:
+                current = os.stat(lock_path)
+            except FileNotFoundError:
+                current = None
+        except BaseException:
+            os.close(fd)
+            raise
+        if current is not None and os.path.samestat(current, os.fstat(fd)):
+            break
+        os.close(fd)
+    try:
+        yield
+    finally:
+        with suppress(FileNotFoundError):
+            os.unlink(lock_path)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+class SingleFlight(Generic[T]):
+    """Coalesce concurrent calls that share a key into one running job.
+
+    Within a worker, later callers await the task started by the first one.
+    Across workers, the job body runs under an exclusive ``flock`` on
+    ``lock_path``; the body is expected to re-check shared state (e.g. the
+    catalog) once it holds the lock, since another worker may have finished
+    the same job while it was waiting.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: dict[str, asyncio.Future[T]] = {}
+        self._waiters: dict[str, int] = {}
+
+    def inflight_keys(self) -> list[str]:
+        return list(self._inflight)
+
+    async def _run_locked(
+        self, factory: Callable[[], Awaitable[T]], lock_path: Path | None
+    ) -> T:
+        if lock_path is None:
+            return await factory()
+        async with _file_lock(lock_path):
+            return await factory()
+
+    def _forget(self, key: str, task: asyncio.Future[T]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved even if every waiter went away.
+            task.exception()
+
+    async def run(
+        self,
+        key: str,
+        factory: Callable[[], Awaitable[T]],
+        *,
+        lock_path: Path | None = None,
+    ) -> tuple[T, bool]:
+        """Run ``factory`` once per key; returns ``(result, shared)``.
+
+        ``shared`` is True when the caller attached to a job started by
+        another request. The job is shielded, so a caller being cancelled does
+        not cancel work other callers are waiting on; the job itself is
+        cancelled only once its last waiter is gone.
+        """
+        task = self._inflight.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(self._run_locked(factory, lock_path))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if self._waiters.get(key) == 1 and not task.done():
+                task.cancel()
+            raise
+        finally:
+            remaining = self._waiters.get(key, 1) - 1
+            if remaining > 0:
+                self._waiters[key] = remaining
+            else:
+                self._waiters.pop(key, None)
@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass, field
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from src.services.image_info import decoded_reduction, read_image_size
+
+# Bump whenever the detected boxes for a given image change.
+STAFF_DETECT_VERSION = "1"
+# A staff line must run across at least this share of the page width.
+MIN_LINE_WIDTH_RATIO = 0.25
+# Skip cropping when it would keep nearly the whole page anyway.
+MAX_USEFUL_AREA_RATIO = 0.9
+# Ledger lines, stems and dynamics reach this many interlines beyond a staff.
+STAFF_MARGIN_INTERLINES = 4.0
+# Interline estimation decodes at most this many megapixels (reduced decode).
+PROBE_MEGAPIXELS = 16.0
+_PROBE_DECODES = (
+    (1, cv2.IMREAD_GRAYSCALE),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+)
+
+Box = tuple[int, int, int, int]
+
+
+def staff_crop_enabled() -> bool:
+    return os.getenv("OMR_STAFF_CROP", "1") != "0"
+
+
+@dataclass(slots=True)
+class Staff:
+    lines: list[int]
+    left: int
+    right: int
+
+    @property
+    def top(self) -> int:
+        return self.lines[0]
+
+    @property
+    def bottom(self) -> int:
+        return self.lines[-1]
+
+    @property
+    def interline(self) -> float:
+        return (self.bottom - self.top) / (len(self.lines) - 1)
+
+
+@dataclass(slots=True)
+class StaffCrop:
+    """Where the staff systems of a page are and which part of it was kept.
+
+    Boxes are ``(x, y, width, height)`` in pixels of the page as decoded for
+    cropping, which is ``scale`` times the source resolution (below 1 when the
+    pixel budget reduced the decode); ``interline`` is in source pixels. A
+    point in the cropped image maps back to the source through ``to_source``.
+    """
+
+    source_size: tuple[int, int]
+    crop_box: Box
+    systems: list[Box] = field(default_factory=list)
+    interline: float = 0.0
+    scale: float = 1.0
+
+    def to_source(self, x: float, y: float) -> tuple[float, float]:
+        return (x + self.crop_box[0]) / self.scale, (y + self.crop_box[1]) / self.scale
+
+    def as_dict(self) -> dict:
+        payload = asdict(self)
+        payload["version"] = STAFF_DETECT_VERSION
+        return payload
+
+
+def _line_rows(binary: np.ndarray) -> tuple[list[int], np.ndarray]:
+    """Return centre rows of long horizontal lines and the line mask."""
+    width = binary.shape[1]
+    kernel_width = max(15, int(width * MIN_LINE_WIDTH_RATIO / 2))
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel_width, 1))
+    lines = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+    projection = np.count_nonzero(lines, axis=1)
+    rows = np.flatnonzero(projection >= width * MIN_LINE_WIDTH_RATIO)
+
+    centres: list[int] = []
+    start = previous = None
+    for row in rows:
+        if start is None:
+            start = previous = row
+        elif row == previous + 1:
+            previous = row
+        else:
+            centres.append(int(start + previous) // 2)
+            start = previous = row
+    if start is not None:
+        centres.append(int(start + previous) // 2)
+    return centres, lines
+
+
+def _group_staves(rows: list[int], lines_mask: np.ndarray) -> list[Staff]:
+    """Group line rows into five-line staves with even spacing."""
+    staves: list[Staff] = []
+    index = 0
+    while index + 4 < len(rows):
+        candidate = rows[index : index + 5]
+        gaps = np.diff(candidate)
+        spacing = float(np.median(gaps))
+        if spacing >= 3 and np.all(np.abs(gaps - spacing) <= max(2.0, spacing * 0.25)):
+            columns = np.flatnonzero(np.count_nonzero(lines_mask[candidate[0] : candidate[-1] + 1], axis=0))
+            staves.append(Staff(lines=list(candidate), left=int(columns[0]), right=int(columns[-1])))
+            index += 5
+        else:
+            index += 1
+    return staves
+
+
+def find_staves(binary: np.ndarray) -> list[Staff]:
+    """Five-line staves in a white-on-black (ink = 255) binary image."""
+    rows, lines_mask = _line_rows(binary)
+    return _group_staves(rows, lines_mask)
+
+
+def _group_systems(staves: list[Staff], binary: np.ndarray) -> list[list[Staff]]:
+    """Join staves that a vertical stroke (barline, brace) connects into one system."""
+    if not staves:
+        return []
+    interline = float(np.median([staff.interline for staff in staves]))
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, max(3, int(interline * 3))))
+    vertical = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+    _, labels = cv2.connectedComponents(vertical, connectivity=8)
+
+    def labels_in(staff: Staff) -> set[int]:
+        band = labels[staff.top : staff.bottom + 1, staff.left : staff.right + 1]
+        return set(np.unique(band).tolist()) - {0}
+
+    systems: list[list[Staff]] = [[staves[0]]]
+    previous_labels = labels_in(staves[0])
+    for staff in staves[1:]:
+        current_labels = labels_in(staff)
+        if previous_labels & current_labels:
+            systems[-1].append(staff)
+        else:
+            systems.append([staff])
+        previous_labels = current_labels
+    return systems
+
+
+def detect_staff_systems(gray: np.ndarray) -> StaffCrop | None:
+    """Locate staff systems on a grayscale page; None when no staff is found."""
+    height, width = gray.shape[:2]
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    staves = find_staves(binary)
+    if not staves:
+        return None
+
+    interline = float(np.median([staff.interline for staff in staves]))
+    margin = int(round(interline * STAFF_MARGIN_INTERLINES))
+    boxes: list[Box] = []
+    for system in _group_systems(staves, binary):
+        top = max(0, system[0].top - margin)
+        bottom = min(height, system[-1].bottom + margin + 1)
+        left = max(0, min(staff.left for staff in system) - margin)
+        right = min(width, max(staff.right for staff in system) + margin + 1)
+        boxes.append((left, top, right - left, bottom - top))
+
+    # Neighbouring margins may overlap; split the difference so bands never cross.
+    for index in range(1, len(boxes)):
+        previous, current = boxes[index - 1], boxes[index]
+        if previous[1] + previous[3] > current[1]:
+            middle = (previous[1] + previous[3] + current[1]) // 2
+            boxes[index - 1] = (previous[0], previous[1], previous[2], middle - previous[1])
+            boxes[index] = (current[0], middle, current[2], current[1] + current[3] - middle)
+
+    left = min(box[0] for box in boxes)
+    top = min(box[1] for box in boxes)
+    right = max(box[0] + box[2] for box in boxes)
+    bottom = max(box[1] + box[3] for box in boxes)
+    return StaffCrop(
+        source_size=(width, height),
+        crop_box=(left, top, right - left, bottom - top),
+        systems=boxes,
+        interline=round(interline, 2),
+    )
+
+
+def estimate_interline(src: Path) -> float | None:
+    """Median staff-line spacing of ``src`` in source pixels, from a reduced decode.
+
+    None when the image cannot be read or shows no recognisable staff.
+    """
+    size = read_image_size(src)
+    reduction, flag = _PROBE_DECODES[0]
+    if size is not None:
+        for reduction, flag in _PROBE_DECODES:
+            if size[0] * size[1] / reduction**2 <= PROBE_MEGAPIXELS * 1e6:
+                break
+    gray = cv2.imread(str(src), flag)
+    if gray is None:
+        return None
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    staves = find_staves(binary)
+    if not staves:
+        return None
+    scale = decoded_reduction(size, gray.shape) if size is not None else 1.0
+    return round(float(np.median([staff.interline for staff in staves])) * scale, 2)
+
+
+def crop_to_staff_systems(src: Path, dst: Path) -> StaffCrop | None:
+    """Write ``src`` cropped to its staff systems, blanking everything between them.
+
+    Lyrics, jianpu and titles between or around systems become white. The
+    page is decoded within the attempts' pixel budget (reduced while decoding
+    where possible) and the crop keeps that resolution. Returns None (and
+    writes nothing) when the image cannot be read, no staff is found, or the
+    crop would keep almost the whole page.
+    """
+    # Imported here: preprocess takes find_staves from this module.
+    from src.services.preprocess import load_grayscale
+
+    try:
+        gray = load_grayscale(src)
+    except ValueError:
+        return None
+    crop = detect_staff_systems(gray)
+    if crop is None:
+        return None
+    size = read_image_size(src)
+    if size is not None:
+        crop.source_size = size
+        crop.scale = round(1 / decoded_reduction(size, gray.shape), 4)
+        crop.interline = round(crop.interline / crop.scale, 2)
+    x, y, w, h = crop.crop_box
+    kept = sum(box[2] * box[3] for box in crop.systems)
+    if kept > MAX_USEFUL_AREA_RATIO * gray.shape[0] * gray.shape[1]:
+        return None
+
+    cropped = np.full((h, w), 255, dtype=np.uint8)
+    for left, top, width, height in crop.systems:
+        cropped[top - y : top - y + height, left - x : left - x + width] = gray[
+            top : top + height, left : left + width
+        ]
+    if not cv2.imwrite(str(dst), cropped):
+        return None
+    return crop
+
+
+def write_system_images(cropped: Path, crop: StaffCrop, dst_dir: Path) -> list[Path]:
+    """Write each system of the page ``crop_to_staff_systems`` wrote to ``cropped``
+    to its own image, in page order."""
+    gray = cv2.imread(str(cropped), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError(f"Cannot decode image: {cropped.name}")
+    x, y = crop.crop_box[:2]
+    dst_dir.mkdir(parents=True, exist_ok=True)
+    paths: list[Path] = []
+    for index, (left, top, width, height) in enumerate(crop.systems, start=1):
+        dst = dst_dir / f"system-{index}.png"
+        system = gray[top - y : top - y + height, left - x : left - x + width]
+        if not cv2.imwrite(str(dst), system):
+            raise ValueError(f"Cannot write system image: {dst.name}")
+        paths.append(dst)
+    return paths
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+import os
+import time
+from typing import Any, Callable, Iterator
+
+from src.services.metrics import STAGE_SECONDS
+
+
+def debug_timings_enabled() -> bool:
+    return os.getenv("OMR_DEBUG_TIMINGS", "") == "1"
+
+
+class StageTimer:
+    """Collect wall-clock spans for the stages of one recognition.
+
+    Spans are plain dicts (``stage``, ``ms`` plus optional ``attempt``,
+    ``cpu_ms``, ``max_rss_mb``) in the order the stages finished, so they can
+    go straight into run-log JSON. A stage that runs several times (once per
+    attempt, say) produces one span per run.
+    """
+
+    def __init__(self, **attrs: Any) -> None:
+        self.spans: list[dict[str, Any]] = []
+        self._attrs = attrs
+        self._sink: Callable[[list[dict[str, Any]]], None] | None = None
+        self._listeners: list[Callable[[str, dict[str, Any]], None]] = []
+
+    def scoped(self, **attrs: Any) -> StageTimer:
+        """Return a timer that shares these spans and tags its own with ``attrs``."""
+        child = StageTimer(**{**self._attrs, **attrs})
+        child.spans = self.spans
+        child._listeners = self._listeners
+        return child
+
+    def listen(self, listener: Callable[[str, dict[str, Any]], None]) -> None:
+        """Call ``listener("start", stage)`` as spans open and ``listener("end", span)`` as they close.
+
+        Scoped timers share listeners. Stages run on pipeline threads, so a
+        listener must be thread-safe and must not block.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, phase: str, span: dict[str, Any]) -> None:
+        for listener in self._listeners:
+            listener(phase, span)
+
+    @contextmanager
+    def span(self, stage: str, **attrs: Any) -> Iterator[dict[str, Any]]:
+        """Time the block; the yielded dict can be extended with extra attributes."""
+        extra: dict[str, Any] = {}
+        if self._listeners:
+            self._notify("start", {"stage": stage, **self._tags(attrs)})
+        started = time.perf_counter()
+        try:
+            yield extra
+        finally:
+            self.add(stage, (time.perf_counter() - started) * 1000, **{**attrs, **extra})
+
+    def _tags(self, attrs: dict[str, Any]) -> dict[str, Any]:
+        merged = {**self._attrs, **attrs}
+        return {key: value for key, value in merged.items() if value is not None}
+
+    def add(self, stage: str, ms: float, **attrs: Any) -> None:
+        span = {"stage": stage, "ms": round(ms, 2)}
+        span.update(self._tags(attrs))
+        self.spans.append(span)
+        STAGE_SECONDS.observe(ms / 1000, stage=stage)
+        self._notify("end", span)
+
+    def total_ms(self, stage: str) -> float:
+        return round(sum(span["ms"] for span in self.spans if span["stage"] == stage), 2)
+
+    def bind(self, sink: Callable[[list[dict[str, Any]]], None]) -> None:
+        """Register where ``publish`` writes spans recorded after the pipeline returned."""
+        self._sink = sink
+
+    def publish(self) -> None:
+        if self._sink is not None:
+            self._sink(list(self.spans))
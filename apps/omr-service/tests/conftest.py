@@ -0,0 +1,10 @@
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _isolated_artifact_cache(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_CACHE_DIR", str(tmp_path / "artifact-cache"))
+    # Pipeline tests must not leave run logs in the checkout.
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(tmp_path / "run-logs"))
@@ -1,10 +1,17 @@
+import asyncio
 from io import BytesIO
+import json
+import os
 from pathlib import Path
+import time
+import zipfile
 
 from fastapi.testclient import TestClient
+import httpx
 
 from src.main import app
 from src.models import PlaybackEvent, RecognizeResponse, RecognizedNote, ResponseMeta
+from src.services.errors import OMRPipelineError
 
 
 def _fake_result(input_type: str = "png") -> RecognizeResponse:
@@ -52,7 +59,7 @@ def test_health() -> None:
 def test_recognize_png_returns_notes_and_catalog_fields(monkeypatch, tmp_path: Path) -> None:
     monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
 
-    def fake_recognize(file_path, input_type):
+    def fake_recognize(file_path, input_type, **kwargs):
         assert input_type == "png"
         return _fake_result(input_type)
 
@@ -80,12 +87,38 @@ def test_recognize_png_returns_notes_and_catalog_fields(monkeypatch, tmp_path: P
     assert body["isReused"] is False
 
 
+def test_recognize_debug_returns_stage_timings(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+
+    def fake_recognize(file_path, input_type, *, timer=None, **kwargs):
+        timer.add("audiveris", 1200.0, attempt="base", cpu_ms=900.0, max_rss_mb=512.0)
+        return _fake_result(input_type)
+
+    monkeypatch.setattr("src.main.recognize_file", fake_recognize)
+    client = TestClient(app)
+
+    plain = client.post(
+        "/api/v1/recognize",
+        files={"file": ("a.png", BytesIO(b"image-a"), "image/png")},
+    )
+    debug = client.post(
+        "/api/v1/recognize?debug=true",
+        files={"file": ("b.png", BytesIO(b"image-b"), "image/png")},
+    )
+
+    assert plain.json()["meta"]["timings"] is None
+    stages = {span["stage"]: span for span in debug.json()["meta"]["timings"]}
+    assert {"upload-hash", "queue-wait", "audiveris", "catalog-write"} <= set(stages)
+    assert stages["audiveris"]["cpuMs"] == 900.0
+    assert stages["audiveris"]["attempt"] == "base"
+
+
 def test_recognize_same_file_reuses_catalog(monkeypatch, tmp_path: Path) -> None:
     monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
 
     calls = {"count": 0}
 
-    def fake_recognize(file_path, input_type):
+    def fake_recognize(file_path, input_type, **kwargs):
         calls["count"] += 1
         return _fake_result(input_type)
 
@@ -105,9 +138,133 @@ def test_recognize_same_file_reuses_catalog(monkeypatch, tmp_path: Path) -> None
     assert second.json()["isReused"] is True
 
 
+def test_concurrent_identical_uploads_run_recognition_once(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+
+    calls = {"count": 0}
+
+    def fake_recognize(file_path, input_type, **kwargs):
+        calls["count"] += 1
+        time.sleep(0.2)
+        return _fake_result(input_type)
+
+    monkeypatch.setattr("src.main.recognize_file", fake_recognize)
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(
+                    client.post(
+                        "/api/v1/recognize",
+                        files={"file": ("handout.png", BytesIO(b"handout"), "image/png")},
+                    )
+                    for _ in range(3)
+                )
+            )
+
+    responses = asyncio.run(burst())
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert calls["count"] == 1
+    assert len({response.json()["catalogEntryId"] for response in responses}) == 1
+    assert sorted(response.json()["isReused"] for response in responses) == [False, True, True]
+
+
+def test_near_duplicate_upload_is_offered_and_reused_only_when_pages_match(
+    monkeypatch, tmp_path: Path
+) -> None:
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+
+    calls = {"count": 0}
+
+    def fake_recognize(file_path, input_type, **kwargs):
+        calls["count"] += 1
+        return _fake_result(input_type)
+
+    fingerprints = {b"original-scan": "ffff0000ffff0000", b"rescan": "ffff0000ffff0001"}
+    same_page = {"value": False}
+
+    def fake_fingerprint(path, input_type):
+        return fingerprints[Path(path).read_bytes()]
+
+    def fake_pages_match(first, first_type, second, second_type):
+        assert Path(second).read_bytes() == b"original-scan"
+        return same_page["value"]
+
+    monkeypatch.setattr("src.main.recognize_file", fake_recognize)
+    monkeypatch.setattr("src.main.fingerprint_file", fake_fingerprint)
+    monkeypatch.setattr("src.main.pages_match", fake_pages_match)
+    client = TestClient(app)
+
+    def upload_rescan():
+        response = client.post(
+            "/api/v1/recognize",
+            files={"file": ("rescan.jpg", BytesIO(b"rescan"), "image/jpeg")},
+        )
+        if not response.json()["isReused"]:
+            client.delete(f"/api/v1/catalog/{response.json()['catalogEntryId']}")
+        return response
+
+    first = client.post(
+        "/api/v1/recognize",
+        files={"file": ("score.png", BytesIO(b"original-scan"), "image/png")},
+    )
+    # Auto-reuse is off by default: the match is only offered.
+    offered = upload_rescan()
+    monkeypatch.setenv("OMR_NEAR_DUPLICATE_AUTO_REUSE", "0.97")
+    different_notes = upload_rescan()
+    same_page["value"] = True
+    reused = upload_rescan()
+
+    assert calls["count"] == 3
+    assert offered.json()["isReused"] is False
+    assert offered.json()["nearDuplicateEntryId"] == first.json()["catalogEntryId"]
+    assert different_notes.json()["isReused"] is False
+    assert reused.json()["isReused"] is True
+    assert reused.json()["catalogEntryId"] == first.json()["catalogEntryId"]
+    assert reused.json()["nearDuplicateSimilarity"] > 0.97
+
+
+def test_recognize_sheds_load_with_retry_after(monkeypatch, tmp_path: Path) -> None:
+    from src.services.recognition_queue import RecognitionQueue
+
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setattr("src.main._recognition_queue", RecognitionQueue(1, 0))
+
+    def fake_recognize(file_path, input_type, **kwargs):
+        time.sleep(0.2)
+        return _fake_result(input_type)
+
+    monkeypatch.setattr("src.main.recognize_file", fake_recognize)
+
+    async def burst():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(
+                    client.post(
+                        "/api/v1/recognize",
+                        files={"file": (f"score-{index}.png", BytesIO(f"img-{index}".encode()), "image/png")},
+                    )
+                    for index in range(2)
+                )
+            )
+
+    responses = asyncio.run(burst())
+
+    assert sorted(response.status_code for response in responses) == [200, 503]
+    rejected = next(response for response in responses if response.status_code == 503)
+    assert int(rejected.headers["Retry-After"]) >= 1
+
+    stats = TestClient(app).get("/api/v1/queue").json()
+    assert stats["rejected"] == 1
+    assert stats["completed"] == 1
+
+
 def test_catalog_endpoints(monkeypatch, tmp_path: Path) -> None:
     monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
-    monkeypatch.setattr("src.main.recognize_file", lambda *_: _fake_result())
+    monkeypatch.setattr("src.main.recognize_file", lambda *_, **__: _fake_result())
     client = TestClient(app)
 
     recognize = client.post(
@@ -147,9 +304,75 @@ def test_catalog_endpoints(monkeypatch, tmp_path: Path) -> None:
     assert delete.json()["deleted"] is True
 
 
+def test_reexport_uses_stored_book(monkeypatch, tmp_path: Path) -> None:
+    from src.services.catalog_service import CatalogService
+
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setattr("src.main.recognize_file", lambda *_, **__: _fake_result())
+    client = TestClient(app)
+
+    entry_id = client.post(
+        "/api/v1/recognize",
+        files={"file": ("song.png", BytesIO(b"book-image"), "image/png")},
+    ).json()["catalogEntryId"]
+
+    missing = client.post(f"/api/v1/catalog/{entry_id}/reexport")
+    assert missing.status_code == 409
+
+    book_path = CatalogService().book_path(entry_id)
+    book_path.parent.mkdir(parents=True, exist_ok=True)
+    book_path.write_bytes(b"book")
+
+    def fake_reexport(path, input_type, **kwargs):
+        assert path == book_path
+        result = _fake_result(input_type)
+        result.tempo = 72
+        return result
+
+    monkeypatch.setattr("src.main.reexport_book", fake_reexport)
+    client.patch(f"/api/v1/catalog/{entry_id}", json={"title": "kept"})
+
+    reexported = client.post(f"/api/v1/catalog/{entry_id}/reexport")
+
+    assert reexported.status_code == 200
+    assert reexported.json()["tempo"] == 72
+    assert reexported.json()["title"] == "kept"
+    assert client.get(f"/api/v1/catalog/{entry_id}").json()["result"]["tempo"] == 72
+
+    client.delete(f"/api/v1/catalog/{entry_id}")
+    assert not book_path.exists()
+
+
+def test_reexport_uses_per_system_books(monkeypatch, tmp_path: Path) -> None:
+    from src.services.catalog_service import CatalogService
+
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setattr("src.main.recognize_file", lambda *_, **__: _fake_result())
+    client = TestClient(app)
+    entry_id = client.post(
+        "/api/v1/recognize",
+        files={"file": ("song.png", BytesIO(b"split-image"), "image/png")},
+    ).json()["catalogEntryId"]
+    books_dir = CatalogService().system_books_path(entry_id)
+    books_dir.mkdir(parents=True)
+    (books_dir / "system-1.omr").write_bytes(b"book")
+    seen: list[Path] = []
+
+    def fake_reexport(path, input_type, **kwargs):
+        seen.append(path)
+        return _fake_result(input_type)
+
+    monkeypatch.setattr("src.main.reexport_book", fake_reexport)
+
+    assert client.post(f"/api/v1/catalog/{entry_id}/reexport").status_code == 200
+    assert seen == [books_dir]
+    client.delete(f"/api/v1/catalog/{entry_id}")
+    assert not books_dir.exists()
+
+
 def test_catalog_reset_endpoint(monkeypatch, tmp_path: Path) -> None:
     monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
-    monkeypatch.setattr("src.main.recognize_file", lambda *_: _fake_result())
+    monkeypatch.setattr("src.main.recognize_file", lambda *_, **__: _fake_result())
     client = TestClient(app)
 
     client.post(
@@ -168,3 +391,271 @@ def test_catalog_reset_endpoint(monkeypatch, tmp_path: Path) -> None:
     catalog = client.get("/api/v1/catalog")
     assert catalog.status_code == 200
     assert catalog.json() == []
+
+
+def _zip_bytes(members: dict[str, bytes]) -> BytesIO:
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    buffer.seek(0)
+    return buffer
+
+
+def _wait_for_batch(client: TestClient, batch_id: str) -> dict:
+    deadline = time.monotonic() + 10
+    while True:
+        batch = client.get(f"/api/v1/batches/{batch_id}").json()
+        if batch["status"] not in ("queued", "running") or time.monotonic() > deadline:
+            return batch
+        time.sleep(0.02)
+
+
+def test_batch_recognizes_files_and_zip_members_once(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+    recognized: list[str] = []
+
+    def fake_recognize(file_path, input_type, **kwargs):
+        recognized.append(Path(file_path).read_bytes().decode())
+        return _fake_result(input_type)
+
+    monkeypatch.setattr("src.main.recognize_file", fake_recognize)
+    archive = _zip_bytes(
+        {
+            "choir/alto.png": b"alto-part",
+            "choir/known-again.png": b"already-known",
+            "choir/notes.txt": b"not a score",
+            "__MACOSX/choir/._alto.png": b"resource fork",
+        }
+    )
+
+    # The context manager keeps one event loop alive for the batch task.
+    with TestClient(app) as client:
+        client.post(
+            "/api/v1/recognize",
+            files={"file": ("known.png", BytesIO(b"already-known"), "image/png")},
+        )
+        created = client.post(
+            "/api/v1/batches",
+            files=[
+                ("files", ("soprano.jpg", BytesIO(b"soprano-part"), "image/jpeg")),
+                ("files", ("choir.zip", archive, "application/zip")),
+            ],
+        )
+        batch = _wait_for_batch(client, created.json()["id"])
+
+    assert created.status_code == 202
+    assert created.json()["priority"] == "bulk"
+    assert batch["status"] == "done"
+    assert batch["total"] == 4
+    assert batch["completed"] == 4
+    assert batch["counts"] == {"done": 2, "reused": 1, "skipped": 1}
+    items = {item["name"]: item for item in batch["items"]}
+    assert items["choir/known-again.png"]["status"] == "reused"
+    assert items["choir/notes.txt"]["status"] == "skipped"
+    assert items["soprano.jpg"]["catalogEntryId"]
+    assert sorted(recognized) == ["already-known", "alto-part", "soprano-part"]
+    assert len(TestClient(app).get("/api/v1/catalog").json()) == 3
+    batch_dir = tmp_path / "storage" / "catalog" / "batches" / batch["id"]
+    assert (batch_dir / "status.json").exists()
+    assert not (batch_dir / "uploads").exists()
+
+
+def test_batch_rejects_bad_archives_and_unknown_ids(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setenv("OMR_BATCH_MAX_FILES", "1")
+    client = TestClient(app)
+
+    broken = client.post(
+        "/api/v1/batches",
+        files=[("files", ("library.zip", BytesIO(b"not a zip"), "application/zip"))],
+    )
+    too_many = client.post(
+        "/api/v1/batches",
+        files=[("files", ("library.zip", _zip_bytes({"a.png": b"a", "b.png": b"b"}), "application/zip"))],
+    )
+
+    assert broken.status_code == 400
+    assert too_many.status_code == 400
+    assert "limit is 1" in too_many.json()["detail"]
+    assert client.get("/api/v1/batches/0123456789abcdef").status_code == 404
+    assert client.get("/api/v1/batches/..%2F..%2Fetc").status_code == 404
+
+
+def test_batches_left_by_a_dead_worker_are_interrupted(monkeypatch, tmp_path: Path) -> None:
+    from src.services.batch_service import BatchStore
+    from src.services.catalog_service import CatalogService
+
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+    store = BatchStore(CatalogService())
+    uploads = [("a.png", BytesIO(b"a")), ("b.png", BytesIO(b"b"))]
+    abandoned = store.create(uploads, priority="bulk", allowed_suffixes={"png"})
+    abandoned["status"] = "running"
+    abandoned["items"][0].update(status="done", catalogEntryId="x")
+    abandoned["items"][1]["status"] = "running"
+    store.save(abandoned)
+    # Its worker died: nothing holds the claim any more.
+    store.release(abandoned["id"])
+    # Still claimed through ``store``, as if another live worker were running it.
+    live = store.create([("c.png", BytesIO(b"c"))], priority="bulk", allowed_suffixes={"png"})
+
+    with TestClient(app) as client:
+        recovered = client.get(f"/api/v1/batches/{abandoned['id']}").json()
+        untouched = client.get(f"/api/v1/batches/{live['id']}").json()
+
+    assert recovered["status"] == "interrupted"
+    assert recovered["finishedAt"]
+    assert [item["status"] for item in recovered["items"]] == ["done", "pending"]
+    assert untouched["status"] == "queued"
+
+    batches_dir = tmp_path / "storage" / "catalog" / "batches"
+    assert store.prune_uploads() == 0
+    week_ago = time.time() - 7 * 24 * 3600
+    for batch_id in (abandoned["id"], live["id"]):
+        os.utime(batches_dir / batch_id / "status.json", (week_ago, week_ago))
+    assert store.prune_uploads() == 1
+    assert not (batches_dir / abandoned["id"] / "uploads").exists()
+    assert (batches_dir / live["id"] / "uploads").exists()
+    store.release(live["id"])
+
+
+def test_recovery_never_touches_a_batch_being_created(monkeypatch, tmp_path: Path) -> None:
+    from src.services.batch_service import BatchStore
+    from src.services.catalog_service import CatalogService
+
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+    batches_dir = tmp_path / "storage" / "catalog" / "batches"
+    abandoned = batches_dir / ".0123456789abcdef.creating"
+    abandoned.mkdir(parents=True)
+    seen: list[list[str]] = []
+
+    class RecoveringUpload(BytesIO):
+        """Another worker starts up while this upload is being spooled."""
+
+        def read(self, *args):
+            if not seen:
+                seen.append(BatchStore(CatalogService()).recover_interrupted())
+            return super().read(*args)
+
+    store = BatchStore(CatalogService())
+    batch = store.create(
+        [("a.png", RecoveringUpload(b"a"))], priority="bulk", allowed_suffixes={"png"}
+    )
+
+    assert seen == [[]]
+    assert not abandoned.exists()
+    assert store.load(batch["id"])["status"] == "queued"
+    assert BatchStore(CatalogService()).recover_interrupted() == []
+    store.release(batch["id"])
+    assert BatchStore(CatalogService()).recover_interrupted() == [batch["id"]]
+
+
+def test_shutdown_interrupts_running_batches(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+
+    def slow_recognize(file_path, input_type, *, cancel_event, **kwargs):
+        cancel_event.wait(5)
+        raise OMRPipelineError("cancelled")
+
+    monkeypatch.setattr("src.main.recognize_file", slow_recognize)
+    with TestClient(app) as client:
+        batch_id = client.post(
+            "/api/v1/batches",
+            files=[("files", ("slow.png", BytesIO(b"slow"), "image/png"))],
+        ).json()["id"]
+        deadline = time.monotonic() + 5
+        while client.get(f"/api/v1/batches/{batch_id}").json()["status"] != "running":
+            assert time.monotonic() < deadline
+            time.sleep(0.02)
+
+    status_path = tmp_path / "storage" / "catalog" / "batches" / batch_id / "status.json"
+    saved = json.loads(status_path.read_text(encoding="utf-8"))
+    assert saved["status"] == "interrupted"
+    assert saved["items"][0]["status"] == "pending"
+    assert (status_path.parent / "uploads").exists()
+
+
+def test_recognize_stream_emits_stage_events_then_result(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+
+    def fake_recognize(file_path, input_type, *, timer, on_progress, **kwargs):
+        attempt_timer = timer.scoped(attempt="base")
+        with attempt_timer.span("preprocess"):
+            pass
+        with attempt_timer.span("audiveris"):
+            on_progress("base", "GRID")
+        return _fake_result(input_type)
+
+    monkeypatch.setattr("src.main.recognize_file", fake_recognize)
+    client = TestClient(app)
+
+    response = client.post(
+        "/api/v1/recognize/stream",
+        files={"file": ("score.png", BytesIO(b"streamed-image"), "image/png")},
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert events[0]["event"] == "received"
+    assert events[-1]["event"] == "result"
+    assert events[-1]["result"]["notes"][0]["pitch"] == "G4"
+    assert events[-1]["result"]["isReused"] is False
+    labels = [
+        (event["event"], event.get("stage") or event.get("step"))
+        for event in events
+        if event["event"] in {"stage-start", "stage", "audiveris-step"}
+    ]
+    assert labels.index(("stage", "upload-hash")) < labels.index(("stage-start", "preprocess"))
+    assert labels.index(("stage-start", "audiveris")) < labels.index(("audiveris-step", "GRID"))
+    assert labels.index(("audiveris-step", "GRID")) < labels.index(("stage", "audiveris"))
+    assert labels[-1] == ("stage", "catalog-write")
+    audiveris = next(e for e in events if e["event"] == "stage" and e["stage"] == "audiveris")
+    assert audiveris["attempt"] == "base"
+    assert all(later["elapsedMs"] >= earlier["elapsedMs"] for earlier, later in zip(events, events[1:]))
+
+
+def test_recognize_stream_reports_pipeline_errors_as_final_event(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+
+    def failing_recognize(*_, **__):
+        raise OMRPipelineError("OMR failed for all preprocessing attempts")
+
+    monkeypatch.setattr("src.main.recognize_file", failing_recognize)
+    client = TestClient(app)
+
+    rejected = client.post(
+        "/api/v1/recognize/stream",
+        files={"file": ("notes.txt", BytesIO(b"text"), "text/plain")},
+    )
+    response = client.post(
+        "/api/v1/recognize/stream",
+        files={"file": ("score.png", BytesIO(b"broken-image"), "image/png")},
+    )
+
+    assert rejected.status_code == 400
+    final = json.loads(response.text.splitlines()[-1])
+    assert final["event"] == "error"
+    assert final["status"] == 422
+    assert "preprocessing attempts" in final["detail"]
+
+
+def test_catalog_worker_serves_catalog_and_refuses_recognition(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setenv("OMR_WORKER_ROLE", "catalog")
+    monkeypatch.setattr("src.main.recognize_file", lambda *_, **__: _fake_result())
+    client = TestClient(app)
+
+    recognize = client.post(
+        "/api/v1/recognize",
+        files={"file": ("score.png", BytesIO(b"catalog-only"), "image/png")},
+    )
+    batch = client.post(
+        "/api/v1/batches",
+        files=[("files", ("score.png", BytesIO(b"catalog-only"), "image/png"))],
+    )
+
+    assert recognize.status_code == 503
+    assert "OMR_WORKER_ROLE=catalog" in recognize.json()["detail"]
+    assert batch.status_code == 503
+    assert client.get("/api/v1/catalog").status_code == 200
@@ -0,0 +1,74 @@
+import os
+from pathlib import Path
+
+from src.services.artifact_cache import ArtifactCache
+
+
+def test_put_and_get_roundtrip(tmp_path: Path) -> None:
+    cache = ArtifactCache(tmp_path / "cache", max_bytes=1024 * 1024)
+    artifact = tmp_path / "score.musicxml"
+    artifact.write_text("<score-partwise/>", encoding="utf-8")
+
+    key = cache.make_key("audiveris", "1:audiveris", "abc")
+    assert cache.get("audiveris", key) is None
+
+    cache.put("audiveris", key, [artifact])
+    cached = cache.get_file("audiveris", key, "score.musicxml")
+
+    assert cached is not None
+    assert cached.read_text(encoding="utf-8") == "<score-partwise/>"
+    assert cache.make_key("audiveris", "2:audiveris", "abc") != key
+
+
+def test_json_layer_roundtrip(tmp_path: Path) -> None:
+    cache = ArtifactCache(tmp_path / "cache", max_bytes=1024 * 1024)
+    key = cache.make_key("parsed", "1", "hash", "png")
+
+    cache.put_json("parsed", key, {"tempo": 90})
+
+    assert cache.get_json("parsed", key) == {"tempo": 90}
+
+
+def test_evicts_least_recently_used_entries(tmp_path: Path) -> None:
+    cache = ArtifactCache(tmp_path / "cache", max_bytes=250)
+    blob = tmp_path / "blob.bin"
+    blob.write_bytes(b"x" * 100)
+
+    cache.put("preprocessed", "aa-old", [blob])
+    cache.put("preprocessed", "bb-hot", [blob])
+    old_dir = cache.get("preprocessed", "aa-old")
+    assert old_dir is not None
+    os.utime(old_dir, (1, 1))
+    cache.get("preprocessed", "bb-hot")
+
+    cache.put("preprocessed", "cc-new", [blob])
+
+    assert cache.get("preprocessed", "aa-old") is None
+    assert cache.get("preprocessed", "bb-hot") is not None
+    assert cache.get("preprocessed", "cc-new") is not None
+
+
+def test_zero_budget_disables_cache(tmp_path: Path) -> None:
+    cache = ArtifactCache(tmp_path / "cache", max_bytes=0)
+    blob = tmp_path / "blob.bin"
+    blob.write_bytes(b"x")
+
+    assert cache.put("preprocessed", "key", [blob]) is None
+    assert cache.get("preprocessed", "key") is None
+
+
+def test_put_walks_the_cache_only_when_the_budget_is_crossed(monkeypatch, tmp_path: Path) -> None:
+    cache = ArtifactCache(tmp_path / "cache", max_bytes=250)
+    blob = tmp_path / "blob.bin"
+    blob.write_bytes(b"x" * 100)
+    scans: list[int] = []
+    measure = cache._evict
+    monkeypatch.setattr(cache, "_evict", lambda: scans.append(1) or measure())
+
+    cache.put("preprocessed", "aa", [blob])
+    cache.put("preprocessed", "bb", [blob])
+    assert len(scans) == 1
+
+    cache.put("preprocessed", "cc", [blob])
+    assert len(scans) == 2
+    assert sum(cache.get("preprocessed", key) is not None for key in ("aa", "bb", "cc")) == 2
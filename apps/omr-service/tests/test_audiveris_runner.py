@@ -1,74 +1,251 @@
+import json
+import os
 from pathlib import Path
+import sys
+from textwrap import dedent
+import threading
+
+import pytest
 
 from src.services.audiveris import AudiverisRunner
+from src.services.errors import OMRCancelledError, OMRPipelineError
 
 
-def test_runner_invokes_transcribe_export(monkeypatch, tmp_path: Path) -> None:
-    called = {}
+def _fake_audiveris(tmp_path: Path, body: str) -> str:
+    script = tmp_path / "fake-audiveris"
+    script.write_text(
+        f"#!{sys.executable}\n"
+        "import pathlib, sys, time\n"
+        "args = sys.argv[1:]\n"
+        "out_dir = pathlib.Path(args[args.index('-output') + 1])\n"
+        "out_dir.mkdir(parents=True, exist_ok=True)\n" + dedent(body),
+        encoding="utf-8",
+    )
+    script.chmod(0o755)
+    return str(script)
 
-    def fake_which(command):
-        return "/usr/local/bin/audiveris" if command == "audiveris" else None
 
-    def fake_run(cmd, capture_output, text):
-        called["cmd"] = cmd
-        out_dir = Path(cmd[cmd.index("-output") + 1])
-        out_dir.mkdir(parents=True, exist_ok=True)
+def test_runner_invokes_transcribe_export(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("AUDIVERIS_DEBUG_FILE_LISTS", "1")
+    command = _fake_audiveris(
+        tmp_path,
+        """
         (out_dir / "score.musicxml").write_text("<score-partwise/>", encoding="utf-8")
-
-        class Result:
-            returncode = 0
-            stderr = ""
-            stdout = "ok"
-
-        return Result()
-
-    monkeypatch.setattr("src.services.audiveris.shutil.which", fake_which)
-    monkeypatch.setattr("src.services.audiveris.subprocess.run", fake_run)
+        print("ok")
+        """,
+    )
 
     image = tmp_path / "input.png"
     image.write_bytes(b"x")
 
-    runner = AudiverisRunner("audiveris")
+    runner = AudiverisRunner(command)
     debug_dir = tmp_path / "debug"
     musicxml = runner.run(image, tmp_path / "out", debug_dir=debug_dir)
 
+    called = (debug_dir / "audiveris-command.txt").read_text(encoding="utf-8").split()
     assert musicxml.name == "score.musicxml"
-    assert "-transcribe" in called["cmd"]
-    assert "-export" in called["cmd"]
-    assert (debug_dir / "audiveris-command.txt").exists()
-    assert (debug_dir / "audiveris-stdout.log").exists()
+    assert "-transcribe" in called
+    assert "-export" in called
+    assert (debug_dir / "audiveris-stdout.log").read_text(encoding="utf-8").strip() == "ok"
     assert (debug_dir / "audiveris-files.txt").exists()
 
 
-def test_runner_retries_when_only_omr_generated(monkeypatch, tmp_path: Path) -> None:
-    calls = {"count": 0}
+def test_runner_records_child_resource_usage(tmp_path: Path) -> None:
+    from src.services.timing import StageTimer
 
-    def fake_which(command):
-        return "/usr/local/bin/audiveris" if command == "audiveris" else None
+    command = _fake_audiveris(
+        tmp_path,
+        """
+        sum(i * i for i in range(200_000))
+        (out_dir / "score.musicxml").write_text("<score-partwise/>", encoding="utf-8")
+        """,
+    )
+    image = tmp_path / "input.png"
+    image.write_bytes(b"x")
+    debug_dir = tmp_path / "debug"
+    timer = StageTimer(attempt="base")
+
+    AudiverisRunner(command).run(image, tmp_path / "out", debug_dir=debug_dir, timer=timer)
+
+    record = json.loads((debug_dir / "audiveris-process.json").read_text(encoding="utf-8"))
+    assert record["returncode"] == 0
+    assert record["cpu_seconds"] > 0
+    assert record["max_rss_mb"] > 0
+    stages = [span["stage"] for span in timer.spans]
+    assert stages == ["audiveris", "output-discovery"]
+    assert timer.spans[0]["attempt"] == "base"
+    assert timer.spans[0]["max_rss_mb"] == record["max_rss_mb"]
+
+
+@pytest.mark.parametrize("with_tools", [True, False])
+def test_runner_applies_resource_limits_without_preexec(monkeypatch, tmp_path: Path, with_tools: bool) -> None:
+    import shutil
+
+    if not with_tools:
+        real_which = shutil.which
+        monkeypatch.setattr(
+            "src.services.audiveris.shutil.which",
+            lambda name: None if name in ("prlimit", "nice") else real_which(name),
+        )
+    command = _fake_audiveris(
+        tmp_path,
+        """
+        import os, resource
+        # The fallback applies limits just after spawn; give it a moment.
+        time.sleep(0.3)
+        limits = [resource.getrlimit(resource.RLIMIT_AS)[0], resource.getrlimit(resource.RLIMIT_CPU)[0]]
+        print(*limits, os.getpriority(os.PRIO_PROCESS, 0))
+        (out_dir / "score.musicxml").write_text("<score-partwise/>", encoding="utf-8")
+        """,
+    )
+    image = tmp_path / "input.png"
+    image.write_bytes(b"x")
+    debug_dir = tmp_path / "debug"
+    runner = AudiverisRunner(command, memory_limit_mb=4096, cpu_limit_seconds=120, nice=5)
 
-    def fake_run(cmd, capture_output, text):
-        calls["count"] += 1
-        out_dir = Path(cmd[cmd.index("-output") + 1])
-        out_dir.mkdir(parents=True, exist_ok=True)
+    runner.run(image, tmp_path / "out", debug_dir=debug_dir)
 
-        class Result:
-            returncode = 0
-            stderr = ""
-            stdout = "ok"
+    memory, cpu, priority = (debug_dir / "audiveris-stdout.log").read_text(encoding="utf-8").split()
+    assert int(memory) == 4096 * 1024 * 1024
+    assert int(cpu) == 120
+    assert int(priority) == os.getpriority(os.PRIO_PROCESS, 0) + 5
 
-        if calls["count"] == 1:
-            (out_dir / "score.omr").write_text("omr", encoding="utf-8")
-        else:
-            (out_dir / "score.musicxml").write_text("<score-partwise/>", encoding="utf-8")
-        return Result()
 
-    monkeypatch.setattr("src.services.audiveris.shutil.which", fake_which)
-    monkeypatch.setattr("src.services.audiveris.subprocess.run", fake_run)
+def test_runner_retries_when_only_omr_generated(tmp_path: Path) -> None:
+    command = _fake_audiveris(
+        tmp_path,
+        """
+        if args[-1].endswith(".omr"):
+            (out_dir / "score.musicxml").write_text("<score-partwise/>", encoding="utf-8")
+        else:
+            (out_dir / "score.omr").write_text("omr", encoding="utf-8")
+        """,
+    )
 
     image = tmp_path / "input.png"
     image.write_bytes(b"x")
-    runner = AudiverisRunner("audiveris")
-    musicxml = runner.run(image, tmp_path / "out", debug_dir=tmp_path / "debug")
+    runner = AudiverisRunner(command)
+    debug_dir = tmp_path / "debug"
+    musicxml = runner.run(image, tmp_path / "out", debug_dir=debug_dir)
 
-    assert calls["count"] == 2
+    assert (debug_dir / "audiveris-retry-command.txt").exists()
     assert musicxml.suffix == ".musicxml"
+
+
+def test_runner_kills_hung_process_after_timeout(tmp_path: Path) -> None:
+    command = _fake_audiveris(tmp_path, "time.sleep(30)\n")
+
+    image = tmp_path / "input.png"
+    image.write_bytes(b"x")
+    runner = AudiverisRunner(command, timeout_seconds=0.5)
+    debug_dir = tmp_path / "debug"
+
+    with pytest.raises(OMRPipelineError, match="timed out"):
+        runner.run(image, tmp_path / "out", debug_dir=debug_dir)
+
+    record = json.loads((debug_dir / "audiveris-process.json").read_text(encoding="utf-8"))
+    assert record["kill_reason"] == "timeout"
+    assert record["elapsed_seconds"] < 10
+    assert record["returncode"] is not None
+
+
+def test_runner_stops_when_cancelled(tmp_path: Path) -> None:
+    command = _fake_audiveris(tmp_path, "time.sleep(30)\n")
+
+    image = tmp_path / "input.png"
+    image.write_bytes(b"x")
+    runner = AudiverisRunner(command)
+    cancel_event = threading.Event()
+    threading.Timer(0.3, cancel_event.set).start()
+    debug_dir = tmp_path / "debug"
+
+    with pytest.raises(OMRCancelledError):
+        runner.run(image, tmp_path / "out", debug_dir=debug_dir, cancel_event=cancel_event)
+
+    record = json.loads((debug_dir / "audiveris-process.json").read_text(encoding="utf-8"))
+    assert record["kill_reason"] == "cancelled"
+
+
+def test_runner_aborts_early_on_fatal_output(tmp_path: Path) -> None:
+    command = _fake_audiveris(
+        tmp_path,
+        """
+        print("INFO  [LOAD] loading image", flush=True)
+        print("WARN  Sheet#1 With a too low interline value of 9 pixels", flush=True)
+        time.sleep(30)
+        """,
+    )
+
+    image = tmp_path / "input.png"
+    image.write_bytes(b"x")
+    debug_dir = tmp_path / "debug"
+
+    with pytest.raises(OMRPipelineError, match="too low interline"):
+        AudiverisRunner(command).run(image, tmp_path / "out", debug_dir=debug_dir)
+
+    record = json.loads((debug_dir / "audiveris-process.json").read_text(encoding="utf-8"))
+    assert record["kill_reason"] == "fatal-output"
+    assert record["elapsed_seconds"] < 10
+    assert "too low interline" in (debug_dir / "audiveris-stdout.log").read_text(encoding="utf-8")
+
+
+def test_runner_reports_transcription_steps(tmp_path: Path) -> None:
+    command = _fake_audiveris(
+        tmp_path,
+        """
+        for step in ("LOAD", "BINARY", "BINARY", "SCALE", "EXPORT"):
+            print(f"INFO  Sheet#1 [{step}] done", flush=True)
+        (out_dir / "score.musicxml").write_text("<score-partwise/>", encoding="utf-8")
+        """,
+    )
+
+    image = tmp_path / "input.png"
+    image.write_bytes(b"x")
+    steps: list[str] = []
+
+    AudiverisRunner(command).run(image, tmp_path / "out", on_progress=steps.append)
+
+    assert steps == ["LOAD", "BINARY", "SCALE", "EXPORT"]
+
+
+def test_export_book_skips_transcription(tmp_path: Path) -> None:
+    command = _fake_audiveris(
+        tmp_path,
+        """
+        (out_dir / "score.mxl").write_bytes(b"zip")
+        (out_dir / "score.musicxml").write_text("<score-partwise/>", encoding="utf-8")
+        """,
+    )
+    book = tmp_path / "work" / "score.omr"
+    book.parent.mkdir()
+    book.write_text("omr", encoding="utf-8")
+    debug_dir = tmp_path / "debug"
+
+    musicxml = AudiverisRunner(command).export_book(book, tmp_path / "out", debug_dir=debug_dir)
+
+    called = (debug_dir / "audiveris-export-command.txt").read_text(encoding="utf-8").split()
+    assert musicxml.name == "score.musicxml"
+    assert "-export" in called
+    assert "-transcribe" not in called
+    assert called[-1] == str(book)
+
+
+def test_runner_prefers_predicted_export_name(tmp_path: Path) -> None:
+    command = _fake_audiveris(
+        tmp_path,
+        """
+        stem = pathlib.Path(args[-1]).stem
+        (out_dir / "aaa-other.musicxml").write_text("<other/>", encoding="utf-8")
+        (out_dir / f"{stem}.mxl").write_bytes(b"zip")
+        """,
+    )
+    input_dir = tmp_path / "attempt" / "input"
+    input_dir.mkdir(parents=True)
+    image = input_dir / "preprocessed-base.png"
+    image.write_bytes(b"x")
+    debug_dir = tmp_path / "debug"
+
+    musicxml = AudiverisRunner(command).run(image, tmp_path / "attempt" / "output", debug_dir=debug_dir)
+
+    assert musicxml.name == "preprocessed-base.mxl"
+    assert not (debug_dir / "audiveris-files.txt").exists()
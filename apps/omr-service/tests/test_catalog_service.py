@@ -127,12 +127,16 @@ def test_reset_catalog_clears_files_and_rebuilds_index(tmp_path: Path) -> None:
         result=_result(),
         image_hash=image_hash,
     )
+    service.locks_dir.mkdir(parents=True, exist_ok=True)
+    stale_lock = service.locks_dir / f"{image_hash}.lock"
+    stale_lock.touch()
 
     removed = service.reset_catalog("WIPE_CATALOG")
     assert removed == 1
     assert service.list_entries() == []
     assert not (service.root_dir / detail.imagePath).exists()
     assert not (service.records_dir / f"{detail.id}.json").exists()
+    assert not stale_lock.exists()
 
 
 def test_reset_catalog_rejects_wrong_token(tmp_path: Path) -> None:
@@ -185,3 +189,24 @@ def test_list_entries_fallbacks_instruments_for_legacy_index(tmp_path: Path) ->
     assert entries[0].id == detail.id
     assert entries[0].melodyInstrument == "piano"
     assert entries[0].leftHandInstrument == "piano"
+
+
+def test_find_similar_matches_by_perceptual_hash(tmp_path: Path) -> None:
+    service = CatalogService(root_dir=tmp_path)
+    content = b"scan-1"
+    service.create_entry(
+        content=content,
+        original_filename="scan.png",
+        input_type="png",
+        result=_result(),
+        image_hash=service.compute_hash(content),
+        perceptual_hash="ffff0000ffff0000",
+    )
+
+    match = service.find_similar("ffff0000ffff0001", min_similarity=0.9)
+    assert match is not None
+    summary, score = match
+    assert summary.perceptualHash == "ffff0000ffff0000"
+    assert score == 1 - 1 / 64
+
+    assert service.find_similar("0000ffff0000ffff", min_similarity=0.9) is None
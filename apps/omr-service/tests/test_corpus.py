@@ -0,0 +1,68 @@
+import json
+from pathlib import Path
+import shutil
+
+from tools.corpus import (
+    DEFAULT_CORPUS_DIRS,
+    DEFAULT_GOLDEN_DIR,
+    append_trend,
+    diff_outputs,
+    discover_corpus,
+    run_corpus,
+)
+
+FIXTURE = Path(__file__).parent / "fixtures" / "sample.musicxml"
+
+
+def test_corpus_matches_goldens() -> None:
+    report = run_corpus(
+        discover_corpus(list(DEFAULT_CORPUS_DIRS), None), golden_dir=DEFAULT_GOLDEN_DIR, repeat=1
+    )
+
+    assert report["scores"]
+    assert [score for score in report["scores"] if score["status"] != "ok"] == []
+
+
+def test_run_log_copies_are_deduplicated(tmp_path: Path) -> None:
+    runs = tmp_path / "runs"
+    for run_id in ("run-a", "run-b"):
+        (runs / run_id).mkdir(parents=True)
+        shutil.copy(FIXTURE, runs / run_id / "base-page.musicxml")
+
+    items = discover_corpus([], runs)
+
+    assert [item.label for item in items] == ["run-logs/run-a/base-page.musicxml"]
+
+
+def test_summary_only_run_logs_are_reported(tmp_path: Path, capsys) -> None:
+    runs = tmp_path / "runs"
+    (runs / "run-a").mkdir(parents=True)
+    (runs / "run-a" / "result-summary.json").write_text("{}", encoding="utf-8")
+
+    items = discover_corpus([FIXTURE.parent], runs)
+
+    assert items
+    assert "OMR_RUN_LOG_LEVEL=full" in capsys.readouterr().err
+
+
+def test_changed_output_is_reported_and_trend_recorded(tmp_path: Path) -> None:
+    golden_dir = tmp_path / "golden"
+    items = discover_corpus([FIXTURE.parent], None)
+    run_corpus(items, golden_dir=golden_dir, update_golden=True, repeat=1)
+    (golden_path,) = golden_dir.iterdir()
+    golden = json.loads(golden_path.read_text(encoding="utf-8"))
+    golden["notes"][1]["pitch"] = "C4"
+    golden_path.write_text(json.dumps(golden), encoding="utf-8")
+
+    report = run_corpus(items, golden_dir=golden_dir, repeat=1)
+    append_trend(tmp_path / "trend.jsonl", report)
+
+    (score,) = report["scores"]
+    assert score["status"] == "changed"
+    assert score["differences"] == ["notes: 3 -> 3 items, first difference at index 1"]
+    trend = json.loads((tmp_path / "trend.jsonl").read_text(encoding="utf-8"))
+    assert trend["scores"]["fixtures/sample.musicxml"]["parseMs"] > 0
+
+
+def test_diff_outputs_reports_scalar_changes() -> None:
+    assert diff_outputs({"tempo": 90}, {"tempo": 120}) == ["tempo: 90 -> 120"]
@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from src.services.fingerprint import (
+    compute_fingerprint,
+    fingerprint_file,
+    hamming_distance,
+    near_duplicate_thresholds,
+    pages_match,
+    similarity,
+    symbol_agreement,
+)
+
+
+def _score_page(seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    page = np.full((1400, 1000), 255, np.uint8)
+    for system in range(6):
+        top = 120 + system * 200
+        for line in range(5):
+            cv2.line(page, (80, top + line * 14), (920, top + line * 14), 0, 2)
+        for index in range(14):
+            x = 110 + index * 57
+            y = top + int(rng.integers(-10, 66))
+            cv2.ellipse(page, (x, y), (9, 6), -20, 0, 360, 0, -1)
+            cv2.line(page, (x + 8, y), (x + 8, y - 45), 0, 2)
+    return page
+
+
+def test_rescaled_reencoded_page_keeps_fingerprint() -> None:
+    page = _score_page(1)
+    rescaled = cv2.resize(page, None, fx=0.63, fy=0.63, interpolation=cv2.INTER_AREA)
+    _, encoded = cv2.imencode(".jpg", rescaled, [cv2.IMWRITE_JPEG_QUALITY, 55])
+    reencoded = cv2.imdecode(encoded, cv2.IMREAD_GRAYSCALE)
+    padded = cv2.copyMakeBorder(page, 80, 40, 60, 30, cv2.BORDER_CONSTANT, value=255)
+
+    original = compute_fingerprint(page)
+
+    assert len(original) == 16
+    assert hamming_distance(original, compute_fingerprint(reencoded)) <= 2
+    assert hamming_distance(original, compute_fingerprint(padded)) <= 2
+
+
+def test_different_pages_are_far_apart() -> None:
+    first = compute_fingerprint(_score_page(1))
+    second = compute_fingerprint(_score_page(2))
+
+    assert similarity(first, second) < 0.9
+
+
+def test_fingerprint_file_returns_none_for_undecodable_upload(tmp_path: Path) -> None:
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not-an-image")
+
+    assert fingerprint_file(broken, "png") is None
+
+
+def test_fingerprint_file_decodes_png(tmp_path: Path) -> None:
+    path = tmp_path / "page.png"
+    cv2.imwrite(str(path), _score_page(3))
+
+    assert fingerprint_file(path, "png") == compute_fingerprint(
+        cv2.imread(str(path), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    )
+
+
+def test_symbol_agreement_separates_same_layout_pages() -> None:
+    page = _score_page(1)
+    rescan = cv2.resize(page, None, fx=0.25, fy=0.25, interpolation=cv2.INTER_AREA)
+
+    assert symbol_agreement(page, rescan) >= 0.9
+    # Same staves and note spacing, different pitches: the hash alone is not enough.
+    assert all(symbol_agreement(page, _score_page(seed)) < 0.7 for seed in (2, 3, 7))
+
+
+def test_pages_match_reads_both_uploads(tmp_path: Path) -> None:
+    original, rescan, other = tmp_path / "a.png", tmp_path / "b.jpg", tmp_path / "c.png"
+    cv2.imwrite(str(original), _score_page(1))
+    cv2.imwrite(str(rescan), _score_page(1), [cv2.IMWRITE_JPEG_QUALITY, 60])
+    cv2.imwrite(str(other), _score_page(2))
+
+    assert pages_match(original, "png", rescan, "jpg")
+    assert not pages_match(original, "png", other, "png")
+    assert not pages_match(original, "png", tmp_path / "missing.png", "png")
+
+
+def test_auto_reuse_is_off_unless_configured(monkeypatch) -> None:
+    monkeypatch.delenv("OMR_NEAR_DUPLICATE_AUTO_REUSE", raising=False)
+    assert near_duplicate_thresholds() == (0.9, None)
+
+    monkeypatch.setenv("OMR_NEAR_DUPLICATE_AUTO_REUSE", "0.98")
+    assert near_duplicate_thresholds() == (0.9, 0.98)
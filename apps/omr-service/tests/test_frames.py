@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from src.services.frames import frame_count, read_frame
+from src.services.pipeline import recognize_file
+
+
+def _multi_frame_tiff(path: Path) -> Path:
+    frames = [np.full((60 + index, 80), 40 * index, np.uint8) for index in range(3)]
+    assert cv2.imwritemulti(str(path), frames)
+    return path
+
+
+def test_reads_single_frames_by_index(tmp_path: Path) -> None:
+    tiff = _multi_frame_tiff(tmp_path / "scan.tiff")
+
+    assert frame_count(tiff) == 3
+    assert read_frame(tiff, 2).shape == (62, 80)
+    assert int(read_frame(tiff, 1)[0, 0]) == 40
+    with pytest.raises(ValueError, match="frame 4"):
+        read_frame(tiff, 3)
+
+
+def test_pipeline_transcribes_first_frame_and_warns(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_STAFF_CROP", "0")
+    preprocessed: list[tuple[int, ...]] = []
+
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
+        preprocessed.append(cv2.imread(str(src), cv2.IMREAD_UNCHANGED).shape)
+        dst.write_bytes(src.read_bytes())
+        return dst
+
+    def fake_run(self, image_path: Path, output_dir: Path, **kwargs) -> Path:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        result = output_dir / "page.musicxml"
+        result.write_text(
+            "<score-partwise><part-list/><part id='P1'><measure number='1'>"
+            "<note><pitch><step>C</step><octave>4</octave></pitch><duration>1</duration></note>"
+            "</measure></part></score-partwise>",
+            encoding="utf-8",
+        )
+        return result
+
+    monkeypatch.setattr("src.services.pipeline.preprocess_image", fake_preprocess)
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.run", fake_run)
+
+    result = recognize_file(_multi_frame_tiff(tmp_path / "scan.tiff"), "tiff")
+
+    assert preprocessed == [(60, 80)]
+    assert "Only the first of 3 frames is processed in MVP." in result.meta.warnings
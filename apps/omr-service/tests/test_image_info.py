@@ -0,0 +1,38 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from src.services.image_info import read_image_size
+
+
+def test_reads_png_and_jpeg_headers(tmp_path: Path) -> None:
+    image = np.full((37, 91), 255, np.uint8)
+    png = tmp_path / "page.png"
+    jpg = tmp_path / "page.jpg"
+    cv2.imwrite(str(png), image)
+    cv2.imwrite(str(jpg), image)
+
+    assert read_image_size(png) == (91, 37)
+    assert read_image_size(jpg) == (91, 37)
+
+
+def test_reads_webp_and_first_tiff_frame_headers(tmp_path: Path) -> None:
+    image = np.full((37, 91), 255, np.uint8)
+    lossy = tmp_path / "lossy.webp"
+    lossless = tmp_path / "lossless.webp"
+    tiff = tmp_path / "scan.tiff"
+    cv2.imwrite(str(lossy), image, [cv2.IMWRITE_WEBP_QUALITY, 80])
+    cv2.imwrite(str(lossless), image, [cv2.IMWRITE_WEBP_QUALITY, 101])
+    cv2.imwritemulti(str(tiff), [image, np.zeros((10, 20), np.uint8)])
+
+    assert read_image_size(lossy) == (91, 37)
+    assert read_image_size(lossless) == (91, 37)
+    assert read_image_size(tiff) == (91, 37)
+
+
+def test_unknown_format_returns_none(tmp_path: Path) -> None:
+    path = tmp_path / "fake.png"
+    path.write_bytes(b"fake-image")
+
+    assert read_image_size(path) is None
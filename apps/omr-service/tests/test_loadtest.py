@@ -0,0 +1,61 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+
+from src.services.audiveris import AudiverisRunner
+from src.services.errors import OMRPipelineError
+from tools.loadtest import FAKE_AUDIVERIS, LoadTestConfig, percentile, run_load_test
+
+
+def test_fake_audiveris_writes_musicxml_and_book(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("FAKE_AUDIVERIS_LATENCY_MS", "10")
+    monkeypatch.setenv("FAKE_AUDIVERIS_MEASURES", "3")
+    image = tmp_path / "input" / "preprocessed-base.png"
+    image.parent.mkdir()
+    image.write_bytes(b"x")
+    steps: list[str] = []
+
+    runner = AudiverisRunner(str(FAKE_AUDIVERIS))
+    musicxml = runner.run(image, tmp_path / "output", on_progress=steps.append)
+
+    assert musicxml.name == "preprocessed-base.musicxml"
+    assert musicxml.read_text(encoding="utf-8").count("<measure ") == 3
+    assert runner.find_book(tmp_path / "output") is not None
+    assert steps[0] == "LOAD" and steps[-1] == "EXPORT"
+
+
+def test_fake_audiveris_failure_rate_aborts_attempt(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("FAKE_AUDIVERIS_LATENCY_MS", "10")
+    monkeypatch.setenv("FAKE_AUDIVERIS_FAILURE_RATE", "1")
+    image = tmp_path / "input.png"
+    image.write_bytes(b"x")
+
+    with pytest.raises(OMRPipelineError, match="no staves"):
+        AudiverisRunner(str(FAKE_AUDIVERIS)).run(image, tmp_path / "output")
+
+
+def test_percentile_uses_nearest_rank() -> None:
+    values = [float(value) for value in range(1, 101)]
+
+    assert percentile(values, 0.5) == 50.0
+    assert percentile(values, 0.99) == 99.0
+    assert percentile([], 0.5) == 0.0
+
+
+def test_load_test_reports_latency_by_request_kind(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("AUDIVERIS_CMD", str(FAKE_AUDIVERIS))
+    monkeypatch.setenv("FAKE_AUDIVERIS_LATENCY_MS", "10")
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path / "project"))
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(tmp_path / "runs"))
+
+    report = asyncio.run(
+        run_load_test(LoadTestConfig(requests=8, concurrency=1, dedup_ratio=0.4, catalog_ratio=0.2, seed=1))
+    )
+
+    by_kind = report["byKind"]
+    assert report["overall"]["requests"] == 8
+    assert report["overall"]["errors"] == 0
+    assert sum(row["requests"] for row in by_kind.values()) == 8
+    assert by_kind["upload"]["requests"] >= 1
+    assert by_kind["upload"]["p99Ms"] >= by_kind["upload"]["p50Ms"] > 0
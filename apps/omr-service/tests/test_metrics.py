@@ -0,0 +1,98 @@
+from io import BytesIO
+import json
+from pathlib import Path
+import threading
+
+from fastapi.testclient import TestClient
+
+from src.services.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def test_histogram_renders_cumulative_buckets() -> None:
+    registry = MetricsRegistry()
+    latency = Histogram("t_seconds", "Test latency.", ("stage",), buckets=(0.1, 1.0), registry=registry)
+
+    for value in (0.05, 0.5, 0.5, 3.0):
+        latency.observe(value, stage="parse")
+
+    text = registry.render()
+    assert '# TYPE t_seconds histogram' in text
+    assert 't_seconds_bucket{stage="parse",le="0.1"} 1' in text
+    assert 't_seconds_bucket{stage="parse",le="1.0"} 3' in text
+    assert 't_seconds_bucket{stage="parse",le="+Inf"} 4' in text
+    assert 't_seconds_count{stage="parse"} 4' in text
+
+
+def test_counter_sums_updates_from_many_threads() -> None:
+    registry = MetricsRegistry()
+    counter = Counter("t_total", "Test counter.", ("op",), registry=registry)
+
+    def work() -> None:
+        for _ in range(1000):
+            counter.inc(op="read")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.snapshot() == {("read",): 8000.0}
+    # Exited threads' shards are folded away instead of kept forever.
+    assert counter._shards == []
+
+
+def test_render_aggregates_worker_dumps(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_METRICS_DIR", str(tmp_path))
+    registry = MetricsRegistry()
+    counter = Counter("t_total", "Test counter.", ("op",), registry=registry)
+    gauge = Gauge("t_running", "Test gauge.", registry=registry)
+    counter.inc(2, op="write")
+    gauge.set_function(lambda: 1)
+    # A worker that has since exited: its counters still count, its gauges do not.
+    (tmp_path / "999999999.json").write_text(
+        json.dumps(
+            {
+                "pid": 999999999,
+                "metrics": {
+                    "t_total": {"values": [[["write"], 3.0]]},
+                    "t_running": {"values": [[[], 5.0]]},
+                },
+            }
+        ),
+        encoding="utf-8",
+    )
+
+    text = registry.render()
+
+    assert 't_total{op="write"} 5' in text
+    assert "t_running 1" in text
+    # The exited worker's dump is folded into the retired totals and removed.
+    assert not (tmp_path / "999999999.json").exists()
+    assert (tmp_path / "retired.json").exists()
+    counter.inc(op="write")
+    assert 't_total{op="write"} 6' in registry.render()
+
+
+def test_metrics_endpoint_reports_routes_and_dedup(monkeypatch, tmp_path: Path) -> None:
+    from src.main import app
+    from tests.test_api import _fake_result
+
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setattr("src.main.recognize_file", lambda *args, **kwargs: _fake_result())
+    client = TestClient(app)
+
+    for _ in range(2):
+        client.post(
+            "/api/v1/recognize",
+            files={"file": ("score.png", BytesIO(b"metrics-image"), "image/png")},
+        )
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    text = response.text
+    assert 'omr_http_request_duration_seconds_count{route="/api/v1/recognize",method="POST",status="200"}' in text
+    assert 'omr_dedup_lookups_total{result="hit"}' in text
+    assert 'omr_catalog_operations_total{op="write"}' in text
+    assert 'omr_stage_duration_seconds_bucket{stage="upload-hash"' in text
+    assert "omr_queue_running 0" in text
@@ -0,0 +1,99 @@
+from pathlib import Path
+from textwrap import dedent
+import xml.etree.ElementTree as ET
+
+import pytest
+
+from src.services.musicxml_merge import merge_system_scores
+from src.services.musicxml_parser import parse_musicxml
+
+
+def _write_system(path: Path, measures: str, parts: int = 1) -> Path:
+    part_list = "".join(
+        f'<score-part id="P{index}"><part-name>Music</part-name></score-part>'
+        for index in range(1, parts + 1)
+    )
+    body = "".join(f'<part id="P{index}">{measures}</part>' for index in range(1, parts + 1))
+    path.write_text(
+        dedent(
+            f"""\
+            <?xml version="1.0" encoding="UTF-8"?>
+            <score-partwise version="3.1">
+              <part-list>{part_list}</part-list>
+              {body}
+            </score-partwise>
+            """
+        ),
+        encoding="utf-8",
+    )
+    return path
+
+
+def _note(step: str, duration: int) -> str:
+    return (
+        f"<note><pitch><step>{step}</step><octave>4</octave></pitch>"
+        f"<duration>{duration}</duration><voice>1</voice><staff>1</staff></note>"
+    )
+
+
+def test_merge_renumbers_measures_and_carries_divisions_and_time(tmp_path: Path) -> None:
+    first = _write_system(
+        tmp_path / "system-1.musicxml",
+        '<measure number="1"><attributes><divisions>2</divisions>'
+        "<time><beats>3</beats><beat-type>4</beat-type></time></attributes>"
+        '<direction><sound tempo="90"/></direction>'
+        f"{_note('C', 2)}{_note('D', 2)}{_note('E', 2)}</measure>"
+        f'<measure number="2">{_note("F", 6)}</measure>',
+    )
+    # Audiveris numbers every system from 1 and omits what the system does not print.
+    second = _write_system(
+        tmp_path / "system-2.musicxml",
+        f'<measure number="1">{_note("G", 6)}</measure>',
+    )
+
+    merged = merge_system_scores([first, second], tmp_path / "merged.musicxml")
+
+    measures = list(ET.parse(merged).getroot().iter("measure"))
+    assert [measure.get("number") for measure in measures] == ["1", "2", "3"]
+    assert measures[2].find("print").get("new-system") == "yes"
+    assert measures[2].find("attributes/divisions").text == "2"
+    assert measures[2].find("attributes/time/beats").text == "3"
+
+    result = parse_musicxml(merged)
+    assert result.tempo == 90
+    assert result.timeSignature == "3/4"
+    assert [(note.pitch, note.startBeat) for note in result.notes] == [
+        ("C4", 0.0),
+        ("D4", 1.0),
+        ("E4", 2.0),
+        ("F4", 3.0),
+        ("G4", 6.0),
+    ]
+
+
+def test_merge_keeps_divisions_a_later_system_declares(tmp_path: Path) -> None:
+    first = _write_system(
+        tmp_path / "system-1.musicxml",
+        f'<measure number="1"><attributes><divisions>1</divisions></attributes>{_note("C", 4)}</measure>',
+    )
+    second = _write_system(
+        tmp_path / "system-2.musicxml",
+        f'<measure number="1"><attributes><divisions>4</divisions></attributes>{_note("D", 16)}</measure>',
+    )
+
+    result = parse_musicxml(merge_system_scores([first, second], tmp_path / "merged.musicxml"))
+
+    assert [(note.pitch, note.startBeat, note.durationBeat) for note in result.notes] == [
+        ("C4", 0.0, 4.0),
+        ("D4", 4.0, 4.0),
+    ]
+
+
+def test_merge_rejects_systems_with_different_parts(tmp_path: Path) -> None:
+    first = _write_system(tmp_path / "system-1.musicxml", f'<measure number="1">{_note("C", 1)}</measure>')
+    second = _write_system(
+        tmp_path / "system-2.musicxml", f'<measure number="1">{_note("D", 1)}</measure>', parts=2
+    )
+
+    with pytest.raises(ValueError, match="System 2 has 2 parts"):
+        merge_system_scores([first, second], tmp_path / "merged.musicxml")
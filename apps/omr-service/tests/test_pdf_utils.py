@@ -0,0 +1,140 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pypdfium2 as pdfium
+import pypdfium2.raw as pdfium_c
+import pytest
+
+from src.services.pdf_utils import PdfPages, pdf_render_scale
+from src.services.pipeline import DEFAULT_COST_MEGAPIXELS, estimate_recognition_cost, recognize_file
+
+
+def _blank_pdf(path: Path, pages: int = 1, size: tuple[float, float] = (595, 842)) -> Path:
+    pdf = pdfium.PdfDocument.new()
+    for _ in range(pages):
+        pdf.new_page(*size)
+    pdf.save(str(path))
+    pdf.close()
+    return path
+
+
+def test_pages_render_to_grayscale_at_target_dpi(tmp_path: Path) -> None:
+    source = _blank_pdf(tmp_path / "score.pdf", pages=2)
+
+    with PdfPages(source) as pdf:
+        assert len(pdf) == 2
+        image = pdf.render_gray(1)
+        png = pdf.write_page_png(0, tmp_path / "page-1.png")
+
+    # A4 at 300 DPI (pdfium rounds each side up).
+    assert image.shape == (3509, 2480)
+    assert image.dtype == "uint8"
+    assert cv2.imread(str(png), cv2.IMREAD_UNCHANGED).ndim == 2
+
+
+def test_render_scale_respects_pixel_budget(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_MAX_MEGAPIXELS", "2")
+    source = _blank_pdf(tmp_path / "poster.pdf", size=(1684, 2384))
+
+    with PdfPages(source) as pdf:
+        height, width = pdf.render_gray(0).shape
+
+    assert width * height <= 2_000_000
+    assert pdf_render_scale(1684, 2384) < 300 / 72
+    assert estimate_recognition_cost(source, "pdf") == pytest.approx(2.0, rel=0.01)
+
+
+def test_cost_estimate_reads_only_the_first_page(monkeypatch, tmp_path: Path) -> None:
+    source = _blank_pdf(tmp_path / "book.pdf", pages=40)
+    measured: list[int] = []
+    real_page_size = PdfPages.page_size
+
+    def tracking_page_size(self, index: int) -> tuple[float, float]:
+        measured.append(index)
+        return real_page_size(self, index)
+
+    monkeypatch.setattr(PdfPages, "page_size", tracking_page_size)
+
+    assert estimate_recognition_cost(source, "pdf") > 0
+    assert measured == [0]
+    assert estimate_recognition_cost(_blank_pdf(tmp_path / "empty.pdf", pages=0), "pdf") == DEFAULT_COST_MEGAPIXELS
+
+
+def test_missing_page_is_reported(tmp_path: Path) -> None:
+    source = _blank_pdf(tmp_path / "score.pdf")
+
+    with PdfPages(source) as pdf, pytest.raises(ValueError, match="no page 2"):
+        pdf.render_gray(1)
+
+
+def _scan_pixels() -> np.ndarray:
+    scan = np.full((1100, 850), 255, np.uint8)
+    for line in range(5):
+        scan[200 + line * 12 : 202 + line * 12, 100:750] = 0
+    return scan
+
+
+def _scanned_pdf(path: Path, *, jpeg: Path | None = None, coverage: float = 1.0) -> Path:
+    pdf = pdfium.PdfDocument.new()
+    page = pdf.new_page(612, 792)
+    image = pdfium.PdfImage.new(pdf)
+    if jpeg is not None:
+        image.load_jpeg(str(jpeg), pages=[page])
+    else:
+        bitmap = pdfium.PdfBitmap.new_native(850, 1100, pdfium_c.FPDFBitmap_Gray)
+        bitmap.to_numpy()[:, :, 0] = _scan_pixels()
+        image.set_bitmap(bitmap, pages=[page])
+    image.set_matrix(pdfium.PdfMatrix().scale(612 * coverage, 792 * coverage))
+    page.insert_obj(image)
+    page.gen_content()
+    pdf.save(str(path))
+    pdf.close()
+    return path
+
+
+def test_scanned_jpeg_page_is_copied_without_rendering(tmp_path: Path) -> None:
+    jpeg = tmp_path / "scan.jpg"
+    cv2.imwrite(str(jpeg), _scan_pixels())
+    source = _scanned_pdf(tmp_path / "scan.pdf", jpeg=jpeg)
+
+    with PdfPages(source) as pdf:
+        extracted = pdf.extract_page_image(0, tmp_path / "page-1")
+
+    assert extracted == tmp_path / "page-1.jpg"
+    assert extracted.read_bytes() == jpeg.read_bytes()
+
+
+def test_scanned_bitmap_page_keeps_native_resolution(tmp_path: Path) -> None:
+    source = _scanned_pdf(tmp_path / "scan.pdf")
+
+    with PdfPages(source) as pdf:
+        extracted = pdf.extract_page_image(0, tmp_path / "page-1")
+
+    assert np.array_equal(cv2.imread(str(extracted), cv2.IMREAD_UNCHANGED), _scan_pixels())
+
+
+def test_partial_image_and_blank_pages_are_rendered(tmp_path: Path) -> None:
+    partial = _scanned_pdf(tmp_path / "partial.pdf", coverage=0.5)
+    blank = _blank_pdf(tmp_path / "blank.pdf")
+
+    with PdfPages(partial) as pdf:
+        assert pdf.extract_page_image(0, tmp_path / "a") is None
+    with PdfPages(blank) as pdf:
+        assert pdf.extract_page_image(0, tmp_path / "b") is None
+
+
+def test_pipeline_feeds_extracted_scan_to_preprocessing(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_STAFF_CROP", "0")
+    sources: list[tuple[str, tuple[int, ...]]] = []
+
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
+        sources.append((src.name, cv2.imread(str(src), cv2.IMREAD_UNCHANGED).shape))
+        raise ValueError("stop after preprocessing")
+
+    monkeypatch.setattr("src.services.pipeline.preprocess_image", fake_preprocess)
+
+    with pytest.raises(ValueError):
+        recognize_file(_scanned_pdf(tmp_path / "scan.pdf"), "pdf")
+
+    assert sources[0] == ("page-1.png", (1100, 850))
@@ -1,3 +1,4 @@
+import json
 from pathlib import Path
 
 import pytest
@@ -9,7 +10,7 @@ from src.services.pipeline import recognize_file
 def test_recognize_file_error_contains_run_log(monkeypatch, tmp_path: Path) -> None:
     monkeypatch.setenv("OMR_RUN_LOG_DIR", str(tmp_path / "runs"))
 
-    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0) -> Path:
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
         dst.write_bytes(b"x")
         return dst
 
@@ -34,7 +35,7 @@ def test_recognize_file_retries_with_upscaled_input(monkeypatch, tmp_path: Path)
     scales_used: list[float] = []
     run_count = {"value": 0}
 
-    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0) -> Path:
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
         scales_used.append(scale_factor)
         dst.write_bytes(b"x")
         return dst
@@ -64,3 +65,119 @@ def test_recognize_file_retries_with_upscaled_input(monkeypatch, tmp_path: Path)
     assert run_count["value"] == 2
     assert scales_used == [1.0, 2.0]
     assert any("upscaled x2.0" in warning for warning in result.meta.warnings)
+
+
+def test_recognize_file_reuses_cached_stages(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(tmp_path / "runs"))
+
+    counts = {"preprocess": 0, "run": 0}
+
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
+        counts["preprocess"] += 1
+        dst.write_bytes(b"x")
+        return dst
+
+    def fake_run(self, image_path: Path, output_dir: Path, **kwargs) -> Path:
+        counts["run"] += 1
+        output_dir.mkdir(parents=True, exist_ok=True)
+        result = output_dir / "score.musicxml"
+        result.write_text(
+            "<score-partwise><part-list/><part id='P1'><measure number='1'>"
+            "<attributes><divisions>1</divisions></attributes>"
+            "<note><pitch><step>C</step><octave>4</octave></pitch><duration>1</duration></note>"
+            "</measure></part></score-partwise>",
+            encoding="utf-8",
+        )
+        return result
+
+    monkeypatch.setattr("src.services.pipeline.preprocess_image", fake_preprocess)
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.run", fake_run)
+
+    input_png = tmp_path / "input.png"
+    input_png.write_bytes(b"fake")
+
+    first = recognize_file(input_png, "png")
+    second = recognize_file(input_png, "png")
+
+    assert counts == {"preprocess": 1, "run": 1}
+    assert second.notes == first.notes
+
+    monkeypatch.setattr("src.services.pipeline.PREPROCESS_VERSION", "next")
+    recognize_file(input_png, "png")
+
+    assert counts == {"preprocess": 2, "run": 1}
+
+
+def test_recognize_file_keeps_omr_book(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(tmp_path / "runs"))
+
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
+        dst.write_bytes(b"x")
+        return dst
+
+    def fake_run(self, image_path: Path, output_dir: Path, **kwargs) -> Path:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        (output_dir / "page.omr").write_bytes(b"book")
+        result = output_dir / "page.musicxml"
+        result.write_text(
+            "<score-partwise><part-list/><part id='P1'><measure number='1'>"
+            "<note><pitch><step>C</step><octave>4</octave></pitch><duration>1</duration></note>"
+            "</measure></part></score-partwise>",
+            encoding="utf-8",
+        )
+        return result
+
+    monkeypatch.setattr("src.services.pipeline.preprocess_image", fake_preprocess)
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.run", fake_run)
+
+    input_png = tmp_path / "input.png"
+    input_png.write_bytes(b"fake")
+
+    recognize_file(input_png, "png", book_dst=tmp_path / "books" / "first.omr")
+    # Second run is served from the artifact cache and must still hand out the book.
+    recognize_file(input_png, "png", book_dst=tmp_path / "books" / "second.omr")
+
+    assert (tmp_path / "books" / "first.omr").read_bytes() == b"book"
+    assert (tmp_path / "books" / "second.omr").read_bytes() == b"book"
+
+
+def test_recognize_file_writes_stage_timings(monkeypatch, tmp_path: Path) -> None:
+    from src.services.timing import StageTimer
+
+    runs = tmp_path / "runs"
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(runs))
+
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
+        dst.write_bytes(b"x")
+        return dst
+
+    def fake_run(self, image_path: Path, output_dir: Path, *, timer=None, **kwargs) -> Path:
+        timer.add("audiveris", 10.0, cpu_ms=8.0, max_rss_mb=64.0)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        result = output_dir / "page.musicxml"
+        result.write_text(
+            "<score-partwise><part-list/><part id='P1'><measure number='1'>"
+            "<note><pitch><step>C</step><octave>4</octave></pitch><duration>1</duration></note>"
+            "</measure></part></score-partwise>",
+            encoding="utf-8",
+        )
+        return result
+
+    monkeypatch.setattr("src.services.pipeline.preprocess_image", fake_preprocess)
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.run", fake_run)
+
+    input_png = tmp_path / "input.png"
+    input_png.write_bytes(b"fake")
+    timer = StageTimer()
+    recognize_file(input_png, "png", timer=timer)
+    timer.add("catalog-write", 1.0)
+    timer.publish()
+
+    (run_dir,) = list(runs.iterdir())
+    summary = json.loads((run_dir / "result-summary.json").read_text(encoding="utf-8"))
+    stages = [(span["stage"], span.get("attempt")) for span in summary["timings"]]
+    assert ("preprocess", "base") in stages
+    assert ("audiveris", "base") in stages
+    assert ("parse", "base") in stages
+    assert stages[-1] == ("catalog-write", None)
+    assert summary["status"] == "ok"
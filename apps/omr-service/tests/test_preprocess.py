@@ -0,0 +1,150 @@
+from pathlib import Path
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from src.services.pipeline import attempt_scales, recognize_file
+from src.services.preprocess import (
+    binarization_score,
+    choose_binarization,
+    load_grayscale,
+    preprocess_image,
+)
+from src.services.staff_detect import estimate_interline
+from src.services.timing import StageTimer
+
+
+def _staff_page(path: Path, *, width: int, height: int, interline: int) -> Path:
+    page = np.full((height, width), 255, np.uint8)
+    for top in range(interline * 4, height - interline * 8, interline * 10):
+        for line in range(5):
+            y = top + line * interline
+            page[y : y + max(2, interline // 8), width // 10 : width - width // 10] = 0
+    cv2.imwrite(str(path), page)
+    return path
+
+
+def _with_exif_orientation(path: Path, orientation: int) -> Path:
+    """Insert an APP1 EXIF segment carrying only the orientation tag."""
+    tiff = (
+        b"II*\x00"
+        + struct.pack("<IH", 8, 1)
+        + struct.pack("<HHIHH", 0x0112, 3, 1, orientation, 0)
+        + struct.pack("<I", 0)
+    )
+    payload = b"Exif\x00\x00" + tiff
+    data = path.read_bytes()
+    path.write_bytes(data[:2] + b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload + data[2:])
+    return path
+
+
+def test_upscaled_attempt_stays_within_pixel_budget(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_MAX_MEGAPIXELS", "1")
+    src = _staff_page(tmp_path / "page.png", width=1200, height=800, interline=12)
+
+    preprocess_image(src, tmp_path / "out.png", scale_factor=2.0)
+
+    height, width = cv2.imread(str(tmp_path / "out.png"), cv2.IMREAD_GRAYSCALE).shape
+    assert width * height <= 1_000_000
+    assert width / height == pytest.approx(1.5, rel=0.01)
+
+
+def test_large_jpeg_is_decoded_at_reduced_resolution(monkeypatch, tmp_path: Path) -> None:
+    src = _staff_page(tmp_path / "photo.jpg", width=4000, height=3000, interline=40)
+    decoded_with: list[int] = []
+    real_imread = cv2.imread
+
+    def tracking_imread(path: str, flags: int = cv2.IMREAD_COLOR):
+        decoded_with.append(flags)
+        return real_imread(path, flags)
+
+    monkeypatch.setattr("src.services.preprocess.cv2.imread", tracking_imread)
+
+    image = load_grayscale(src, max_pixels=2_000_000)
+
+    assert decoded_with == [cv2.IMREAD_REDUCED_GRAYSCALE_2]
+    assert image.shape[0] * image.shape[1] <= 2_000_000
+    assert image.shape[1] == pytest.approx(1632, abs=2)
+
+
+def test_exif_rotated_jpeg_keeps_scale_and_budget(tmp_path: Path) -> None:
+    # The header says 3200x1200; the decoder hands back 1200x3200 (orientation 6).
+    src = _staff_page(tmp_path / "photo.jpg", width=3200, height=1200, interline=40)
+    _with_exif_orientation(src, 6)
+
+    halved = load_grayscale(src, scale_factor=0.5)
+    budgeted = load_grayscale(src, max_pixels=1_000_000)
+
+    assert halved.shape == pytest.approx((1600, 600), abs=2)
+    assert budgeted.shape[0] * budgeted.shape[1] <= 1_000_000
+    assert budgeted.shape[0] > budgeted.shape[1]
+
+
+def test_interline_drives_attempt_scales(tmp_path: Path) -> None:
+    page = _staff_page(tmp_path / "a.png", width=1600, height=1200, interline=10)
+    assert estimate_interline(page) == pytest.approx(10, abs=0.5)
+    garbage = tmp_path / "garbage.png"
+    garbage.write_bytes(b"not an image")
+    assert estimate_interline(garbage) is None
+
+    assert attempt_scales(None) == (1.0, 2.0)
+    assert attempt_scales(10.0) == (1.0, 2.0)
+    assert attempt_scales(5.0) == (1.0, 3.0)
+    # A photo with widely spaced staves shrinks for the base attempt.
+    assert attempt_scales(80.0) == (0.5, 0.75)
+
+
+def test_binarizer_choice_survives_uneven_lighting() -> None:
+    rng = np.random.default_rng(0)
+    page = np.full((1500, 2000), 235, np.float32)
+    # A phone photo lit from one side: a global threshold loses half the page.
+    page *= np.linspace(0.5, 1.0, 2000)[None, :]
+    for top in range(150, 1300, 220):
+        for line in range(5):
+            page[top + line * 16 : top + line * 16 + 2, 100:1900] = 40
+    gray = np.clip(page + rng.normal(0, 10, page.shape), 0, 255).astype(np.uint8)
+
+    name, binary, scores = choose_binarization(gray)
+
+    assert scores["otsu"] < scores[name]
+    assert binary.shape == gray.shape
+    assert binarization_score(binary) > 0
+
+
+def test_blank_page_keeps_default_binarizer() -> None:
+    name, binary, scores = choose_binarization(np.full((300, 400), 250, np.uint8))
+
+    assert name == "adaptive-41"
+    assert set(scores) == {"adaptive-41", "adaptive-21", "adaptive-81", "sauvola", "otsu"}
+    assert binary.shape == (300, 400)
+
+
+def test_binarizer_choice_is_recorded_in_preprocess_spans(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_STAFF_CROP", "0")
+
+    def fake_run(self, image_path: Path, output_dir: Path, **kwargs) -> Path:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        result = output_dir / "page.musicxml"
+        result.write_text(
+            "<score-partwise><part-list/><part id='P1'><measure number='1'>"
+            "<note><pitch><step>C</step><octave>4</octave></pitch><duration>1</duration></note>"
+            "</measure></part></score-partwise>",
+            encoding="utf-8",
+        )
+        return result
+
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.run", fake_run)
+    src = _staff_page(tmp_path / "page.png", width=800, height=600, interline=12)
+    spans = []
+    for _ in range(2):
+        timer = StageTimer()
+        recognize_file(src, "png", timer=timer)
+        spans.append(next(span for span in timer.spans if span["stage"] == "preprocess"))
+
+    first, cached = spans
+    assert (first["cache_hit"], cached["cache_hit"]) == (False, True)
+    scores = first["binarizer_scores"]
+    assert first["binarizer"] == max(scores, key=scores.get)
+    assert (cached["binarizer"], cached["binarizer_scores"]) == (first["binarizer"], scores)
@@ -0,0 +1,80 @@
+from io import BytesIO
+from pathlib import Path
+import time
+
+from fastapi.testclient import TestClient
+
+from src.services.profiler import ProfileBudget, SamplingProfiler, write_profile
+from src.services.run_log import new_run_dir
+
+
+def _busy(seconds: float) -> None:
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+def test_sampler_collects_collapsed_stacks() -> None:
+    profiler = SamplingProfiler(interval_seconds=0.001)
+    profiler.start()
+    _busy(0.1)
+    profiler.stop()
+
+    collapsed = profiler.collapsed()
+    assert profiler.sample_count > 0
+    assert "test_profiler:_busy" in collapsed
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in collapsed.splitlines())
+
+
+def test_budget_caps_profiles_per_minute() -> None:
+    budget = ProfileBudget(max_per_minute=2)
+
+    assert [budget.try_acquire() for _ in range(3)] == [True, True, False]
+
+
+def test_profile_header_writes_run_log(monkeypatch, tmp_path: Path) -> None:
+    from src.main import app
+    from tests.test_api import _fake_result
+
+    runs = tmp_path / "runs"
+    monkeypatch.setenv("CATALOG_PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(runs))
+    monkeypatch.setattr("src.main._profile_budget", ProfileBudget(max_per_minute=1))
+
+    recognition_dirs = []
+
+    def slow_recognize(*args, **kwargs):
+        # Stands in for the pipeline opening its run log.
+        recognition_dirs.append(new_run_dir())
+        _busy(0.05)
+        return _fake_result()
+
+    monkeypatch.setattr("src.main.recognize_file", slow_recognize)
+    client = TestClient(app)
+
+    first = client.post(
+        "/api/v1/recognize",
+        headers={"X-OMR-Profile": "1"},
+        files={"file": ("a.png", BytesIO(b"profiled-a"), "image/png")},
+    )
+    second = client.get("/api/v1/catalog", headers={"X-OMR-Profile": "1"})
+    unprofiled = client.get("/api/v1/health", headers={"X-OMR-Profile": "1"})
+
+    profile_dir = runs / first.headers["X-OMR-Profile"]
+    assert [profile_dir] == recognition_dirs
+    assert (profile_dir / "profile.collapsed").read_text(encoding="utf-8")
+    assert (profile_dir / "profile-meta.json").exists()
+    # Over the per-minute cap, and not a profiled route.
+    assert "X-OMR-Profile" not in second.headers
+    assert "X-OMR-Profile" not in unprofiled.headers
+
+
+def test_write_profile_skips_when_run_logs_are_off(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(tmp_path / "runs"))
+    monkeypatch.setenv("OMR_RUN_LOG_LEVEL", "off")
+    profiler = SamplingProfiler()
+    profiler.start()
+    profiler.stop()
+
+    assert write_profile(profiler, {"path": "/api/v1/catalog"}) is None
+    assert not (tmp_path / "runs").exists()
@@ -0,0 +1,177 @@
+import asyncio
+
+import pytest
+
+from src.services.pipeline import split_systems_workers
+from src.services.recognition_queue import (
+    QueueFullError,
+    RecognitionQueue,
+    default_concurrency,
+    jobs_per_slot,
+)
+
+
+def test_default_concurrency_respects_job_memory(monkeypatch) -> None:
+    monkeypatch.setattr("src.services.recognition_queue.os.cpu_count", lambda: 8)
+    monkeypatch.setattr(
+        "src.services.recognition_queue._available_memory_bytes", lambda: 4 * 1024**3
+    )
+    monkeypatch.setenv("OMR_JOB_MEMORY_MB", "1024")
+
+    assert default_concurrency() == 4
+
+
+def test_split_system_jobs_share_the_slot_budget(monkeypatch) -> None:
+    monkeypatch.setattr("src.services.recognition_queue.os.cpu_count", lambda: 16)
+    monkeypatch.setattr("src.services.pipeline.os.cpu_count", lambda: 16)
+    monkeypatch.setattr(
+        "src.services.recognition_queue._available_memory_bytes", lambda: 6 * 1024**3
+    )
+    monkeypatch.setenv("OMR_JOB_MEMORY_MB", "1024")
+    monkeypatch.setenv("OMR_MAX_CONCURRENCY", "2")
+
+    # Six JVMs fit in memory; each of the two slots may run three of them.
+    assert jobs_per_slot(8) == 3
+    assert jobs_per_slot(2) == 2
+    monkeypatch.setenv("OMR_SPLIT_SYSTEMS", "auto")
+    assert split_systems_workers() == 3
+    monkeypatch.setenv("OMR_MAX_CONCURRENCY", "6")
+    assert split_systems_workers() == 0
+    monkeypatch.setenv("OMR_SPLIT_SYSTEMS", "2")
+    assert split_systems_workers() == 1
+    monkeypatch.setenv("OMR_SPLIT_SYSTEMS", "0")
+    assert split_systems_workers() == 0
+
+
+def test_auto_split_stays_off_with_default_concurrency(monkeypatch) -> None:
+    # Unset OMR_MAX_CONCURRENCY sizes the queue to the whole budget: one JVM per slot.
+    monkeypatch.setattr("src.services.recognition_queue.os.cpu_count", lambda: 8)
+    monkeypatch.setattr("src.services.pipeline.os.cpu_count", lambda: 8)
+    monkeypatch.setattr(
+        "src.services.recognition_queue._available_memory_bytes", lambda: 64 * 1024**3
+    )
+    monkeypatch.delenv("OMR_MAX_CONCURRENCY", raising=False)
+    monkeypatch.setenv("OMR_SPLIT_SYSTEMS", "auto")
+
+    assert split_systems_workers() == 0
+
+
+def test_queue_limits_concurrency_and_rejects_overflow() -> None:
+    async def scenario():
+        queue = RecognitionQueue(max_concurrency=1, max_queue=1)
+        peak = {"running": 0, "max": 0}
+
+        async def job():
+            async with queue.slot():
+                peak["running"] += 1
+                peak["max"] = max(peak["max"], peak["running"])
+                await asyncio.sleep(0.05)
+                peak["running"] -= 1
+            return "ok"
+
+        first = asyncio.create_task(job())
+        second = asyncio.create_task(job())
+        await asyncio.sleep(0.01)
+        assert queue.stats()["queued"] == 1
+
+        with pytest.raises(QueueFullError) as exc:
+            await job()
+        assert exc.value.retry_after >= 1
+
+        results = await asyncio.gather(first, second)
+        return queue, peak, results
+
+    queue, peak, results = asyncio.run(scenario())
+
+    assert results == ["ok", "ok"]
+    assert peak["max"] == 1
+    stats = queue.stats()
+    assert stats["running"] == 0
+    assert stats["completed"] == 2
+    assert stats["rejected"] == 1
+    assert stats["maxWaitMs"] > 0
+
+
+def test_cancelled_waiter_leaves_queue() -> None:
+    async def scenario():
+        queue = RecognitionQueue(max_concurrency=1, max_queue=2)
+
+        async def holder():
+            async with queue.slot():
+                await asyncio.sleep(0.05)
+
+        async def waiter():
+            async with queue.slot():
+                pass
+
+        hold = asyncio.create_task(holder())
+        await asyncio.sleep(0.01)
+        waiting = asyncio.create_task(waiter())
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        await hold
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+
+    assert stats["running"] == 0
+    assert stats["queued"] == 0
+
+
+def _run_ordering(jobs, *, aging_seconds: float = 30.0) -> list[str]:
+    async def scenario():
+        queue = RecognitionQueue(max_concurrency=1, max_queue=10)
+        queue.aging_seconds = aging_seconds
+        order: list[str] = []
+
+        async def job(name, priority, cost):
+            async with queue.slot(priority=priority, cost=cost):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+        blocker = asyncio.create_task(job("blocker", "interactive", 1.0))
+        await asyncio.sleep(0)
+        tasks = []
+        for name, priority, cost, delay in jobs:
+            tasks.append(asyncio.create_task(job(name, priority, cost)))
+            await asyncio.sleep(delay)
+        await asyncio.gather(blocker, *tasks)
+        return order, queue.stats()
+
+    return asyncio.run(scenario())
+
+
+def test_interactive_jumps_bulk_and_short_jobs_go_first() -> None:
+    order, stats = _run_ordering(
+        [
+            ("bulk-small", "bulk", 1.0, 0),
+            ("interactive-large", "interactive", 40.0, 0),
+            ("interactive-small", "interactive", 2.0, 0),
+        ]
+    )
+
+    assert order == ["blocker", "interactive-small", "interactive-large", "bulk-small"]
+    assert stats["classes"]["interactive"]["completed"] == 3
+    assert stats["classes"]["bulk"]["completed"] == 1
+
+
+def test_aging_prevents_starvation() -> None:
+    order, _ = _run_ordering(
+        [
+            ("background-old", "background", 1.0, 0.005),
+            ("interactive-new", "interactive", 1.0, 0),
+        ],
+        aging_seconds=0.002,
+    )
+
+    assert order.index("background-old") < order.index("interactive-new")
+
+
+def test_unknown_priority_is_rejected() -> None:
+    async def scenario():
+        async with RecognitionQueue(1, 1).slot(priority="urgent"):  # type: ignore[arg-type]
+            pass
+
+    with pytest.raises(ValueError):
+        asyncio.run(scenario())
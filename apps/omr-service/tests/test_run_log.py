@@ -0,0 +1,99 @@
+import json
+import os
+from pathlib import Path
+import time
+
+from src.services.pipeline import recognize_file
+from src.services.run_log import RunLog, flush_run_logs, prune_run_logs
+
+
+def _fake_stages(monkeypatch, tmp_path: Path) -> None:
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
+        dst.write_bytes(b"preprocessed")
+        return dst
+
+    def fake_run(self, image_path: Path, output_dir: Path, **kwargs) -> Path:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        result = output_dir / "score.musicxml"
+        result.write_text(
+            "<score-partwise><part-list/><part id='P1'><measure number='1'>"
+            "<note><pitch><step>C</step><octave>4</octave></pitch><duration>1</duration></note>"
+            "</measure></part></score-partwise>",
+            encoding="utf-8",
+        )
+        return result
+
+    monkeypatch.setattr("src.services.pipeline.preprocess_image", fake_preprocess)
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.run", fake_run)
+
+
+def test_full_level_deduplicates_artifacts_across_runs(monkeypatch, tmp_path: Path) -> None:
+    runs = tmp_path / "runs"
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(runs))
+    monkeypatch.setenv("OMR_RUN_LOG_LEVEL", "full")
+    monkeypatch.setenv("OMR_CACHE_MAX_MB", "0")
+    _fake_stages(monkeypatch, tmp_path)
+
+    input_png = tmp_path / "input.png"
+    input_png.write_bytes(b"fake")
+    recognize_file(input_png, "png")
+    recognize_file(input_png, "png")
+    flush_run_logs()
+
+    run_dirs = sorted(path for path in runs.iterdir() if path.name != ".blobs")
+    assert len(run_dirs) == 2
+    first, second = (run_dir / "preprocessed-base.png" for run_dir in run_dirs)
+    assert first.read_bytes() == b"preprocessed"
+    assert first.stat().st_ino == second.stat().st_ino
+    assert (run_dirs[0] / "attempt-base" / "audiveris-out" / "score.musicxml").exists()
+    assert (run_dirs[0] / "input.png").read_bytes() == b"fake"
+
+
+def test_summary_level_skips_artifacts(monkeypatch, tmp_path: Path) -> None:
+    runs = tmp_path / "runs"
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(runs))
+    _fake_stages(monkeypatch, tmp_path)
+
+    input_png = tmp_path / "input.png"
+    input_png.write_bytes(b"fake")
+    recognize_file(input_png, "png")
+    flush_run_logs()
+
+    (run_dir,) = [path for path in runs.iterdir() if path.name != ".blobs"]
+    assert json.loads((run_dir / "result-summary.json").read_text(encoding="utf-8"))["status"] == "ok"
+    assert not (run_dir / "preprocessed-base.png").exists()
+    assert not (run_dir / "input.png").exists()
+
+
+def test_off_level_writes_nothing(monkeypatch, tmp_path: Path) -> None:
+    runs = tmp_path / "runs"
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(runs))
+    monkeypatch.setenv("OMR_RUN_LOG_LEVEL", "off")
+    _fake_stages(monkeypatch, tmp_path)
+
+    input_png = tmp_path / "input.png"
+    input_png.write_bytes(b"fake")
+    recognize_file(input_png, "png")
+    flush_run_logs()
+
+    assert not runs.exists() or not any(runs.iterdir())
+    assert RunLog(tmp_path / "x", "off").describe() == ""
+
+
+def test_prune_removes_old_runs_and_orphan_blobs(tmp_path: Path) -> None:
+    old_run = tmp_path / "20200101-000000-old"
+    new_run = tmp_path / "20300101-000000-new"
+    for run_dir in (old_run, new_run):
+        run_dir.mkdir()
+        (run_dir / "result-summary.json").write_text("{}", encoding="utf-8")
+    stale = time.time() - 30 * 86400
+    os.utime(old_run, (stale, stale))
+    orphan = tmp_path / ".blobs" / "ab" / "abcdef"
+    orphan.parent.mkdir(parents=True)
+    orphan.write_bytes(b"x")
+
+    prune_run_logs(tmp_path, max_age_days=14, max_bytes=1024 * 1024)
+
+    assert not old_run.exists()
+    assert new_run.exists()
+    assert not orphan.exists()
@@ -0,0 +1,109 @@
+import asyncio
+from pathlib import Path
+
+from src.services.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_job(tmp_path: Path) -> None:
+    calls = {"count": 0}
+
+    async def job() -> str:
+        calls["count"] += 1
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        flight: SingleFlight[str] = SingleFlight()
+        results = await asyncio.gather(
+            *(flight.run("same", job, lock_path=tmp_path / "same.lock") for _ in range(3))
+        )
+        return flight, results
+
+    flight, results = asyncio.run(scenario())
+
+    assert calls["count"] == 1
+    assert [value for value, _ in results] == ["done", "done", "done"]
+    assert sorted(shared for _, shared in results) == [False, True, True]
+    assert flight.inflight_keys() == []
+
+
+def test_failure_propagates_to_all_waiters_and_clears_key() -> None:
+    async def job() -> str:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def scenario():
+        flight: SingleFlight[str] = SingleFlight()
+        outcomes = await asyncio.gather(
+            flight.run("key", job), flight.run("key", job), return_exceptions=True
+        )
+        return flight, outcomes
+
+    flight, outcomes = asyncio.run(scenario())
+
+    assert all(isinstance(item, RuntimeError) for item in outcomes)
+    assert flight.inflight_keys() == []
+
+
+def test_file_lock_serializes_independent_registries(tmp_path: Path) -> None:
+    lock_path = tmp_path / "locks" / "hash.lock"
+    order: list[str] = []
+
+    def job(name: str):
+        async def _run() -> str:
+            order.append(f"{name}-start")
+            await asyncio.sleep(0.05)
+            order.append(f"{name}-end")
+            return name
+
+        return _run
+
+    async def scenario():
+        # Two registries stand in for two workers sharing one lock directory.
+        first, second = SingleFlight(), SingleFlight()
+        return await asyncio.gather(
+            first.run("hash", job("a"), lock_path=lock_path),
+            second.run("hash", job("b"), lock_path=lock_path),
+        )
+
+    asyncio.run(scenario())
+
+    assert order in (
+        ["a-start", "a-end", "b-start", "b-end"],
+        ["b-start", "b-end", "a-start", "a-end"],
+    )
+    # The last holder removes the lock file on release.
+    assert not lock_path.exists()
+
+
+def test_job_is_cancelled_only_after_last_waiter_leaves() -> None:
+    state = {"cancelled": False}
+
+    async def job() -> str:
+        try:
+            await asyncio.sleep(0.2)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+        return "done"
+
+    async def scenario():
+        flight: SingleFlight[str] = SingleFlight()
+        first = asyncio.create_task(flight.run("key", job))
+        second = asyncio.create_task(flight.run("key", job))
+        await asyncio.sleep(0.01)
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        assert state["cancelled"] is False
+
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        return flight
+
+    flight = asyncio.run(scenario())
+
+    assert state["cancelled"] is True
+    assert flight.inflight_keys() == []
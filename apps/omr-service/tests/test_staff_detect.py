@@ -0,0 +1,283 @@
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from src.services.errors import OMRPipelineError
+from src.services.pipeline import recognize_file, reexport_book
+from src.services.staff_detect import crop_to_staff_systems, detect_staff_systems
+
+SYSTEM_TOPS = (200, 750)
+STAFF_SPACING = 14
+
+
+def _mixed_score_page() -> np.ndarray:
+    """Two two-staff systems with a title, jianpu and lyrics outside the staves."""
+    page = np.full((1400, 1000), 255, np.uint8)
+    cv2.putText(page, "Title Of Song", (300, 80), cv2.FONT_HERSHEY_SIMPLEX, 1.5, 0, 3)
+    for system_top in SYSTEM_TOPS:
+        for staff_top in (system_top, system_top + 150):
+            for line in range(5):
+                y = staff_top + line * STAFF_SPACING
+                page[y : y + 2, 80:920] = 0
+            for x in range(150, 900, 90):
+                center = (x, staff_top + STAFF_SPACING * ((x // 90) % 5))
+                cv2.ellipse(page, center, (8, 6), -20, 0, 360, 0, -1)
+        for x in (80, 500, 918):
+            page[system_top : system_top + 208, x : x + 2] = 0
+        cv2.putText(page, "1 2 3 5 | 6 5 3 2", (120, system_top + 300), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+        cv2.putText(page, "la la lyrics", (120, system_top + 350), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2)
+    return page
+
+
+def test_detects_systems_joined_by_barlines() -> None:
+    crop = detect_staff_systems(_mixed_score_page())
+
+    assert crop is not None
+    assert len(crop.systems) == 2
+    assert crop.interline == STAFF_SPACING
+    for (x, y, width, height), system_top in zip(crop.systems, SYSTEM_TOPS):
+        assert y < system_top and y + height > system_top + 150 + 4 * STAFF_SPACING
+        # Jianpu and lyrics sit below the margin kept around each system.
+        assert y + height < system_top + 280
+
+
+def test_crop_blanks_text_between_systems(tmp_path: Path) -> None:
+    src = tmp_path / "page.png"
+    cv2.imwrite(str(src), _mixed_score_page())
+    dst = tmp_path / "cropped.png"
+
+    crop = crop_to_staff_systems(src, dst)
+
+    cropped = cv2.imread(str(dst), cv2.IMREAD_GRAYSCALE)
+    x, y, width, height = crop.crop_box
+    assert cropped.shape == (height, width)
+    # The lyrics line of the first system is white after cropping.
+    lyrics_row = SYSTEM_TOPS[0] + 345 - y
+    assert cropped[lyrics_row].min() == 255
+    assert crop.to_source(0, 0) == (x, y)
+    json.dumps(crop.as_dict())
+
+
+def test_crop_is_taken_from_the_budget_reduced_decode(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_MAX_MEGAPIXELS", "0.3")
+    src = tmp_path / "photo.jpg"
+    cv2.imwrite(str(src), _mixed_score_page(), [cv2.IMWRITE_JPEG_QUALITY, 95])
+    decoded_with: list[int] = []
+    real_imread = cv2.imread
+
+    def tracking_imread(path: str, flags: int = cv2.IMREAD_COLOR):
+        decoded_with.append(flags)
+        return real_imread(path, flags)
+
+    monkeypatch.setattr("src.services.preprocess.cv2.imread", tracking_imread)
+    dst = tmp_path / "cropped.png"
+
+    crop = crop_to_staff_systems(src, dst)
+
+    assert decoded_with == [cv2.IMREAD_REDUCED_GRAYSCALE_2]
+    assert crop.scale == pytest.approx(0.463, abs=0.01)
+    assert crop.source_size == (1000, 1400)
+    assert crop.interline == pytest.approx(STAFF_SPACING, abs=1.5)
+    x, y, width, height = crop.crop_box
+    assert cv2.imread(str(dst), cv2.IMREAD_GRAYSCALE).shape == (height, width)
+    assert crop.to_source(0, 0)[1] == pytest.approx(SYSTEM_TOPS[0] - 4 * STAFF_SPACING, abs=6)
+
+
+def test_crop_falls_back_when_nothing_to_detect(tmp_path: Path) -> None:
+    blank = tmp_path / "blank.png"
+    cv2.imwrite(str(blank), np.full((400, 400), 255, np.uint8))
+    garbage = tmp_path / "garbage.png"
+    garbage.write_bytes(b"not an image")
+
+    assert crop_to_staff_systems(blank, tmp_path / "a.png") is None
+    assert crop_to_staff_systems(garbage, tmp_path / "b.png") is None
+
+
+def test_pipeline_retries_full_page_when_cropped_attempts_fail(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(tmp_path / "runs"))
+    sizes: list[tuple[int, int]] = []
+
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
+        sizes.append(cv2.imread(str(src), cv2.IMREAD_GRAYSCALE).shape)
+        dst.write_bytes(src.read_bytes() + str(scale_factor).encode())
+        return dst
+
+    def failing_run(*args, **kwargs):
+        raise OMRPipelineError("no staves")
+
+    monkeypatch.setattr("src.services.pipeline.preprocess_image", fake_preprocess)
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.run", failing_run)
+    page = tmp_path / "page.png"
+    cv2.imwrite(str(page), _mixed_score_page())
+
+    with pytest.raises(OMRPipelineError, match=r"\(base, up2, full\)"):
+        recognize_file(page, "png")
+
+    assert sizes[0] != (1400, 1000)
+    assert sizes[-1] == (1400, 1000)
+    (run_dir,) = (tmp_path / "runs").iterdir()
+    assert json.loads((run_dir / "staff-crop.json").read_text(encoding="utf-8"))["systems"]
+
+
+def test_budget_reduced_crop_is_not_upscaled_back(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(tmp_path / "runs"))
+    monkeypatch.setenv("OMR_MAX_MEGAPIXELS", "0.5")
+    scales: list[float] = []
+
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
+        scales.append(scale_factor)
+        dst.write_bytes(src.read_bytes())
+        return dst
+
+    def fake_run(self, image_path: Path, output_dir: Path, **kwargs) -> Path:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        result = output_dir / "page.musicxml"
+        result.write_text(
+            "<score-partwise><part-list/><part id='P1'><measure number='1'>"
+            "<note><pitch><step>C</step><octave>4</octave></pitch><duration>1</duration></note>"
+            "</measure></part></score-partwise>",
+            encoding="utf-8",
+        )
+        return result
+
+    monkeypatch.setattr("src.services.pipeline.preprocess_image", fake_preprocess)
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.run", fake_run)
+    page = tmp_path / "page.png"
+    cv2.imwrite(str(page), _mixed_score_page())
+
+    result = recognize_file(page, "png")
+
+    # The crop was decoded at ~0.6x; the base attempt keeps it as it is.
+    assert scales == [1.0]
+    assert not any("upscaled" in warning for warning in result.meta.warnings)
+    (run_dir,) = (tmp_path / "runs").iterdir()
+    summary = json.loads((run_dir / "result-summary.json").read_text(encoding="utf-8"))
+    crop = json.loads((run_dir / "staff-crop.json").read_text(encoding="utf-8"))
+    assert crop["scale"] < 0.7
+    assert summary["scale_factor"] == pytest.approx(crop["scale"], abs=0.001)
+
+
+def test_pipeline_transcribes_systems_in_parallel_and_merges(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_RUN_LOG_DIR", str(tmp_path / "runs"))
+    monkeypatch.setenv("OMR_SPLIT_SYSTEMS", "2")
+    steps = {"system-1": "C", "system-2": "E"}
+    ran: list[str] = []
+
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
+        # Both systems of the synthetic page look alike; keep their cache keys apart.
+        dst.write_bytes(src.read_bytes() + dst.name.encode())
+        return dst
+
+    def fake_run(self, image_path: Path, output_dir: Path, **kwargs) -> Path:
+        system = output_dir.parent.name
+        ran.append(system)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        result = output_dir / "page.musicxml"
+        divisions = "<attributes><divisions>1</divisions></attributes>" if system == "system-1" else ""
+        result.write_text(
+            "<score-partwise><part-list/><part id='P1'><measure number='1'>"
+            f"{divisions}<note><pitch><step>{steps[system]}</step><octave>4</octave></pitch>"
+            "<duration>4</duration><staff>1</staff></note>"
+            "</measure></part></score-partwise>",
+            encoding="utf-8",
+        )
+        return result
+
+    monkeypatch.setattr("src.services.pipeline.preprocess_image", fake_preprocess)
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.run", fake_run)
+    page = tmp_path / "page.png"
+    cv2.imwrite(str(page), _mixed_score_page())
+
+    result = recognize_file(page, "png")
+
+    assert sorted(ran) == ["system-1", "system-2"]
+    assert [(note.pitch, note.startBeat) for note in result.notes] == [("C4", 0.0), ("E4", 4.0)]
+    (run_dir,) = (tmp_path / "runs").iterdir()
+    summary = json.loads((run_dir / "result-summary.json").read_text(encoding="utf-8"))
+    assert summary["attempt"] == "systems"
+    assert {span.get("system") for span in summary["timings"] if span["stage"] == "preprocess"} == {1, 2}
+
+
+def test_split_page_keeps_system_books_for_reexport(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_SPLIT_SYSTEMS", "2")
+    steps = {"system-1": "C", "system-2": "E"}
+
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
+        dst.write_bytes(src.read_bytes() + dst.name.encode())
+        return dst
+
+    def score(step: str) -> str:
+        return (
+            "<score-partwise><part-list/><part id='P1'><measure number='1'>"
+            "<attributes><divisions>1</divisions></attributes>"
+            f"<note><pitch><step>{step}</step><octave>4</octave></pitch><duration>4</duration></note>"
+            "</measure></part></score-partwise>"
+        )
+
+    def fake_run(self, image_path: Path, output_dir: Path, **kwargs) -> Path:
+        system = output_dir.parent.name
+        output_dir.mkdir(parents=True, exist_ok=True)
+        (output_dir / "page.omr").write_text(steps[system], encoding="utf-8")
+        result = output_dir / "page.musicxml"
+        result.write_text(score(steps[system]), encoding="utf-8")
+        return result
+
+    def fake_export(self, book_path: Path, output_dir: Path, **kwargs) -> Path:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        result = output_dir / "page.musicxml"
+        result.write_text(score(book_path.read_text(encoding="utf-8")), encoding="utf-8")
+        return result
+
+    monkeypatch.setattr("src.services.pipeline.preprocess_image", fake_preprocess)
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.run", fake_run)
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.export_book", fake_export)
+    page = tmp_path / "page.png"
+    cv2.imwrite(str(page), _mixed_score_page())
+    book_dst = tmp_path / "books" / "song.omr"
+    book_dst.parent.mkdir()
+    book_dst.write_text("stale", encoding="utf-8")
+    system_books = tmp_path / "books" / "song.systems"
+
+    recognize_file(page, "png", book_dst=book_dst, system_books_dst=system_books)
+
+    assert not book_dst.exists()
+    assert sorted(path.name for path in system_books.iterdir()) == ["system-1.omr", "system-2.omr"]
+    result = reexport_book(system_books, "png")
+    assert [(note.pitch, note.startBeat) for note in result.notes] == [("C4", 0.0), ("E4", 4.0)]
+
+
+def test_pipeline_falls_back_to_whole_crop_when_a_system_fails(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setenv("OMR_SPLIT_SYSTEMS", "2")
+    ran: list[str] = []
+
+    def fake_preprocess(src: Path, dst: Path, *, scale_factor: float = 1.0, **kwargs) -> Path:
+        dst.write_bytes(src.read_bytes() + dst.name.encode())
+        return dst
+
+    def fake_run(self, image_path: Path, output_dir: Path, **kwargs) -> Path:
+        attempt = output_dir.parent.name
+        ran.append(attempt)
+        if attempt.startswith("system-"):
+            raise OMRPipelineError("no staves")
+        output_dir.mkdir(parents=True, exist_ok=True)
+        result = output_dir / "page.musicxml"
+        result.write_text(
+            "<score-partwise><part-list/><part id='P1'><measure number='1'>"
+            "<note><pitch><step>C</step><octave>4</octave></pitch><duration>1</duration></note>"
+            "</measure></part></score-partwise>",
+            encoding="utf-8",
+        )
+        return result
+
+    monkeypatch.setattr("src.services.pipeline.preprocess_image", fake_preprocess)
+    monkeypatch.setattr("src.services.pipeline.AudiverisRunner.run", fake_run)
+    page = tmp_path / "page.png"
+    cv2.imwrite(str(page), _mixed_score_page())
+
+    result = recognize_file(page, "png")
+
+    assert ran[-1] == "attempt-base"
+    assert [note.pitch for note in result.notes] == ["C4"]
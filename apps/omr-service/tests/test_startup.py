@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+from tools.startup_bench import HEAVY_MODULES, SERVICE_ROOT, main, summarize
+
+
+def test_importing_the_app_does_not_load_the_imaging_stack() -> None:
+    probe = "import sys, src.main; print(','.join(m for m in %r if m in sys.modules))" % (HEAVY_MODULES,)
+
+    completed = subprocess.run(
+        [sys.executable, "-c", probe],
+        cwd=SERVICE_ROOT,
+        env=dict(os.environ),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    assert completed.stdout.strip() == ""
+
+
+def test_startup_bench_reports_cold_start_timings(capsys) -> None:
+    assert main(["--runs", "1", "--role", "catalog"]) == 0
+
+    report = capsys.readouterr().out
+    assert "importMs" in report and "firstHealthMs" in report
+    assert "heavy modules at first health: none" in report
+
+
+def test_summarize_takes_percentiles_and_merges_modules() -> None:
+    samples = [
+        {"importMs": 100.0, "firstHealthMs": 5.0, "processMs": 300.0, "heavyModules": []},
+        {"importMs": 300.0, "firstHealthMs": 9.0, "processMs": 500.0, "heavyModules": ["cv2"]},
+    ]
+
+    report = summarize(samples)
+
+    assert report["runs"] == 2
+    assert report["importMs"] == {"p50": 100.0, "p95": 300.0, "max": 300.0}
+    assert report["heavyModules"] == ["cv2"]
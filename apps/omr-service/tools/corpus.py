@@ -0,0 +1,369 @@
+"""Golden-corpus regression and performance runner for the MusicXML parser.
+
+Every MusicXML score under the corpus directories (``tests/samples`` and the
+service's test fixtures by default) and in stored run logs is re-parsed with
+``parse_musicxml``. Results are diffed against golden JSON files and per-score
+parse time and peak Python memory are appended to a trend file::
+
+    cd apps/omr-service
+    python -m tools.corpus run                   # diff against goldens, record trend
+    python -m tools.corpus run --update-golden   # accept current output
+    python -m tools.corpus compare main HEAD     # outputs and timings of two revisions
+
+``compare`` checks each revision out into a temporary git worktree and runs
+this file against that tree's parser, so older revisions need no corpus
+support of their own. Only the parser is imported from ``src``.
+
+Run logs keep Audiveris MusicXML only at ``OMR_RUN_LOG_LEVEL=full``; at the
+default ``summary`` level they add nothing to the corpus.
+"""
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import hashlib
+import json
+import os
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SERVICE_ROOT = Path(__file__).resolve().parents[1]
+REPO_ROOT = SERVICE_ROOT.parents[1]
+DEFAULT_CORPUS_DIRS = (REPO_ROOT / "tests" / "samples", SERVICE_ROOT / "tests" / "fixtures")
+DEFAULT_GOLDEN_DIR = REPO_ROOT / "tests" / "samples" / "golden"
+DEFAULT_TREND_FILE = REPO_ROOT / "tests" / "samples" / "corpus-trend.jsonl"
+MUSICXML_SUFFIXES = (".musicxml", ".xml", ".mxl")
+COMPARED_FIELDS = ("tempo", "timeSignature", "notes", "playbackEvents", "warnings")
+
+# Appended, so a PYTHONPATH pointing at another checkout (see ``compare``) wins.
+sys.path.append(str(SERVICE_ROOT))
+
+
+def _default_run_log_dir() -> Path:
+    configured = os.getenv("OMR_RUN_LOG_DIR")
+    return Path(configured).expanduser() if configured else SERVICE_ROOT / "run-logs"
+
+
+@dataclass(frozen=True)
+class CorpusItem:
+    label: str
+    path: Path
+    digest: str
+
+    @property
+    def golden_name(self) -> str:
+        return f"{self.path.name.split('.')[0]}-{self.digest[:12]}.json"
+
+
+def _digest(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def discover_corpus(corpus_dirs: list[Path], run_log_dir: Path | None) -> list[CorpusItem]:
+    """List distinct scores; run logs contribute every MusicXML Audiveris produced."""
+    items: dict[str, CorpusItem] = {}
+    roots = [(directory, directory.name) for directory in corpus_dirs]
+    if run_log_dir is not None:
+        roots.append((run_log_dir, "run-logs"))
+    run_log_scores = 0
+    for root, prefix in roots:
+        if not root.exists():
+            continue
+        for path in sorted(root.rglob("*")):
+            if path.suffix.lower() not in MUSICXML_SUFFIXES or not path.is_file():
+                continue
+            if ".blobs" in path.parts or "golden" in path.relative_to(root).parts:
+                continue
+            if root == run_log_dir:
+                run_log_scores += 1
+            digest = _digest(path)
+            # Run logs hard-link identical outputs; keep the first label seen.
+            items.setdefault(digest, CorpusItem(f"{prefix}/{path.relative_to(root)}", path, digest))
+    if run_log_dir is not None and run_log_scores == 0:
+        print(
+            f"warning: no MusicXML in run logs under {run_log_dir}; run logs keep it only "
+            "when the service runs with OMR_RUN_LOG_LEVEL=full (the default is summary)",
+            file=sys.stderr,
+        )
+    return sorted(items.values(), key=lambda item: item.label)
+
+
+def normalized_output(path: Path) -> dict:
+    from src.services.musicxml_parser import parse_musicxml
+
+    result = parse_musicxml(path).model_dump()
+    return {
+        "tempo": result["tempo"],
+        "timeSignature": result["timeSignature"],
+        "notes": result["notes"],
+        "playbackEvents": result.get("playbackEvents", []),
+        "warnings": result["meta"]["warnings"],
+    }
+
+
+def measure(path: Path, repeat: int) -> tuple[dict, float, float]:
+    """Return ``(output, median parse ms, peak traced KiB)``.
+
+    An untimed warm-up parse (imports, file cache) comes first; timing runs
+    without tracemalloc and one extra traced run measures memory.
+    """
+    output = normalized_output(path)
+    durations: list[float] = []
+    for _ in range(max(1, repeat)):
+        started = time.perf_counter()
+        normalized_output(path)
+        durations.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    try:
+        normalized_output(path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return output, statistics.median(durations), peak / 1024
+
+
+def diff_outputs(expected: dict, actual: dict) -> list[str]:
+    differences: list[str] = []
+    for field in COMPARED_FIELDS:
+        before, after = expected.get(field), actual.get(field)
+        if before == after:
+            continue
+        if isinstance(before, list) and isinstance(after, list):
+            first = next(
+                (index for index, (a, b) in enumerate(zip(before, after)) if a != b),
+                min(len(before), len(after)),
+            )
+            differences.append(
+                f"{field}: {len(before)} -> {len(after)} items, first difference at index {first}"
+            )
+        else:
+            differences.append(f"{field}: {before!r} -> {after!r}")
+    return differences
+
+
+def _git_revision(cwd: Path) -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=cwd,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_corpus(
+    items: list[CorpusItem],
+    *,
+    golden_dir: Path | None,
+    update_golden: bool = False,
+    repeat: int = 3,
+) -> dict:
+    scores: list[dict] = []
+    for item in items:
+        entry: dict = {"label": item.label, "digest": item.digest}
+        try:
+            output, parse_ms, peak_kib = measure(item.path, repeat)
+        except Exception as exc:
+            entry.update({"status": "error", "error": f"{type(exc).__name__}: {exc}"})
+            scores.append(entry)
+            continue
+        entry.update({"parseMs": round(parse_ms, 3), "peakKib": round(peak_kib, 1), "output": output})
+
+        golden_path = golden_dir / item.golden_name if golden_dir is not None else None
+        if golden_path is None:
+            entry["status"] = "measured"
+        elif update_golden:
+            golden_path.parent.mkdir(parents=True, exist_ok=True)
+            golden_path.write_text(
+                json.dumps({"source": item.label, **output}, ensure_ascii=False, indent=2) + "\n",
+                encoding="utf-8",
+            )
+            entry["status"] = "updated"
+        elif not golden_path.exists():
+            entry["status"] = "new"
+        else:
+            expected = json.loads(golden_path.read_text(encoding="utf-8"))
+            differences = diff_outputs(expected, output)
+            entry["status"] = "changed" if differences else "ok"
+            if differences:
+                entry["differences"] = differences
+        scores.append(entry)
+
+    return {
+        # The parser's checkout, which differs from this file's under ``compare``.
+        "revision": _git_revision(Path.cwd()),
+        "recordedAt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "scores": scores,
+        "totalParseMs": round(sum(score.get("parseMs", 0.0) for score in scores), 3),
+    }
+
+
+def append_trend(trend_file: Path, report: dict) -> None:
+    trend_file.parent.mkdir(parents=True, exist_ok=True)
+    line = {
+        "revision": report["revision"],
+        "recordedAt": report["recordedAt"],
+        "totalParseMs": report["totalParseMs"],
+        "scores": {
+            score["label"]: {"parseMs": score.get("parseMs"), "peakKib": score.get("peakKib")}
+            for score in report["scores"]
+        },
+    }
+    with trend_file.open("a", encoding="utf-8") as handle:
+        handle.write(json.dumps(line, ensure_ascii=False) + "\n")
+
+
+def _run_at_revision(revision: str, corpus_dirs: list[Path], run_log_dir: Path | None, repeat: int) -> dict:
+    repo_root = Path(
+        subprocess.run(
+            ["git", "rev-parse", "--show-toplevel"],
+            cwd=SERVICE_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    )
+    service_subdir = SERVICE_ROOT.relative_to(repo_root)
+    with tempfile.TemporaryDirectory(prefix="omr-corpus-") as temp:
+        worktree = Path(temp) / "tree"
+        results = Path(temp) / "results.json"
+        subprocess.run(
+            ["git", "worktree", "add", "--detach", str(worktree), revision],
+            cwd=repo_root,
+            capture_output=True,
+            check=True,
+        )
+        try:
+            command = [
+                sys.executable,
+                str(Path(__file__).resolve()),
+                "run",
+                "--no-golden",
+                "--no-trend",
+                "--repeat",
+                str(repeat),
+                "--results-out",
+                str(results),
+            ]
+            for directory in corpus_dirs:
+                command += ["--corpus-dir", str(directory.resolve())]
+            command += ["--run-log-dir", str(run_log_dir.resolve())] if run_log_dir else ["--no-run-logs"]
+            subprocess.run(
+                command,
+                cwd=worktree / service_subdir,
+                env={**os.environ, "PYTHONPATH": str(worktree / service_subdir)},
+                check=True,
+            )
+            return json.loads(results.read_text(encoding="utf-8"))
+        finally:
+            subprocess.run(
+                ["git", "worktree", "remove", "--force", str(worktree)],
+                cwd=repo_root,
+                capture_output=True,
+            )
+
+
+def compare_reports(base: dict, head: dict) -> dict:
+    base_scores = {score["digest"]: score for score in base["scores"]}
+    rows: list[dict] = []
+    for score in head["scores"]:
+        previous = base_scores.get(score["digest"])
+        if previous is None:
+            continue
+        row: dict = {"label": score["label"]}
+        if "output" in previous and "output" in score:
+            row["differences"] = diff_outputs(previous["output"], score["output"])
+        else:
+            row["differences"] = [f"status: {previous.get('status')} -> {score.get('status')}"]
+        if previous.get("parseMs") and score.get("parseMs"):
+            row["parseMs"] = [previous["parseMs"], score["parseMs"]]
+            row["parseDeltaPct"] = round((score["parseMs"] / previous["parseMs"] - 1) * 100, 1)
+        rows.append(row)
+    return {
+        "base": base["revision"],
+        "head": head["revision"],
+        "changedScores": sum(1 for row in rows if row["differences"]),
+        "totalParseMs": [base["totalParseMs"], head["totalParseMs"]],
+        "scores": rows,
+    }
+
+
+def _print_run(report: dict) -> None:
+    for score in report["scores"]:
+        timing = f"{score['parseMs']:.2f} ms, {score['peakKib']:.0f} KiB" if "parseMs" in score else ""
+        print(f"{score['status']:<8} {score['label']}  {timing}")
+        for line in score.get("differences", []):
+            print(f"         {line}")
+        if score["status"] == "error":
+            print(f"         {score['error']}")
+    print(f"{len(report['scores'])} scores, total parse {report['totalParseMs']:.1f} ms")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_corpus_options(command: argparse.ArgumentParser) -> None:
+        command.add_argument("--corpus-dir", type=Path, action="append", help="repeatable")
+        command.add_argument(
+            "--run-log-dir",
+            type=Path,
+            default=None,
+            help="run logs to mine for Audiveris MusicXML (default: OMR_RUN_LOG_DIR or ./run-logs); "
+            "only runs made with OMR_RUN_LOG_LEVEL=full keep it",
+        )
+        command.add_argument("--no-run-logs", action="store_true")
+        command.add_argument("--repeat", type=int, default=3, help="timed parses per score")
+
+    run = commands.add_parser("run", help="parse the corpus and diff against goldens")
+    add_corpus_options(run)
+    run.add_argument("--golden-dir", type=Path, default=DEFAULT_GOLDEN_DIR)
+    run.add_argument("--no-golden", action="store_true")
+    run.add_argument("--update-golden", action="store_true")
+    run.add_argument("--trend-file", type=Path, default=DEFAULT_TREND_FILE)
+    run.add_argument("--no-trend", action="store_true")
+    run.add_argument("--results-out", type=Path, help="write the full report as JSON")
+
+    compare = commands.add_parser("compare", help="compare parser output and speed of two revisions")
+    add_corpus_options(compare)
+    compare.add_argument("base")
+    compare.add_argument("head")
+
+    args = parser.parse_args(argv)
+    corpus_dirs = args.corpus_dir or list(DEFAULT_CORPUS_DIRS)
+    run_log_dir = None if args.no_run_logs else (args.run_log_dir or _default_run_log_dir())
+
+    if args.command == "compare":
+        base = _run_at_revision(args.base, corpus_dirs, run_log_dir, args.repeat)
+        head = _run_at_revision(args.head, corpus_dirs, run_log_dir, args.repeat)
+        print(json.dumps(compare_reports(base, head), ensure_ascii=False, indent=2))
+        return 0
+
+    report = run_corpus(
+        discover_corpus(corpus_dirs, run_log_dir),
+        golden_dir=None if args.no_golden else args.golden_dir,
+        update_golden=args.update_golden,
+        repeat=args.repeat,
+    )
+    if args.results_out:
+        args.results_out.write_text(json.dumps(report, ensure_ascii=False), encoding="utf-8")
+    else:
+        _print_run(report)
+    if not args.no_trend:
+        append_trend(args.trend_file, report)
+    failed = any(score["status"] in {"changed", "error"} for score in report["scores"])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
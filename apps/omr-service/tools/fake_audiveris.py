@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Stand-in for the Audiveris CLI, for load tests without a JVM.
+
+Accepts the arguments ``AudiverisRunner`` passes (``-batch``, ``-transcribe``,
+``-export``, ``-force``, ``-output DIR``, input path) and writes
+``<stem>.musicxml`` (plus ``<stem>.omr`` when transcribing) into the output
+directory. Behaviour is tuned through environment variables:
+
+- ``FAKE_AUDIVERIS_LATENCY_MS``: mean run time (default 200).
+- ``FAKE_AUDIVERIS_JITTER_MS``: uniform +/- jitter on the latency (default 0).
+- ``FAKE_AUDIVERIS_FAILURE_RATE``: probability of failing like an unreadable
+  sheet (default 0).
+- ``FAKE_AUDIVERIS_MEASURES``: measures in the generated score, i.e. output
+  size (default 16).
+- ``FAKE_AUDIVERIS_SEED``: seed for reproducible latency/failure draws.
+
+Point ``AUDIVERIS_CMD`` at this file to use it.
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+import random
+import sys
+import time
+
+STEPS = ("LOAD", "BINARY", "SCALE", "GRID", "HEADERS", "STEMS", "MEASURES", "RHYTHMS", "PAGE", "EXPORT")
+SCALE_STEPS = ("C", "D", "E", "F", "G", "A", "B")
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name, "")
+    try:
+        return float(raw) if raw else default
+    except ValueError:
+        return default
+
+
+def build_musicxml(measures: int) -> str:
+    parts = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<score-partwise version="3.1">',
+        '<part-list><score-part id="P1"><part-name>Music</part-name></score-part></part-list>',
+        '<part id="P1">',
+    ]
+    for number in range(1, max(1, measures) + 1):
+        parts.append(f'<measure number="{number}">')
+        if number == 1:
+            parts.append(
+                "<attributes><divisions>1</divisions>"
+                "<time><beats>4</beats><beat-type>4</beat-type></time></attributes>"
+                "<direction><direction-type><metronome><beat-unit>quarter</beat-unit>"
+                "<per-minute>90</per-minute></metronome></direction-type></direction>"
+            )
+        for beat in range(4):
+            step = SCALE_STEPS[(number * 4 + beat) % len(SCALE_STEPS)]
+            parts.append(
+                f"<note><pitch><step>{step}</step><octave>4</octave></pitch>"
+                "<duration>1</duration></note>"
+            )
+        parts.append("</measure>")
+    parts.append("</part></score-partwise>")
+    return "\n".join(parts)
+
+
+def main(argv: list[str]) -> int:
+    if "-output" not in argv or len(argv) < 3:
+        print("usage: fake_audiveris.py -batch [-transcribe] [-export] -output DIR INPUT", file=sys.stderr)
+        return 2
+    output_dir = Path(argv[argv.index("-output") + 1])
+    input_path = Path(argv[-1])
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    seed = os.getenv("FAKE_AUDIVERIS_SEED")
+    rng = random.Random(f"{seed}:{input_path.name}" if seed else None)
+    latency = _env_float("FAKE_AUDIVERIS_LATENCY_MS", 200.0)
+    jitter = _env_float("FAKE_AUDIVERIS_JITTER_MS", 0.0)
+    total_seconds = max(0.0, latency + rng.uniform(-jitter, jitter)) / 1000
+    fail = rng.random() < _env_float("FAKE_AUDIVERIS_FAILURE_RATE", 0.0)
+
+    if not input_path.exists():
+        print(f"ERROR Could not load image {input_path}", flush=True)
+        return 1
+
+    transcribe = "-transcribe" in argv
+    steps = STEPS if transcribe else ("EXPORT",)
+    for index, step in enumerate(steps):
+        time.sleep(total_seconds / len(steps))
+        print(f"INFO  Sheet#1 [{step}] fake step", flush=True)
+        if fail and index == 2:
+            print("WARN  Sheet#1 no staves found", flush=True)
+            return 1
+
+    stem = input_path.stem
+    if transcribe:
+        (output_dir / f"{stem}.omr").write_bytes(b"fake-omr-book")
+    (output_dir / f"{stem}.musicxml").write_text(
+        build_musicxml(int(_env_float("FAKE_AUDIVERIS_MEASURES", 16))), encoding="utf-8"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,222 @@
+"""Drive concurrent uploads, dedup hits and catalog reads at the OMR service.
+
+By default the FastAPI app runs in-process with ``tools/fake_audiveris.py``
+as ``AUDIVERIS_CMD`` and throwaway catalog, cache and run-log directories,
+so it needs nothing but this checkout::
+
+    cd apps/omr-service
+    python -m tools.loadtest --requests 200 --concurrency 16
+
+Pass ``--base-url http://localhost:8000`` to load a running server instead
+(its own ``AUDIVERIS_CMD`` then applies).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+from dataclasses import dataclass, field
+import json
+import math
+import os
+from pathlib import Path
+import random
+import sys
+import tempfile
+import time
+
+import httpx
+
+FAKE_AUDIVERIS = Path(__file__).resolve().with_name("fake_audiveris.py")
+REQUEST_KINDS = ("upload", "dedup", "catalog")
+
+
+def synthetic_score(seed: int, width: int = 1200, height: int = 800) -> bytes:
+    """Encode a unique page with staff lines and note heads as PNG."""
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    page = np.full((height, width), 255, dtype=np.uint8)
+    for top in range(100, height - 100, 160):
+        for line in range(5):
+            y = top + line * 12
+            page[y : y + 2, 60 : width - 60] = 0
+        for x in rng.integers(100, width - 100, size=12):
+            y = int(top + rng.integers(0, 5) * 12)
+            cv2.ellipse(page, (int(x), y), (8, 6), -20, 0, 360, 0, -1)
+    ok, encoded = cv2.imencode(".png", page)
+    if not ok:
+        raise RuntimeError("Failed to encode synthetic score")
+    return encoded.tobytes()
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+@dataclass
+class KindStats:
+    latencies_ms: list[float] = field(default_factory=list)
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self, elapsed_seconds: float) -> dict[str, object]:
+        ordered = sorted(self.latencies_ms)
+        total = len(ordered)
+        failed = sum(self.errors.values())
+        return {
+            "requests": total,
+            "errors": failed,
+            "errorRate": round(failed / total, 4) if total else 0.0,
+            "errorsByStatus": dict(sorted(self.errors.items())),
+            "throughputPerSecond": round(total / elapsed_seconds, 2) if elapsed_seconds else 0.0,
+            "p50Ms": round(percentile(ordered, 0.50), 1),
+            "p95Ms": round(percentile(ordered, 0.95), 1),
+            "p99Ms": round(percentile(ordered, 0.99), 1),
+        }
+
+
+@dataclass
+class LoadTestConfig:
+    requests: int = 50
+    concurrency: int = 8
+    dedup_ratio: float = 0.3
+    catalog_ratio: float = 0.2
+    priority: str = "interactive"
+    seed: int = 0
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, config: LoadTestConfig):
+        self.client = client
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.stats = {kind: KindStats() for kind in REQUEST_KINDS}
+        self._uploaded: list[bytes] = []
+        self._next_image = 0
+
+    def _pick_kind(self) -> str:
+        draw = self.rng.random()
+        if draw < self.config.catalog_ratio:
+            return "catalog"
+        if self._uploaded and draw < self.config.catalog_ratio + self.config.dedup_ratio:
+            return "dedup"
+        return "upload"
+
+    async def _request(self, kind: str) -> httpx.Response:
+        if kind == "catalog":
+            return await self.client.get("/api/v1/catalog")
+        if kind == "dedup":
+            content = self.rng.choice(self._uploaded)
+        else:
+            self._next_image += 1
+            content = await asyncio.to_thread(
+                synthetic_score, self.config.seed * 1_000_003 + self._next_image
+            )
+        response = await self.client.post(
+            "/api/v1/recognize",
+            params={"priority": self.config.priority},
+            files={"file": ("score.png", content, "image/png")},
+        )
+        if kind == "upload" and response.status_code == 200:
+            self._uploaded.append(content)
+        return response
+
+    async def _worker(self, remaining: list[int]) -> None:
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            kind = self._pick_kind()
+            started = time.perf_counter()
+            try:
+                response = await self._request(kind)
+                status = response.status_code
+            except httpx.HTTPError as exc:
+                status = type(exc).__name__
+            stats = self.stats[kind]
+            stats.latencies_ms.append((time.perf_counter() - started) * 1000)
+            if status != 200:
+                stats.errors[str(status)] = stats.errors.get(str(status), 0) + 1
+
+    async def run(self) -> dict[str, object]:
+        remaining = [self.config.requests]
+        started = time.perf_counter()
+        await asyncio.gather(*(self._worker(remaining) for _ in range(self.config.concurrency)))
+        elapsed = time.perf_counter() - started
+        overall = KindStats()
+        for stats in self.stats.values():
+            overall.latencies_ms.extend(stats.latencies_ms)
+            for status, count in stats.errors.items():
+                overall.errors[status] = overall.errors.get(status, 0) + count
+        return {
+            "elapsedSeconds": round(elapsed, 3),
+            "concurrency": self.config.concurrency,
+            "overall": overall.as_dict(elapsed),
+            "byKind": {kind: stats.as_dict(elapsed) for kind, stats in self.stats.items()},
+        }
+
+
+def prepare_local_environment(workdir: Path) -> None:
+    """Point the in-process app at the fake engine and throwaway storage."""
+    os.environ.setdefault("AUDIVERIS_CMD", str(FAKE_AUDIVERIS))
+    os.environ["CATALOG_PROJECT_ROOT"] = str(workdir / "project")
+    os.environ["OMR_CACHE_DIR"] = str(workdir / "cache")
+    os.environ["OMR_RUN_LOG_DIR"] = str(workdir / "run-logs")
+
+
+async def run_load_test(config: LoadTestConfig, *, base_url: str | None = None) -> dict[str, object]:
+    if base_url is not None:
+        async with httpx.AsyncClient(base_url=base_url, timeout=None) as client:
+            return await LoadTest(client, config).run()
+
+    from src.main import app
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        return await LoadTest(client, config).run()
+
+
+def _format_report(report: dict[str, object]) -> str:
+    lines = [f"elapsed {report['elapsedSeconds']}s, concurrency {report['concurrency']}"]
+    rows = {"overall": report["overall"], **report["byKind"]}  # type: ignore[dict-item]
+    lines.append(f"{'kind':<9}{'reqs':>6}{'err%':>8}{'req/s':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}")
+    for kind, row in rows.items():
+        lines.append(
+            f"{kind:<9}{row['requests']:>6}{row['errorRate'] * 100:>7.1f}%"
+            f"{row['throughputPerSecond']:>9}{row['p50Ms']:>9}{row['p95Ms']:>9}{row['p99Ms']:>9}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--dedup-ratio", type=float, default=0.3, help="share of re-uploads of seen images")
+    parser.add_argument("--catalog-ratio", type=float, default=0.2, help="share of catalog list reads")
+    parser.add_argument("--priority", default="interactive", choices=("interactive", "bulk", "background"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--base-url", help="load a running server instead of the in-process app")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    config = LoadTestConfig(
+        requests=args.requests,
+        concurrency=args.concurrency,
+        dedup_ratio=args.dedup_ratio,
+        catalog_ratio=args.catalog_ratio,
+        priority=args.priority,
+        seed=args.seed,
+    )
+    with tempfile.TemporaryDirectory(prefix="omr-loadtest-") as workdir:
+        if args.base_url is None:
+            prepare_local_environment(Path(workdir))
+        report = asyncio.run(run_load_test(config, base_url=args.base_url))
+
+    print(json.dumps(report, indent=2) if args.json else _format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+"""Measure how quickly a fresh OMR service process can answer requests.
+
+Every run starts a new interpreter that times ``import src.main`` and the
+first ``GET /api/v1/health`` against the in-process app, and reports which
+heavy imaging modules were loaded by then (none, unless something imports
+the pipeline eagerly)::
+
+    cd apps/omr-service
+    python -m tools.startup_bench --runs 10
+
+Storage points at a throwaway directory, as in ``tools.loadtest``.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+
+from tools.loadtest import percentile, prepare_local_environment
+
+SERVICE_ROOT = Path(__file__).resolve().parents[1]
+HEAVY_MODULES = ("cv2", "numpy", "pypdfium2", "src.services.pipeline")
+
+# Runs in the child; the clock starts after the interpreter and the HTTP
+# client are up, so only the service's own start-up is measured.
+_CHILD = f"""
+import asyncio, json, sys, time
+import httpx
+
+started = time.perf_counter()
+import src.main
+imported = time.perf_counter()
+
+async def first_health():
+    transport = httpx.ASGITransport(app=src.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        (await client.get("/api/v1/health")).raise_for_status()
+
+asyncio.run(first_health())
+ready = time.perf_counter()
+print(json.dumps({{
+    "importMs": (imported - started) * 1000,
+    "firstHealthMs": (ready - imported) * 1000,
+    "heavyModules": [name for name in {HEAVY_MODULES!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure_once(env: dict[str, str]) -> dict[str, object]:
+    """Start one child process and return its timings plus the whole process's wall time."""
+    started = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-c", _CHILD],
+        cwd=SERVICE_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    sample = json.loads(completed.stdout.strip().splitlines()[-1])
+    sample["processMs"] = (time.perf_counter() - started) * 1000
+    return sample
+
+
+def summarize(samples: list[dict[str, object]]) -> dict[str, object]:
+    report: dict[str, object] = {"runs": len(samples)}
+    for key in ("importMs", "firstHealthMs", "processMs"):
+        values = sorted(float(sample[key]) for sample in samples)  # type: ignore[arg-type]
+        report[key] = {
+            "p50": round(percentile(values, 0.5), 1),
+            "p95": round(percentile(values, 0.95), 1),
+            "max": round(values[-1], 1),
+        }
+    report["heavyModules"] = sorted(
+        {name for sample in samples for name in sample["heavyModules"]}  # type: ignore[union-attr]
+    )
+    return report
+
+
+def _format_report(report: dict[str, object]) -> str:
+    lines = [f"{report['runs']} cold starts"]
+    lines.append(f"{'metric':<15}{'p50ms':>9}{'p95ms':>9}{'maxms':>9}")
+    for key in ("importMs", "firstHealthMs", "processMs"):
+        row = report[key]
+        lines.append(f"{key:<15}{row['p50']:>9}{row['p95']:>9}{row['max']:>9}")  # type: ignore[index]
+    heavy = report["heavyModules"]
+    lines.append(f"heavy modules at first health: {', '.join(heavy) if heavy else 'none'}")  # type: ignore[arg-type]
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--role", choices=("all", "catalog"), default="all", help="OMR_WORKER_ROLE for the child")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    saved = dict(os.environ)
+    with tempfile.TemporaryDirectory(prefix="omr-startup-") as workdir:
+        try:
+            prepare_local_environment(Path(workdir))
+            env = {**os.environ, "OMR_WORKER_ROLE": args.role}
+        finally:
+            os.environ.clear()
+            os.environ.update(saved)
+        report = summarize([measure_once(env) for _ in range(args.runs)])
+
+    print(json.dumps(report, indent=2) if args.json else _format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
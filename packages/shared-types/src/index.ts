@@ -30,6 +30,16 @@ export type PlaybackEvent = {
   sourceMeasure: number
 }
 
+export type StageTiming = {
+  stage: string
+  ms: number
+  attempt?: string | null
+  cpuMs?: number | null
+  maxRssMb?: number | null
+  cacheHit?: boolean | null
+  binarizer?: string | null
+}
+
 export type RecognizeResponse = {
   tempo: number
   timeSignature: string
@@ -39,6 +49,7 @@ export type RecognizeResponse = {
     engine: string
     inputType: string
     warnings: string[]
+    timings?: StageTiming[] | null
   }
 }
 
@@ -55,6 +66,7 @@ export type CatalogEntrySummary = {
   imageHash: string
   melodyInstrument: InstrumentId
   leftHandInstrument: InstrumentId
+  perceptualHash?: string | null
 }
 
 export type CatalogEntryDetail = CatalogEntrySummary & {
@@ -67,4 +79,36 @@ export type RecognizeApiResponse = RecognizeResponse & {
   melodyInstrument: InstrumentId
   leftHandInstrument: InstrumentId
   isReused: boolean
+  nearDuplicateEntryId?: string | null
+  nearDuplicateSimilarity?: number | null
+}
+
+export type RecognitionPriority = 'interactive' | 'bulk' | 'background'
+
+export type BatchItem = {
+  name: string
+  status: 'pending' | 'running' | 'reused' | 'done' | 'failed' | 'skipped'
+  catalogEntryId?: string | null
+  error?: string | null
 }
+
+export type BatchStatus = {
+  id: string
+  status: 'queued' | 'running' | 'done' | 'interrupted'
+  priority: RecognitionPriority
+  createdAt: string
+  finishedAt?: string | null
+  total: number
+  completed: number
+  counts: Record<string, number>
+  items: BatchItem[]
+}
+
+export type RecognizeStreamEvent = { elapsedMs: number } & (
+  | { event: 'received'; filename: string | null; bytes: number }
+  | { event: 'stage-start'; stage: string; attempt: string | null }
+  | ({ event: 'stage' } & StageTiming)
+  | { event: 'audiveris-step'; attempt: string; step: string }
+  | { event: 'result'; result: RecognizeApiResponse }
+  | { event: 'error'; status: number; detail: string }
+)